@@ -2,15 +2,16 @@ import asyncio
 import signal
 from argparse import ArgumentParser
 
+from facet import ServiceMixin
 from loguru import logger
 
-from .services import EmailService, MainService
+from .services import EmailService, MainService, WorkersService
 from .settings import Settings
 
 
-async def main(main_service: MainService, email_service: EmailService):
+async def main(main_service: ServiceMixin, email_service: EmailService):
     """
-    Main function with running EmailService and MailService
+    Main function with running EmailService and MainService or WorkersService
     """
     async with email_service, main_service:
         pass
@@ -26,6 +27,26 @@ parser.add_argument(
     required=False,
     help="Environment filepath",
 )
+parser.add_argument(
+    "-r", "--resume",
+    action="store_true",
+    dest="resume",
+    help="Skip work completed by previous run",
+)
+parser.add_argument(
+    "-w", "--workers",
+    type=int,
+    dest="workers",
+    default=1,
+    help="Number of worker processes",
+)
+parser.add_argument(
+    "--replay",
+    type=str,
+    dest="replay",
+    required=False,
+    help="Save records from archive of Graph API responses instead of downloading",
+)
 
 arguments = parser.parse_args()
 
@@ -35,9 +56,18 @@ if arguments.env_filepath:
 else:
     settings = Settings()
 
-main_service = MainService(
-    settings=settings,
-)
+if arguments.workers > 1 and not arguments.replay:
+    main_service = WorkersService(
+        settings=settings,
+        workers=arguments.workers,
+        resume=arguments.resume,
+    )
+else:
+    main_service = MainService(
+        settings=settings,
+        resume=arguments.resume,
+        replay=arguments.replay,
+    )
 email_service = EmailService(
     to=settings.email_to,
     host=settings.email_host,
@@ -49,9 +79,20 @@ email_service = EmailService(
 )
 
 loop = asyncio.get_event_loop()
-loop.add_signal_handler(
-    signal.SIGTERM,
-    lambda: loop.run_until_complete(email_service.logger_sink(message="Send SIGTERM")),
-)
-coroutine = main(main_service=main_service, email_service=email_service)
-loop.run_until_complete(coroutine)
+main_task = loop.create_task(main(main_service=main_service, email_service=email_service))
+
+
+def stop():
+    """
+    Stop gracefully on SIGTERM: stop requests, save downloaded records and checkpoints
+    """
+    logger.warning("Got SIGTERM, stopping.")
+    loop.create_task(email_service.logger_sink(message="Send SIGTERM"))
+    main_task.cancel()
+
+
+loop.add_signal_handler(signal.SIGTERM, stop)
+try:
+    loop.run_until_complete(main_task)
+except asyncio.CancelledError:
+    logger.info("Stopped by SIGTERM, run with --resume to continue.")
@@ -0,0 +1 @@
+from .fake_graph import FakeGraphServer
@@ -0,0 +1,128 @@
+import asyncio
+import resource
+import sys
+import time
+from argparse import ArgumentParser
+
+from loguru import logger
+from tortoise import Tortoise
+
+from .fake_graph import FakeGraphServer
+from ..services import DatabaseService, MainService, WorkersService
+from ..settings import Settings
+
+
+async def count_rows() -> dict:
+    return {
+        model._meta.db_table: await model.all().count()
+        for model in Tortoise.apps["models"].values()
+    }
+
+
+async def benchmark(
+        server: FakeGraphServer,
+        settings_kwargs: dict,
+        env_filepath: str = None,
+        workers: int = 1,
+        replay: str = None,
+):
+    """
+    Run MainService or WorkersService against fake Graph API server and print run metrics
+
+    Worker processes can't share in-memory SQLite database, so with several workers
+    database must be defined. With replay records are saved from archive of responses
+    instead of fake server.
+    """
+    async with server:
+        settings = Settings(
+            _env_file=env_filepath,
+            **{
+                "email_to": "benchmark@localhost",
+                "email_host": "localhost",
+                "email_port": 25,
+                "email_username": "benchmark",
+                "email_password": "benchmark",
+                **settings_kwargs,
+                "fb_pages_base_url": server.url,
+                "fb_pages_access_tokens": server.access_tokens,
+            },
+        )
+        if workers > 1 and replay is None:
+            main_service = WorkersService(settings=settings, workers=workers)
+        else:
+            main_service = MainService(settings=settings, replay=replay)
+
+        started_at = time.monotonic()
+        async with main_service:
+            wall_time = time.monotonic() - started_at
+            if workers <= 1:
+                rows = await count_rows()
+        if workers > 1:
+            async with DatabaseService(db_url=settings.db_url):
+                rows = await count_rows()
+
+    rows_count = sum(rows.values())
+    peak_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    print(f"Wall time:          {wall_time:.2f} s")
+    print(f"HTTP requests:      {server.http_requests_count}"
+          f" ({server.http_requests_count / wall_time:.1f} req/s)")
+    print(f"Graph requests:     {server.graph_requests_count}"
+          f" ({server.graph_requests_count / wall_time:.1f} req/s)")
+    print(f"Graph errors:       {server.errors_count}")
+    print(f"Not modified:       {server.not_modified_count}")
+    print(f"Response size:      {server.response_bytes / 1024:.1f} KiB")
+    print(f"Rows in database:   {rows_count} ({rows_count / wall_time:.1f} rows/s)")
+    for table, count in sorted(rows.items()):
+        print(f"    {table}: {count}")
+    print(f"Peak RSS:           {peak_rss / 1024:.1f} MiB")
+
+
+parser = ArgumentParser(
+    description="Benchmark of Facebook Pages Downloader with fake Graph API server",
+)
+parser.add_argument("-e", "--env", type=str, dest="env_filepath", help="Environment filepath")
+parser.add_argument("--db-url", type=str, default="sqlite://:memory:", help="Database URL")
+parser.add_argument("--accounts", type=int, default=1, help="Number of access tokens")
+parser.add_argument("--pages", type=int, default=2, help="Number of pages per account")
+parser.add_argument("--posts", type=int, default=200, help="Number of posts per page")
+parser.add_argument("--attachments", type=int, default=1, help="Number of attachments per post")
+parser.add_argument("--insight-days", type=int, default=30, help="Number of insight values")
+parser.add_argument("--latency", type=float, default=0.01, help="Response latency in seconds")
+parser.add_argument("--error-rate", type=float, default=0, help="Share of failed requests")
+parser.add_argument("--rate-limit", type=int, default=None, help="Requests per minute")
+parser.add_argument("--max-limit", type=int, default=None, help="Max items per page")
+parser.add_argument("--connections", type=int, default=10, help="Connections limit")
+parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+parser.add_argument("--replay", type=str, default=None, help="Archive of Graph API responses")
+parser.add_argument("--log-level", type=str, default="WARNING", help="Log level")
+
+arguments = parser.parse_args()
+
+logger.remove()
+logger.add(sys.stderr, level=arguments.log_level)
+
+fake_graph_server = FakeGraphServer(
+    accounts=arguments.accounts,
+    pages=arguments.pages,
+    posts=arguments.posts,
+    attachments=arguments.attachments,
+    insight_days=arguments.insight_days,
+    latency=arguments.latency,
+    error_rate=arguments.error_rate,
+    rate_limit=arguments.rate_limit,
+    max_limit=arguments.max_limit,
+)
+coroutine = benchmark(
+    server=fake_graph_server,
+    settings_kwargs={
+        "db_url": arguments.db_url,
+        "fb_pages_connections_limit": arguments.connections,
+    },
+    env_filepath=arguments.env_filepath,
+    workers=arguments.workers,
+    replay=arguments.replay,
+)
+asyncio.get_event_loop().run_until_complete(coroutine)
@@ -0,0 +1,449 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import yarl
+from aiohttp import web
+from facet import ServiceMixin
+from loguru import logger
+
+
+LIFETIME_VALUE = {
+    "share": 3,
+    "like": 20,
+    "comment": 5,
+    "anger": 1,
+    "love": 4,
+    "video play": 7,
+    "link clicks": 9,
+    "other clicks": 11,
+}
+
+
+def split_fields(fields: str) -> List[str]:
+    """
+    Split fields parameter by commas which are not inside of braces or parentheses
+    """
+    result, depth, start = [], 0, 0
+    for index, char in enumerate(fields):
+        if char in "({":
+            depth += 1
+        elif char in ")}":
+            depth -= 1
+        elif char == "," and depth == 0:
+            result.append(fields[start:index])
+            start = index + 1
+    result.append(fields[start:])
+    return [field for field in result if field]
+
+
+def select_fields(
+        item: Dict[str, Any],
+        query: Dict[str, str],
+        default: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Keep fields of item requested in fields parameter or default fields like Graph API does
+
+    Requested names are taken without nested fields and modifiers, for example "attachments"
+    of "attachments{type}". Item is returned as is without fields parameter and default fields.
+    """
+    names = [
+        field.split("{")[0].split(".")[0]
+        for field in split_fields(query.get("fields", ""))
+    ] or list(default or ())
+    if not names:
+        return item
+    return {name: item[name] for name in ("id", *names) if name in item}
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime.datetime]:
+    if value is None:
+        return None
+    if value.isdigit():
+        return datetime.datetime.fromtimestamp(int(value), tz=datetime.timezone.utc)
+    return datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+
+
+class FakeGraphServer(ServiceMixin):
+    """
+    Local server which imitates Facebook Graph API endpoints used by Facebook Pages Downloader
+
+    Server generates accounts, pages, posts, attachments and insights deterministically from
+    its configuration, supports paging, nested fields of posts and batch requests. Latency,
+    errors and rate limits can be injected:
+
+    * latency - seconds to wait before every response
+    * error_rate - share of requests which fail with transient error
+    * rate_limit - number of requests per minute; usage is reported in X-App-Usage header
+      and after limit requests fail with error code 4
+    * max_limit - max number of items per page; requests with bigger limit fail with error
+      asking to reduce the amount of data
+
+    Successful responses have ETag, requests with the same If-None-Match get 304 response.
+    """
+
+    PAGE_SIZE = 25
+    PAGE_DEFAULT_FIELDS = ("id", "name")
+    POST_DEFAULT_FIELDS = ("id", "created_time", "message", "story")
+    DATE_FORMAT = "%Y-%m-%dT%H:%M:%S+0000"
+
+    def __init__(
+            self,
+            accounts: int = 1,
+            pages: int = 1,
+            posts: int = 100,
+            attachments: int = 1,
+            insight_days: int = 30,
+            latency: float = 0,
+            error_rate: float = 0,
+            rate_limit: Optional[int] = None,
+            max_limit: Optional[int] = None,
+            version: str = "v10.0",
+            host: str = "127.0.0.1",
+            port: int = 0,
+            seed: int = 0,
+    ):
+        self._accounts = accounts
+        self._pages = pages
+        self._posts = posts
+        self._attachments = attachments
+        self._insight_days = insight_days
+        self._latency = latency
+        self._error_rate = error_rate
+        self._rate_limit = rate_limit
+        self._max_limit = max_limit
+        self._version = version
+        self._host = host
+        self._port = port
+        self._random = random.Random(seed)
+        self._requests_times: Deque[float] = deque()
+        self._now = datetime.datetime.now(tz=datetime.timezone.utc).replace(
+            minute=0,
+            second=0,
+            microsecond=0,
+        )
+        self._runner = None
+        self.url = None
+        self.http_requests_count = 0
+        self.graph_requests_count = 0
+        self.errors_count = 0
+        self.not_modified_count = 0
+        self.response_bytes = 0
+
+    @property
+    def access_tokens(self) -> List[str]:
+        return [f"user_token_{number}" for number in range(self._accounts)]
+
+    async def start(self):
+        if self._runner is None:
+            application = web.Application()
+            application.router.add_get("/{path:.*}", self.handle_get)
+            application.router.add_post("/", self.handle_batch)
+            self._runner = web.AppRunner(application, access_log=None)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, host=self._host, port=self._port)
+            await site.start()
+            host, port = self._runner.addresses[0][:2]
+            self.url = f"http://{host}:{port}"
+            logger.info("Fake Graph API server started: url={}", self.url)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info("Fake Graph API server stopped.")
+
+    def get_usage(self) -> float:
+        if self._rate_limit is None:
+            return 0
+        now = time.monotonic()
+        while self._requests_times and self._requests_times[0] < now - 60:
+            self._requests_times.popleft()
+        return len(self._requests_times) * 100 / self._rate_limit
+
+    def get_headers(self) -> Dict[str, str]:
+        usage = min(round(self.get_usage()), 100)
+        return {
+            "X-App-Usage": json.dumps({
+                "call_count": usage,
+                "total_cputime": usage // 2,
+                "total_time": usage // 2,
+            }),
+        }
+
+    async def handle_get(self, request: web.Request) -> web.Response:
+        self.http_requests_count += 1
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        status, payload = self.resolve(path=request.path, query=dict(request.query))
+        body, etag = self.encode(status=status, payload=payload)
+        self.response_bytes += len(body)
+        headers = self.get_headers()
+        if etag is not None:
+            headers["ETag"] = etag
+            if request.headers.get("If-None-Match") == etag:
+                self.not_modified_count += 1
+                return web.Response(status=304, headers=headers)
+        return web.Response(
+            body=body,
+            status=status,
+            headers=headers,
+            content_type="application/json",
+        )
+
+    async def handle_batch(self, request: web.Request) -> web.Response:
+        self.http_requests_count += 1
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        form = await request.post()
+        include_headers = form.get("include_headers", "true") == "true"
+        responses = []
+        for sub_request in json.loads(form["batch"]):
+            url = yarl.URL("/" + sub_request["relative_url"])
+            status, payload = self.resolve(path=url.path, query=dict(url.query))
+            body, etag = self.encode(status=status, payload=payload)
+            self.response_bytes += len(body)
+            request_headers = {
+                header["name"]: header["value"]
+                for header in sub_request.get("headers", ())
+            }
+            response = {"code": status, "body": body}
+            if etag is not None and request_headers.get("If-None-Match") == etag:
+                self.not_modified_count += 1
+                response = {"code": 304, "body": None}
+            if include_headers:
+                response["headers"] = [] if etag is None else [{"name": "ETag", "value": etag}]
+            responses.append(response)
+        return web.json_response(responses, headers=self.get_headers())
+
+    @staticmethod
+    def encode(status: int, payload: Any) -> Tuple[str, Optional[str]]:
+        """
+        Encode payload to body and get ETag of body of successful response
+        """
+        body = json.dumps(payload)
+        if status != 200:
+            return body, None
+        return body, f'"{hashlib.md5(body.encode()).hexdigest()}"'
+
+    def resolve(self, path: str, query: Dict[str, str]) -> Tuple[int, Any]:
+        self.graph_requests_count += 1
+        if self._rate_limit is not None:
+            self._requests_times.append(time.monotonic())
+            if self.get_usage() > 100:
+                return self.error(status=400, code=4, message="Application request limit reached")
+        if self._error_rate and self._random.random() < self._error_rate:
+            return self.error(status=500, code=2, message="Service temporarily unavailable")
+        if self._max_limit is not None and int(query.get("limit", 0)) > self._max_limit:
+            return self.error(
+                status=500,
+                code=1,
+                message=(
+                    "Please reduce the amount of data you're asking for, "
+                    "then retry your request"
+                ),
+            )
+
+        parts = path.strip("/").split("/")
+        if len(parts) < 2 or parts[0] != self._version:
+            return self.error(status=400, code=100, message="Unknown path")
+        object_id, edge = parts[1], "/".join(parts[2:])
+
+        if object_id == "me" and edge == "accounts":
+            return self.paginate(path, query, self.get_accounts(query.get("access_token", "")))
+        if "_" in object_id:
+            if edge == "":
+                return 200, self.get_post(object_id, query)
+            if edge == "attachments":
+                attachments = [
+                    select_fields(attachment, query)
+                    for attachment in self.get_attachments(object_id)
+                ]
+                return self.paginate(path, query, attachments)
+            if edge == "insights":
+                return self.paginate(path, query, self.get_insights(object_id, query))
+        else:
+            if edge == "":
+                return 200, select_fields(
+                    self.get_page(object_id),
+                    query,
+                    self.PAGE_DEFAULT_FIELDS,
+                )
+            if edge == "published_posts":
+                return self.paginate_posts(path, query, object_id)
+            if edge == "insights":
+                return self.paginate(path, query, self.get_insights(object_id, query))
+        return self.error(status=400, code=100, message=f"Unknown edge: {edge}")
+
+    def error(self, status: int, code: int, message: str) -> Tuple[int, Any]:
+        self.errors_count += 1
+        return status, {
+            "error": {
+                "message": message,
+                "type": "OAuthException",
+                "code": code,
+                "is_transient": code == 2,
+            },
+        }
+
+    def paginate(
+            self,
+            path: str,
+            query: Dict[str, str],
+            items: List[Any],
+            count: Optional[int] = None,
+    ) -> Tuple[int, Any]:
+        """
+        Make page of items, items can be already sliced if their count is defined
+        """
+        offset = int(query.get("after", 0))
+        limit = int(query.get("limit", self.PAGE_SIZE))
+        if count is None:
+            count = len(items)
+            items = items[offset:offset + limit]
+        payload = {"data": items, "paging": {}}
+        if offset + limit < count:
+            next_query = {**query, "after": str(offset + limit)}
+            payload["paging"]["next"] = str(
+                yarl.URL(self.url).with_path(path).with_query(next_query),
+            )
+        return 200, payload
+
+    def get_accounts(self, access_token: str) -> List[Dict[str, Any]]:
+        if not access_token.startswith("user_token_"):
+            return []
+        account_number = int(access_token[len("user_token_"):])
+        return [
+            {
+                "id": page_id,
+                "name": f"Page {page_id}",
+                "access_token": f"page_token_{page_id}",
+            }
+            for page_id in (
+                str(1000 + account_number * self._pages + number)
+                for number in range(self._pages)
+            )
+        ]
+
+    def get_page(self, page_id: str) -> Dict[str, Any]:
+        return {
+            "id": page_id,
+            "name": f"Page {page_id}",
+            "about": "Fake page",
+            "category": "Media",
+            "category_list": [{"id": "1", "name": "Media"}],
+            "checkins": 10,
+            "link": f"https://example.com/{page_id}",
+            "username": f"page{page_id}",
+            "were_here_count": 5,
+            "fan_count": 1000,
+            "followers_count": 1200,
+            "cover": {"id": "1", "source": f"https://example.com/{page_id}/cover.jpg"},
+        }
+
+    def get_post_created_time(self, number: int) -> datetime.datetime:
+        return self._now - datetime.timedelta(hours=number)
+
+    def get_post(self, id_: str, query: Dict[str, str]) -> Dict[str, Any]:
+        page_id, post_id = id_.split("_")
+        created_time = self.get_post_created_time(int(post_id)).strftime(self.DATE_FORMAT)
+        post = {
+            "id": id_,
+            "created_time": created_time,
+            "updated_time": created_time,
+            "message": f"Post {post_id} of page {page_id}",
+            "is_hidden": False,
+            "is_published": True,
+            "privacy": {"value": "EVERYONE"},
+            "shares": {"count": int(post_id) % 7},
+            "status_type": "added_photos",
+            "permalink_url": f"https://example.com/{page_id}/posts/{post_id}",
+            "from": {"id": page_id, "name": f"Page {page_id}"},
+        }
+        post = select_fields(post, query, self.POST_DEFAULT_FIELDS)
+
+        for field in split_fields(query.get("fields", "")):
+            if field.startswith("attachments"):
+                nested_query = {"fields": field[field.index("{") + 1:-1]} if "{" in field else {}
+                post["attachments"] = {"data": [
+                    select_fields(attachment, nested_query)
+                    for attachment in self.get_attachments(id_)
+                ]}
+            elif field.startswith("insights"):
+                metrics = field[field.index("(") + 1:field.index(")")]
+                post["insights"] = {"data": self.get_insights(id_, {"metric": metrics})}
+        return post
+
+    def paginate_posts(self, path: str, query: Dict[str, str], page_id: str) -> Tuple[int, Any]:
+        # Post number is its age in hours, so time bounds are converted to numbers
+        first, count = 0, self._posts
+        until = parse_time(query.get("until"))
+        if until is not None:
+            first = max(0, math.ceil((self._now - until).total_seconds() / 3600))
+        since = parse_time(query.get("since"))
+        if since is not None:
+            count = min(count, int((self._now - since).total_seconds() // 3600) + 1)
+        count = max(count - first, 0)
+        offset = int(query.get("after", 0))
+        limit = int(query.get("limit", self.PAGE_SIZE))
+        posts = [
+            self.get_post(f"{page_id}_{first + number}", query)
+            for number in range(offset, min(offset + limit, count))
+        ]
+        return self.paginate(path, query, posts, count=count)
+
+    def get_attachments(self, id_: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "type": "photo",
+                "title": f"Attachment {number}",
+                "url": f"https://example.com/{id_}/{number}",
+                "description": "Fake attachment",
+                "target": {"id": f"{id_}{number}", "url": f"https://example.com/{id_}"},
+                "media": {
+                    "image": {
+                        "height": 720,
+                        "width": 1280,
+                        "src": f"https://example.com/{id_}/{number}.jpg",
+                    },
+                },
+            }
+            for number in range(self._attachments)
+        ]
+
+    def get_insights(self, object_id: str, query: Dict[str, str]) -> List[Dict[str, Any]]:
+        period = query.get("period", "day" if "_" not in object_id else "lifetime")
+        insights = []
+        for metric in filter(None, query.get("metric", "").split(",")):
+            if period == "lifetime":
+                values = [{"value": dict(LIFETIME_VALUE)}]
+            else:
+                since = parse_time(query.get("since"))
+                until = parse_time(query.get("until"))
+                values = []
+                for day in range(self._insight_days - 1, -1, -1):
+                    end_time = (self._now - datetime.timedelta(days=day)).replace(hour=7)
+                    if since is not None and end_time < since:
+                        continue
+                    if until is not None and end_time > until:
+                        continue
+                    values.append({
+                        "value": self._random.randint(0, 1000),
+                        "end_time": end_time.strftime(self.DATE_FORMAT),
+                    })
+            insights.append({
+                "id": f"{object_id}/insights/{metric}/{period}",
+                "name": metric,
+                "period": period,
+                "values": values,
+                "title": metric,
+                "description": metric,
+            })
+        return insights
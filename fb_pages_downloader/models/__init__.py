@@ -1,3 +1,4 @@
+from .checkpoint import Checkpoint
 from .page import Page
 from .page_post import PagePost
 from .page_post_attachment import PagePostAttachment
@@ -17,3 +18,5 @@ from .page_video_view_time_day import PageVideoViewTimeDay
 from .post_activity_by_action_type_unique_lifetime import PostActivityByActionTypeUniqueLifetime
 from .post_clicks_by_type_unique_lifetime import PostClicksByTypeUniqueLifetime
 from .post_reactions_by_type_total_lifetime import PostReactionsByTypeTotalUniqueLifetime
+from .job import Job
+from .sync_state import SyncState
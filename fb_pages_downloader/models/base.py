@@ -66,4 +66,13 @@ class PageInsightAbstractModel(InsightMixinModel, PageAttributesAbstractModel):
 
 
 class PagePostInsightAbstractModel(InsightMixinModel, PagePostAttributesAbstractModel):
-    pass
+    """
+    Base abstract model for post insights which values are objects of counters by keys
+
+    VALUE_KEYS maps fields of model to keys of value object in Graph API payload.
+    """
+    VALUE_KEYS: Dict[str, str] = {}
+
+    @classmethod
+    def parse_value(cls, value: Dict[str, int]) -> Dict[str, int]:
+        return {field: value.get(key) for field, key in cls.VALUE_KEYS.items()}
@@ -0,0 +1,18 @@
+from tortoise import fields
+
+from .base import PageAttributesAbstractModel
+
+
+class Checkpoint(PageAttributesAbstractModel):
+    """
+    Progress of current run for endpoint of page
+
+    Position is created time of the oldest post which is saved with all posts before it.
+    """
+    endpoint = fields.CharField(max_length=1024, null=False)
+    completed = fields.BooleanField(null=False, default=False)
+    position = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "pages_checkpoint"
+        unique_together = (("page_id", "endpoint"),)
@@ -0,0 +1,60 @@
+import sys
+from array import array
+from itertools import repeat
+from typing import Any, Dict, Iterable, List, Sequence
+
+
+class PageInsightBatch:
+    """
+    Values of page insight metric stored in parallel arrays instead of row per value
+
+    Page ids and periods are repeated references to the same strings, dates are interned,
+    so dates of all metrics share the same strings, and values are kept in array of floats.
+    """
+
+    __slots__ = ("page_ids", "periods", "dates", "values")
+
+    def __init__(self):
+        self.page_ids: List[str] = []
+        self.periods: List[str] = []
+        self.dates: List[str] = []
+        self.values = array("d")
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def from_insight(cls, page_id: str, data: Dict[str, Any]) -> "PageInsightBatch":
+        """
+        Decode batch from Graph API insight object with values list
+        """
+        batch = cls()
+        batch.add(page_id=page_id, period=data["period"], values=data["values"])
+        return batch
+
+    @classmethod
+    def concat(cls, batches: Iterable["PageInsightBatch"]) -> "PageInsightBatch":
+        result = cls()
+        for batch in batches:
+            result.page_ids.extend(batch.page_ids)
+            result.periods.extend(batch.periods)
+            result.dates.extend(batch.dates)
+            result.values.extend(batch.values)
+        return result
+
+    def add(self, page_id: str, period: str, values: Sequence[Dict[str, Any]]):
+        self.page_ids.extend(repeat(page_id, len(values)))
+        self.periods.extend(repeat(period, len(values)))
+        self.dates.extend(sys.intern(value["end_time"]) for value in values)
+        self.values.extend(value["value"] for value in values)
+
+    def to_columns(self) -> Dict[str, Sequence[Any]]:
+        """
+        Get columns by fields of PageInsightAbstractModel
+        """
+        return {
+            "page_id": self.page_ids,
+            "m_period": self.periods,
+            "m_date": self.dates,
+            "value": self.values,
+        }
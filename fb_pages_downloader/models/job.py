@@ -0,0 +1,41 @@
+import enum
+
+from tortoise import fields
+
+from .base import PageAttributesAbstractModel
+
+
+class JobKindEnum(enum.Enum):
+    page = "page"
+    posts = "posts"
+    insights = "insights"
+    post_attachments = "post_attachments"
+    post_insights = "post_insights"
+
+
+class JobStatusEnum(enum.Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class Job(PageAttributesAbstractModel):
+    """
+    Job of loading one part of page data, jobs are shared between nodes through database
+
+    Target defines part of page: metrics for insights, post id for post attachments, post id
+    and metrics separated by colon for post insights.
+    """
+    id = fields.BigIntField(pk=True)
+    kind = fields.CharEnumField(JobKindEnum, null=False)
+    target = fields.CharField(max_length=1024, null=False, default="")
+    status = fields.CharEnumField(JobStatusEnum, null=False, index=True)
+    attempts = fields.IntField(null=False, default=0)
+    leased_until = fields.DatetimeField(null=True)
+    leased_by = fields.CharField(max_length=256, null=True)
+    error = fields.TextField(null=True)
+
+    class Meta:
+        table = "pages_job"
+        unique_together = (("kind", "page_id", "target"),)
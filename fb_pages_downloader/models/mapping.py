@@ -0,0 +1,118 @@
+import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S+0000"
+
+
+@lru_cache(maxsize=65536)
+def parse_datetime(value: str) -> datetime.datetime:
+    """
+    Parse Graph API time to naive datetime in UTC, the same times are parsed once
+    """
+    return datetime.datetime.strptime(value, DATE_FORMAT)
+
+
+@lru_cache(maxsize=65536)
+def parse_utc_datetime(value: str) -> datetime.datetime:
+    return parse_datetime(value).replace(tzinfo=datetime.timezone.utc)
+
+
+def get_page_id(id_: str) -> str:
+    return id_.split("_", 1)[0]
+
+
+def get_post_id(id_: str) -> str:
+    return id_.split("_", 1)[-1]
+
+
+class Source(NamedTuple):
+    """
+    Source of model field in Graph API payload
+
+    Key can be dotted path to value of nested object. Converter isn't called for missing
+    values.
+    """
+    key: str
+    converter: Optional[Callable[[Any], Any]] = None
+
+
+class Mapping:
+    """
+    Declarative mapping of Graph API payload to model fields
+
+    Mapping is defined with field names and their sources and is compiled to extract and
+    extract_many functions when it's created, so payloads are converted without looking
+    up mapping for every record, and records of whole Graph API page are converted in one
+    pass:
+
+        MAPPING = Mapping(
+            id="id",
+            check_ins="checkins",
+            created_time=Source("created_time", converter=parse_datetime),
+            shares_count="shares.count",
+        )
+    """
+
+    def __init__(self, **fields: Union[str, Source]):
+        self.fields = {
+            field: Source(source) if isinstance(source, str) else source
+            for field, source in fields.items()
+        }
+        self.extract: Callable[[Dict[str, Any]], Dict[str, Any]]
+        self.extract_many: Callable[[Iterable[Dict[str, Any]]], List[Dict[str, Any]]]
+        self.extract, self.extract_many = self.compile()
+
+    def compile(self) -> Tuple[Callable, Callable]:
+        """
+        Generate source of extractor functions for one payload and for many payloads
+        """
+        namespace = {}
+        statements, items = [], []
+        for number, (field, source) in enumerate(self.fields.items()):
+            keys = source.key.split(".")
+            expression = f"data.get({keys[0]!r})"
+            for key in keys[1:]:
+                expression = f"({expression} or {{}}).get({key!r})"
+            if source.converter is not None:
+                namespace[f"convert_{number}"] = source.converter
+                statements.append(f"value_{number} = {expression}")
+                expression = (
+                    f"None if value_{number} is None else convert_{number}(value_{number})"
+                )
+            items.append(f"{field!r}: {expression}")
+        row = "{" + ", ".join(items) + "}"
+
+        lines = [
+            "def extract(data):",
+            *(f"    {statement}" for statement in statements),
+            f"    return {row}",
+            "",
+            "def extract_many(records):",
+            "    rows = []",
+            "    append = rows.append",
+            "    for data in records:",
+            *(f"        {statement}" for statement in statements),
+            f"        append({row})",
+            "    return rows",
+        ]
+        exec(compile("\n".join(lines), "<mapping>", "exec"), namespace)
+        return namespace["extract"], namespace["extract_many"]
+
+    def get_fields(self) -> List[str]:
+        """
+        Get Graph API fields which are sources of mapping fields, for fields parameter
+        """
+        return list(dict.fromkeys(source.key.split(".")[0] for source in self.fields.values()))
+
+    def without(self, fields: Iterable[str]) -> "Mapping":
+        """
+        Make mapping without given fields
+        """
+        excluded = set(fields)
+        return Mapping(**{
+            field: source
+            for field, source in self.fields.items()
+            if field not in excluded
+        })
@@ -1,10 +1,41 @@
 from tortoise import fields
 
 from .base import BaseAbstractModel
+from .mapping import Mapping
 from .utils import non_negative_validator, phone_number_validator
 
 
 class Page(BaseAbstractModel):
+    MAPPING = Mapping(
+        id="id",
+        name="name",
+        about="about",
+        affiliation="affiliation",
+        app_id="app_id",
+        artists_we_like="artists_we_like",
+        bio="bio",
+        birthday="birthday",
+        booking_agent="booking_agent",
+        built="built",
+        can_check_in="can_checkin",
+        can_post="can_post",
+        category="category",
+        category_list="category_list",
+        check_ins="checkins",
+        contact_address="contact_address",
+        current_location="current_location",
+        description="description",
+        directed_by="directed_by",
+        emails="emails",
+        hours="hours",
+        link="link",
+        location="location",
+        mission="mission",
+        username="username",
+        were_here_count="were_here_count",
+        whatsapp_number="whatsapp_number",
+    )
+
     id = fields.CharField(max_length=64, pk=True)
     name = fields.CharField(max_length=64)
     about = fields.TextField(null=True)
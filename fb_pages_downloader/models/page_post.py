@@ -1,10 +1,31 @@
 from tortoise import fields
 
 from .base import PageAttributesAbstractModel
+from .mapping import Mapping, Source, get_page_id, get_post_id, parse_datetime
 from .utils import non_negative_validator
 
 
 class PagePost(PageAttributesAbstractModel):
+    MAPPING = Mapping(
+        id="id",
+        page_id=Source("id", converter=get_page_id),
+        post_id=Source("id", converter=get_post_id),
+        created_time=Source("created_time", converter=parse_datetime),
+        eligible_for_promotion="is_eligible_for_promotion",
+        expired="is_expired",
+        full_picture="full_picture",
+        hidden="is_hidden",
+        message="message",
+        popular="is_popular",
+        published="is_published",
+        privacy="privacy",
+        promotable_id="promotable_id",
+        shares_count="shares.count",
+        status_type="status_type",
+        story="story",
+        updated_time=Source("updated_time", converter=parse_datetime),
+    )
+
     id = fields.CharField(max_length=64, pk=True)
     post_id = fields.CharField(max_length=64, null=False, index=True)
     created_time = fields.DatetimeField(null=False)
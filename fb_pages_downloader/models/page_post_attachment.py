@@ -1,9 +1,20 @@
 from tortoise import fields
 
 from .base import PagePostAttributesAbstractModel
+from .mapping import Mapping
+from .utils import non_negative_validator
 
 
 class PagePostAttachment(PagePostAttributesAbstractModel):
+    MAPPING = Mapping(
+        type="type",
+        url="url",
+        description="description",
+        title="title",
+        target="target",
+    )
+
+    position = fields.IntField(null=False, validators=[non_negative_validator])
     type = fields.CharField(max_length=64, null=False)
     title = fields.CharField(max_length=256, null=True)
     url = fields.TextField(null=True)
@@ -12,3 +23,4 @@ class PagePostAttachment(PagePostAttributesAbstractModel):
 
     class Meta:
         table = "pages_post_attachment"
+        unique_together = (("page_id", "post_id", "position"),)
@@ -8,3 +8,4 @@ class PagePostEngagementsDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_page_post_engagements"
+        unique_together = (("page_id", "m_date"),)
@@ -8,3 +8,4 @@ class PagePostImpressionNonviralUniqueDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_unique_page_posts_impressions_nonviral"
+        unique_together = (("page_id", "m_date"),)
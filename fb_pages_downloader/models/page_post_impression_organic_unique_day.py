@@ -8,3 +8,4 @@ class PagePostImpressionOrganicUniqueDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_unique_page_posts_impressions_organic"
+        unique_together = (("page_id", "m_date"),)
@@ -8,3 +8,4 @@ class PagePostImpressionUniqueDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_unique_page_posts_impressions"
+        unique_together = (("page_id", "m_date"),)
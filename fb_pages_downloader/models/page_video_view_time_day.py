@@ -8,3 +8,4 @@ class PageVideoViewTimeDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_page_video_view_time"
+        unique_together = (("page_id", "m_date"),)
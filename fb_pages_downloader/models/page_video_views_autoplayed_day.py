@@ -8,3 +8,4 @@ class PageVideoViewsAutoplayedDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_page_video_views_autoplayed"
+        unique_together = (("page_id", "m_date"),)
@@ -8,3 +8,4 @@ class PageVideoViewsClickToPlayDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_page_video_views_click_to_play"
+        unique_together = (("page_id", "m_date"),)
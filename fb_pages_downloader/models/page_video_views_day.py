@@ -8,3 +8,4 @@ class PageVideoViewsDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_page_video_views"
+        unique_together = (("page_id", "m_date"),)
@@ -8,3 +8,4 @@ class PageVideoViewsOrganicDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_page_video_views_organic"
+        unique_together = (("page_id", "m_date"),)
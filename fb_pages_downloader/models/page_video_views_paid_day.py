@@ -8,3 +8,4 @@ class PageVideoViewsPaidDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_page_video_views_paid"
+        unique_together = (("page_id", "m_date"),)
@@ -8,3 +8,4 @@ class PageVideoViewsUniqueDay(PageInsightAbstractModel):
 
     class Meta:
         table = "pages_daily_unique_page_video_views"
+        unique_together = (("page_id", "m_date"),)
@@ -1,5 +1,3 @@
-from typing import Dict
-
 from tortoise import fields
 
 from .base import PagePostInsightAbstractModel
@@ -9,18 +7,16 @@ from .utils import PeriodEnum
 class PostActivityByActionTypeUniqueLifetime(PagePostInsightAbstractModel):
     METRIC = "post_activity_by_action_type_unique"
     PERIOD = PeriodEnum.life_time
+    VALUE_KEYS = {
+        "shares": "share",
+        "likes": "like",
+        "comments": "comment",
+    }
 
     shares = fields.IntField(null=True)
     likes = fields.IntField(null=True)
     comments = fields.IntField(null=True)
 
-    @staticmethod
-    def parse_value(value: Dict[str, int]) -> Dict[str, int]:
-        return {
-            "shares": value.get("share"),
-            "likes": value.get("like"),
-            "comments": value.get("comment"),
-        }
-
     class Meta:
         table = "pages_life_time_unique_post_activity_by_action_type"
+        unique_together = (("page_id", "post_id", "m_period"),)
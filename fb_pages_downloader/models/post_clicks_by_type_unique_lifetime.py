@@ -1,5 +1,3 @@
-from typing import Dict
-
 from tortoise import fields
 
 from .base import PagePostInsightAbstractModel
@@ -9,18 +7,16 @@ from .utils import PeriodEnum
 class PostClicksByTypeUniqueLifetime(PagePostInsightAbstractModel):
     METRIC = "post_clicks_by_type_unique"
     PERIOD = PeriodEnum.life_time
+    VALUE_KEYS = {
+        "video_plays": "video play",
+        "link_clicks": "link clicks",
+        "other_clicks": "other clicks",
+    }
 
     video_plays = fields.IntField(null=True)
     link_clicks = fields.IntField(null=True)
     other_clicks = fields.IntField(null=True)
 
-    @staticmethod
-    def parse_value(value: Dict[str, int]) -> Dict[str, int]:
-        return {
-            "video_plays": value.get("video play"),
-            "link_clicks": value.get("link clicks"),
-            "other_clicks": value.get("other clicks"),
-        }
-
     class Meta:
         table = "pages_life_time_unique_post_clicks_by_type"
+        unique_together = (("page_id", "post_id", "m_period"),)
@@ -1,5 +1,3 @@
-from typing import Dict
-
 from tortoise import fields
 
 from .base import PagePostInsightAbstractModel
@@ -9,18 +7,16 @@ from .utils import PeriodEnum
 class PostReactionsByTypeTotalUniqueLifetime(PagePostInsightAbstractModel):
     METRIC = "post_reactions_by_type_total"
     PERIOD = PeriodEnum.life_time
+    VALUE_KEYS = {
+        "likes": "like",
+        "angers": "anger",
+        "loves": "love",
+    }
 
     likes = fields.IntField(null=True)
     angers = fields.IntField(null=True)
     loves = fields.IntField(null=True)
 
-    @staticmethod
-    def parse_value(value: Dict[str, int]) -> Dict[str, int]:
-        return {
-            "likes": value.get("like"),
-            "angers": value.get("anger"),
-            "loves": value.get("love"),
-        }
-
     class Meta:
         table = "pages_life_time_post_reactions_by_type_total"
+        unique_together = (("page_id", "post_id", "m_period"),)
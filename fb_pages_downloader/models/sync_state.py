@@ -0,0 +1,12 @@
+from tortoise import fields
+
+from .base import PageAttributesAbstractModel
+
+
+class SyncState(PageAttributesAbstractModel):
+    endpoint = fields.CharField(max_length=128, null=False)
+    watermark = fields.DatetimeField(null=False)
+
+    class Meta:
+        table = "pages_sync_state"
+        unique_together = (("page_id", "endpoint"),)
@@ -1,3 +1,5 @@
 from .database import DatabaseService
 from .email import EmailService
+from .insights_store import InsightsStore
 from .main import MainService
+from .workers import WorkersService
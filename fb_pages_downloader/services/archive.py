@@ -0,0 +1,143 @@
+import asyncio
+import datetime
+import gzip
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, Optional, Tuple
+
+import yarl
+from facet import ServiceMixin
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class ResponseArchive(ServiceMixin):
+    """
+    Append-only archive of raw Graph API responses
+
+    Every response is a line of NDJSON file with request path, query parameters and payload
+    without access tokens: access_token keys and parameters of URLs, for example of paging
+    links, are removed, so page tokens of accounts are not saved. Files are compressed with
+    zstd if zstandard package is installed, otherwise with gzip, and are partitioned by page,
+    endpoint and run:
+
+        <path>/<page id>/<endpoint>/<run>-<process id>.ndjson.zst
+
+    Every line is appended as separate compressed frame, so file stays readable if process
+    is killed. Archive or any directory of it can be read back in order of runs.
+
+    Lines are compressed and written in one thread of executor, so event loop isn't blocked
+    by disk.
+    """
+
+    EXTENSIONS = (".ndjson.zst", ".ndjson.gz")
+
+    def __init__(self, path: str, run: Optional[str] = None):
+        self._path = Path(path)
+        self._run = run or datetime.datetime.now(tz=datetime.timezone.utc).strftime(
+            "%Y%m%dT%H%M%S",
+        )
+        self._extension = self.EXTENSIONS[0] if zstandard is not None else self.EXTENSIONS[1]
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        logger.info("Response archive started: path={}", self._path)
+
+    async def stop(self):
+        self._executor.shutdown()
+        self._executor = None
+        logger.info("Response archive stopped.")
+
+    @staticmethod
+    def open(path: Path, mode: str) -> IO[bytes]:
+        if path.name.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"Package zstandard is needed to read '{path}'")
+            file = zstandard.open(path, mode)
+            # Reader of zstandard can't read lines itself
+            return io.BufferedReader(file) if "r" in mode else file
+        return gzip.open(path, mode)
+
+    @staticmethod
+    def get_endpoint(url: yarl.URL) -> Tuple[str, str]:
+        """
+        Get page id and endpoint name of Graph API URL
+
+        Endpoint of object itself is "page" or "post", endpoints of post edges are prefixed
+        with "post_", for example "post_attachments".
+        """
+        parts = url.parts[2:]
+        if not parts:
+            return "unknown", "unknown"
+        page_id, _, post_id = parts[0].partition("_")
+        kind = "post" if post_id else "page"
+        if len(parts) == 1:
+            return page_id, kind
+        edge = "_".join(parts[1:])
+        return page_id, f"post_{edge}" if post_id else edge
+
+    @classmethod
+    def strip_access_tokens(cls, value: Any) -> Any:
+        """
+        Get copy of payload without access_token keys and access_token parameters of URLs
+        """
+        if isinstance(value, dict):
+            return {
+                key: cls.strip_access_tokens(item)
+                for key, item in value.items()
+                if key != "access_token"
+            }
+        if isinstance(value, list):
+            return [cls.strip_access_tokens(item) for item in value]
+        if isinstance(value, str) and "access_token=" in value and value.startswith("http"):
+            url = yarl.URL(value)
+            return str(url.with_query({
+                key: item
+                for key, item in url.query.items()
+                if key != "access_token"
+            }))
+        return value
+
+    async def write(self, url: yarl.URL, params: Optional[Dict[str, Any]], payload: Any):
+        query = {**url.query, **(params or {})}
+        query.pop("access_token", None)
+        # Copy of payload is written in executor, so consumer can change payload meanwhile
+        record = {"path": url.path, "params": query, "payload": self.strip_access_tokens(payload)}
+        page_id, endpoint = self.get_endpoint(url)
+        await asyncio.get_event_loop().run_in_executor(
+            self._executor,
+            self._append,
+            self._path / page_id / endpoint,
+            record,
+        )
+
+    def _append(self, directory: Path, record: Dict[str, Any]):
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self._run}-{os.getpid()}{self._extension}"
+        with self.open(path, "ab") as file:
+            file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+
+    @classmethod
+    def read(cls, path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Read records of all archive files under path, files of earlier runs go first
+        """
+        root = Path(path)
+        files = [root] if root.is_file() else [
+            file
+            for file in root.rglob("*")
+            if file.is_file() and file.name.endswith(cls.EXTENSIONS)
+        ]
+        for file in sorted(files, key=lambda file: (file.name, str(file))):
+            logger.info("Reading archive file: path={}", file)
+            with cls.open(file, "rb") as lines:
+                for line in lines:
+                    yield json.loads(line)
@@ -1,6 +1,7 @@
+import datetime
 import re
 from functools import lru_cache
-from typing import Any, Callable, Dict, List, Optional, Type
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Type
 
 from facet import ServiceMixin
 from loguru import logger
@@ -8,11 +9,14 @@ from tortoise import Tortoise, models
 
 from .. import models
 from ..models import (
+    Checkpoint,
     Page,
     PagePost,
     PagePostAttachment,
+    SyncState,
 )
-from ..models.base import BaseAbstractModel
+from ..models.base import BaseAbstractModel, PageInsightAbstractModel
+from ..models.mapping import DATE_FORMAT, parse_datetime
 
 
 @lru_cache()
@@ -39,6 +43,208 @@ def generate_create_function(model: Type[BaseAbstractModel]) -> Callable:
     return create
 
 
+MAX_QUERY_PARAMETERS = {
+    "postgres": 32767,
+    "sqlite": 999,
+}
+AUTO_FIELDS = ("created_at", "updated_at")
+
+
+def to_utc(value: datetime.datetime) -> datetime.datetime:
+    """
+    Convert datetime from database to UTC, naive datetimes are stored in UTC
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def get_conflict_fields(model: Type[BaseAbstractModel]) -> Tuple[str, ...]:
+    """
+    Get fields which identify record of model: first unique together fields or primary key
+    """
+    if model._meta.unique_together:
+        return tuple(model._meta.unique_together[0])
+    return (model._meta.pk_attr,)
+
+
+def quote(name: str) -> str:
+    return f'"{name}"'
+
+
+def get_placeholders(dialect: str, count: int, start: int = 1) -> List[str]:
+    if dialect == "postgres":
+        return [f"${number}" for number in range(start, start + count)]
+    return ["?"] * count
+
+
+def build_upsert_query(
+        table: str,
+        columns: List[str],
+        conflict_columns: List[str],
+        rows_count: int,
+        dialect: str,
+        where: Optional[str] = None,
+) -> str:
+    """
+    Build upsert query which updates existing records only if values of their columns change
+
+    Unchanged records keep their updated_at and aren't written at all. On PostgreSQL query
+    returns written records, so they can be counted. Condition where limits records which
+    can be updated, other existing records are kept as they are.
+    """
+    placeholders = iter(get_placeholders(dialect=dialect, count=len(columns) * rows_count))
+    values = ", ".join(
+        "(" + ", ".join(next(placeholders) for _ in columns) + ")"
+        for _ in range(rows_count)
+    )
+    compared_columns = [
+        column
+        for column in columns
+        if column not in conflict_columns and column not in AUTO_FIELDS
+    ]
+    if compared_columns:
+        updates = ", ".join(
+            f"{quote(column)} = EXCLUDED.{quote(column)}"
+            for column in columns
+            if column not in conflict_columns and column != "created_at"
+        )
+        operator = "IS DISTINCT FROM" if dialect == "postgres" else "IS NOT"
+        changes = " OR ".join(
+            f"{quote(table)}.{quote(column)} {operator} EXCLUDED.{quote(column)}"
+            for column in compared_columns
+        )
+        if where is not None:
+            changes = f"({changes}) AND {where}"
+        action = f"DO UPDATE SET {updates} WHERE {changes}"
+    else:
+        action = "DO NOTHING"
+    return (
+        f"INSERT INTO {quote(table)} ({', '.join(map(quote, columns))}) "
+        f"VALUES {values} "
+        f"ON CONFLICT ({', '.join(map(quote, conflict_columns))}) {action}"
+        f"{' RETURNING 1' if dialect == 'postgres' else ''}"
+    )
+
+
+async def execute_upsert(
+        model: Type[BaseAbstractModel],
+        fields: List[str],
+        values: List[List[Any]],
+        batch_size: int = 1000,
+        where: Optional[str] = None,
+) -> int:
+    """
+    Write rows of database values of fields and auto fields by batches of upsert queries
+
+    Return count of inserted or changed records.
+    """
+    meta = model._meta
+    columns = [meta.fields_db_projection[field] for field in (*fields, *AUTO_FIELDS)]
+    conflict_columns = [
+        meta.fields_db_projection[field]
+        for field in get_conflict_fields(model)
+    ]
+
+    connection = meta.db
+    dialect = connection.capabilities.dialect
+    max_rows = MAX_QUERY_PARAMETERS.get(dialect, 999) // len(columns)
+    max_rows = max(1, min(batch_size, max_rows))
+    changed = 0
+    for start in range(0, len(values), max_rows):
+        chunk = values[start:start + max_rows]
+        query = build_upsert_query(
+            table=meta.db_table,
+            columns=columns,
+            conflict_columns=conflict_columns,
+            rows_count=len(chunk),
+            dialect=dialect,
+            where=where,
+        )
+        count, _ = await connection.execute_query(
+            query,
+            [value for row in chunk for value in row],
+        )
+        changed += count
+    return changed
+
+
+@lru_cache()
+def generate_bulk_upsert_function(model: Type[BaseAbstractModel]) -> Callable:
+    meta = model._meta
+    conflict_fields = get_conflict_fields(model)
+
+    async def bulk_upsert(
+            rows: List[Dict[str, Any]],
+            batch_size: int = 1000,
+            where: Optional[str] = None,
+    ) -> int:
+        if not rows:
+            return 0
+
+        # One statement can not update the same record twice, so keep last row for every key
+        unique_rows = {tuple(row[field] for field in conflict_fields): row for row in rows}
+        fields = [field for field in rows[0] if field not in AUTO_FIELDS]
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        values = [
+            [meta.fields_map[field].to_db_value(row.get(field), model) for field in fields]
+            + [now, now]
+            for row in unique_rows.values()
+        ]
+        return await execute_upsert(
+            model=model,
+            fields=fields,
+            values=values,
+            batch_size=batch_size,
+            where=where,
+        )
+
+    return bulk_upsert
+
+
+@lru_cache()
+def generate_bulk_upsert_columns_function(model: Type[BaseAbstractModel]) -> Callable:
+    meta = model._meta
+    conflict_fields = get_conflict_fields(model)
+
+    async def bulk_upsert_columns(
+            columns: Dict[str, Sequence[Any]],
+            batch_size: int = 1000,
+    ) -> int:
+        if not columns or not len(next(iter(columns.values()))):
+            return 0
+
+        # Columns have few distinct values except measures, so every value is converted once
+        db_columns = {}
+        for field, column in columns.items():
+            to_db_value = meta.fields_map[field].to_db_value
+            cache = {}
+            db_columns[field] = [
+                cache[value] if value in cache else cache.setdefault(
+                    value,
+                    to_db_value(value, model),
+                )
+                for value in column
+            ]
+
+        keys = zip(*(db_columns[field] for field in conflict_fields))
+        indexes = {key: index for index, key in enumerate(keys)}.values()
+        fields = list(db_columns)
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        values = [
+            [db_columns[field][index] for field in fields] + [now, now]
+            for index in indexes
+        ]
+        return await execute_upsert(
+            model=model,
+            fields=fields,
+            values=values,
+            batch_size=batch_size,
+        )
+
+    return bulk_upsert_columns
+
+
 def camel_to_snake(string: str) -> str:
     return re.sub(r"\B([A-Z]+)", r"_\1", string).lower()
 
@@ -59,13 +265,96 @@ class DatabaseServiceMeta(type):
             attributes["generate_get_function"] = staticmethod(generate_get_function)
             attributes["generate_update_function"] = staticmethod(generate_update_function)
             attributes["generate_create_function"] = staticmethod(generate_create_function)
+            attributes["generate_bulk_upsert_function"] = staticmethod(
+                generate_bulk_upsert_function,
+            )
+            attributes["generate_bulk_upsert_columns_function"] = staticmethod(
+                generate_bulk_upsert_columns_function,
+            )
 
         return super().__new__(mcs, class_name, parents, attributes)
 
 
 class DatabaseService(ServiceMixin, metaclass=DatabaseServiceMeta):
-    def __init__(self, db_url: str):
+    def __init__(self, db_url: str, batch_size: int = 1000):
         self._db_url = db_url
+        self._batch_size = batch_size
+
+    async def bulk_upsert(
+            self,
+            model: Type[BaseAbstractModel],
+            rows: List[Dict[str, Any]],
+            where: Optional[str] = None,
+    ) -> int:
+        """
+        Insert records of model or update existing ones with the same unique key
+
+        Rows are written by batches, with one INSERT ... ON CONFLICT DO UPDATE statement per
+        batch. Key is first unique together fields of model or its primary key. Existing
+        records are updated only if their values change and they match SQL condition where,
+        count of written records is returned.
+        """
+        return await generate_bulk_upsert_function(model)(
+            rows=rows,
+            batch_size=self._batch_size,
+            where=where,
+        )
+
+    async def bulk_upsert_columns(
+            self,
+            model: Type[BaseAbstractModel],
+            columns: Dict[str, Sequence[Any]],
+    ) -> int:
+        """
+        Insert or update records of model given as parallel columns of field values
+
+        It works like bulk_upsert, but rows are not built as dicts.
+        """
+        return await generate_bulk_upsert_columns_function(model)(
+            columns=columns,
+            batch_size=self._batch_size,
+        )
+
+    @staticmethod
+    async def get_sync_watermarks(page_id: str) -> Dict[str, datetime.datetime]:
+        """
+        Get watermarks of last successful synchronization of page endpoints in UTC
+        """
+        return {
+            state.endpoint: to_utc(state.watermark)
+            for state in await SyncState.filter(page_id=page_id)
+        }
+
+    @staticmethod
+    async def get_page_insight_dates(
+            model: Type[PageInsightAbstractModel],
+            page_id: str,
+            since: datetime.date,
+    ) -> Set[datetime.date]:
+        """
+        Get end dates of stored values of page insight metric since date
+        """
+        m_dates = await model.filter(
+            page_id=page_id,
+            m_date__gte=datetime.datetime.combine(since, datetime.time()).strftime(DATE_FORMAT),
+        ).values_list("m_date", flat=True)
+        return {parse_datetime(m_date).date() for m_date in m_dates}
+
+    @staticmethod
+    async def get_checkpoints(page_id: str) -> Dict[str, Checkpoint]:
+        """
+        Get checkpoints of page endpoints, positions are in UTC
+        """
+        checkpoints = {}
+        for checkpoint in await Checkpoint.filter(page_id=page_id):
+            if checkpoint.position is not None:
+                checkpoint.position = to_utc(checkpoint.position)
+            checkpoints[checkpoint.endpoint] = checkpoint
+        return checkpoints
+
+    @staticmethod
+    async def delete_checkpoints(page_id: str):
+        await Checkpoint.filter(page_id=page_id).delete()
 
     async def start(self):
         await Tortoise.init(
@@ -0,0 +1,128 @@
+import codecs
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+JsonDecoder = Callable[[Union[bytes, str]], Any]
+
+
+def get_json_decoder(name: str = "auto") -> JsonDecoder:
+    """
+    Get function decoding JSON: "orjson", "json" or "auto" which is orjson if it's installed
+    """
+    if name == "auto":
+        name = "json" if orjson is None else "orjson"
+    if name == "orjson":
+        if orjson is None:
+            raise RuntimeError("Package orjson is needed for 'orjson' JSON decoder")
+        return orjson.loads
+    return json.loads
+
+
+class DataParser:
+    """
+    Incremental parser of Graph API response with "data" array
+
+    Chunks of body are fed while they arrive and complete items of data array are returned as
+    soon as they are read, so they can be processed before the whole body is downloaded.
+    Items are decoded by C scanner of json module one by one, because loads can't find where
+    item ends. The rest of response after data array, for example paging, is decoded with
+    loads when body ends. Bodies which don't start with data array are decoded at once when
+    they end.
+    """
+
+    DATA_START = re.compile(r'\s*\{\s*"data"\s*:\s*\[')
+    SEPARATOR = re.compile(r"[\s,]*")
+    ENDS = (",", "]", " ", "\t", "\r", "\n")
+
+    def __init__(self, loads: JsonDecoder = json.loads):
+        self._loads = loads
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._text = ""
+        self._chunks: List[bytes] = []
+        self._streaming: Optional[bool] = None
+        self._tail: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        Feed chunk of body and get items of data array which became complete
+        """
+        if self._streaming is False:
+            self._chunks.append(chunk)
+            return []
+
+        self._text += self._text_decoder.decode(chunk)
+        if self._streaming is None:
+            self._chunks.append(chunk)
+            match = self.DATA_START.match(self._text)
+            if match is None:
+                # Beginning of data array can be split between chunks
+                if len(self._text.lstrip()) < 16:
+                    return []
+                self._streaming = False
+                self._text = ""
+                return []
+            self._streaming = True
+            self._chunks = []
+            self._text = self._text[match.end():]
+        if self._tail is not None:
+            self._tail += self._text
+            self._text = ""
+            return []
+        return self._read_items()
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """
+        Finish body and get response, its data contains only items which feed didn't return
+
+        Response of empty body is None.
+        """
+        if not self._streaming:
+            body = b"".join(self._chunks)
+            return self._loads(body) if body.strip() else None
+
+        self._text += self._text_decoder.decode(b"", final=True)
+        items = [] if self._tail is not None else self._read_items(final=True)
+        if self._tail is None:
+            raise ValueError("Data array of response is not complete")
+        # The rest of object after data array is "}" or ', "paging": {...}}'
+        tail = self._tail.strip()
+        if tail.startswith(","):
+            payload = self._loads("{" + tail[1:])
+        elif tail == "}":
+            payload = {}
+        else:
+            raise ValueError("Response is not complete")
+        payload["data"] = items
+        return payload
+
+    def _read_items(self, final: bool = False) -> List[Any]:
+        items = []
+        text, index = self._text, 0
+        while True:
+            index = self.SEPARATOR.match(text, index).end()
+            if index == len(text):
+                break
+            if text[index] == "]":
+                self._tail = text[index + 1:]
+                index = len(text)
+                break
+            try:
+                item, end = self._decoder.raw_decode(text, index)
+            except ValueError:
+                # Item is not complete yet
+                break
+            if not final and text[index] not in "{[\"" and text[end:end + 1] not in self.ENDS:
+                # Number or literal at the end of chunk can continue in next chunk
+                break
+            items.append(item)
+            index = end
+        self._text = text[index:]
+        return items
@@ -1,14 +1,35 @@
 import asyncio
 import datetime
+import json
 import math
+import random
+import time
 from copy import deepcopy
-from typing import Any, AsyncGenerator, Dict, Iterable, Optional
+from typing import (
+    Any,
+    AsyncGenerator,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import yarl
 import aiohttp
 from facet import ServiceMixin
 from loguru import logger
 
+from .archive import ResponseArchive
+from .decoding import DataParser, get_json_decoder
+from .http_cache import ResponseCache
+from .paging import PageSizeTuner
+from .rate_limit import RequestScheduler, SharedUsage
+
 
 def expo(start_delay: float, attempt: int):
     return start_delay * (math.e ** attempt)
@@ -24,8 +45,107 @@ RETRY_DELAY_FUNCTIONS = {
 }
 
 
+RETRYABLE_ERROR_CODES = {
+    1,  # Unknown error
+    2,  # Service temporarily unavailable
+    4,  # Application request limit reached
+    17,  # User request limit reached
+    32,  # Page request limit reached
+    341,  # Application limit reached
+    613,  # Calls within one hour have exceeded the rate limit
+    80001,  # Pages business use case rate limit
+}
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Get delay in seconds from Retry-After header, only delay in seconds form is supported
+    """
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class GraphResponse(NamedTuple):
+    """
+    Payload of Graph API response with its ETag, payload of not modified response is None
+
+    Duration is time of HTTP exchange in seconds, it is None for responses from cache.
+    """
+    payload: Any
+    etag: Optional[str] = None
+    not_modified: bool = False
+    duration: Optional[float] = None
+
+
+def get_header(headers: Iterable[Dict[str, str]], name: str) -> Optional[str]:
+    """
+    Get header value from headers of batch sub-response
+    """
+    for header in headers or ():
+        if header.get("name", "").lower() == name.lower():
+            return header.get("value")
+    return None
+
+
+class FacebookPagesAPIError(Exception):
+    """
+    Exception for errors which Facebook Graph API returns in response body
+    """
+
+    def __init__(
+            self,
+            status: int,
+            error: Optional[Dict[str, Any]] = None,
+            retry_after: Optional[float] = None,
+    ):
+        error = {} if error is None else error
+        self.status = status
+        self.code = error.get("code")
+        self.subcode = error.get("error_subcode")
+        self.message = error.get("message", "")
+        self.transient = bool(error.get("is_transient"))
+        self.retry_after = retry_after
+        super().__init__(
+            f"Facebook Graph API error: status={status}; code={self.code}; "
+            f"subcode={self.subcode}; message={self.message}",
+        )
+
+
+def is_too_much_data(exception: Exception) -> bool:
+    """
+    Check that Graph API asks to request less items per page
+    """
+    return (
+        isinstance(exception, FacebookPagesAPIError)
+        and "reduce the amount of data" in exception.message.lower()
+    )
+
+
+def is_retryable(exception: Exception) -> bool:
+    """
+    Check that request failed with exception can succeed if it will be made again
+    """
+    if is_too_much_data(exception):
+        # The same request fails again, it must be made with less items per page
+        return False
+    if isinstance(exception, FacebookPagesAPIError):
+        return (
+            exception.transient
+            or exception.code in RETRYABLE_ERROR_CODES
+            or (exception.code is None and exception.status in RETRYABLE_STATUSES)
+            or exception.status >= 500
+        )
+    if isinstance(exception, aiohttp.ClientResponseError):
+        return exception.status in RETRYABLE_STATUSES or exception.status >= 500
+    return isinstance(exception, (aiohttp.ClientError, asyncio.TimeoutError, ValueError))
+
+
 class FacebookPagesService(ServiceMixin):
     BASE_URL = yarl.URL("https://graph.facebook.com")
+    MAX_BATCH_SIZE = 50
 
     def __init__(
             self,
@@ -33,26 +153,80 @@ class FacebookPagesService(ServiceMixin):
             delay_per_request: float = 0,
             retry_attempts: int = 0,
             retry_delay_function: str = "expo",
+            retry_base_delay: float = 1,
+            retry_max_delay: float = 60,
             version: str = "v10.0",
+            base_url: Optional[str] = None,
+            paging_prefetch: int = 0,
+            batch_size: int = 1,
+            batch_delay: float = 0.05,
+            min_connections_limit: int = 1,
+            low_usage: float = 50,
+            high_usage: float = 90,
+            max_throttling_delay: float = 10,
+            throttling_pause: float = 300,
+            shared_usage: Optional[SharedUsage] = None,
+            archive: Optional[ResponseArchive] = None,
+            cache: Optional[ResponseCache] = None,
+            paging_limit: int = 100,
+            paging_min_limit: int = 5,
+            paging_slow_time: float = 5,
+            json_decoder: str = "auto",
+            stream_size: int = 1 << 20,
     ):
         self._connections_limit = connections_limit
         self._delay_per_request = delay_per_request
         self._retry_attempts = retry_attempts
         self._retry_delay_function = RETRY_DELAY_FUNCTIONS.get(retry_delay_function)
-        self._semaphore = asyncio.Semaphore(connections_limit)
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+        self._scheduler = RequestScheduler(
+            max_concurrency=connections_limit,
+            min_concurrency=min_connections_limit,
+            low_usage=low_usage,
+            high_usage=high_usage,
+            max_delay=max_throttling_delay,
+            pause=throttling_pause,
+            shared_usage=shared_usage,
+        )
         self._version = version
+        self._base_url = self.BASE_URL if base_url is None else yarl.URL(base_url)
+        self._paging_prefetch = paging_prefetch
+        self._batch_size = min(batch_size, self.MAX_BATCH_SIZE)
+        self._batch_delay = batch_delay
+        self._batches: Dict[str, List[Tuple[yarl.URL, asyncio.Future, Optional[str]]]] = {}
+        self._batch_timers: Dict[str, asyncio.TimerHandle] = {}
+        # Numbers of batched requests which wait for responses by access tokens
+        self._batch_waiting: Dict[str, int] = {}
+        self._batch_tasks: Set[asyncio.Task] = set()
+        self._archive = archive
+        self._cache = cache
+        self._page_sizes = None if paging_limit <= 0 else PageSizeTuner(
+            max_limit=paging_limit,
+            min_limit=paging_min_limit,
+            slow_time=paging_slow_time,
+        )
+        self._loads = get_json_decoder(json_decoder)
+        self._stream_size = stream_size
         self._session = None
 
+    @property
+    def dependencies(self) -> List[ServiceMixin]:
+        return [service for service in (self._cache, self._archive) if service is not None]
+
     async def start(self):
         if self._session is None:
             self._session = aiohttp.ClientSession(
                 connector=aiohttp.connector.TCPConnector(limit=self._connections_limit),
-                raise_for_status=True,
             )
             logger.info("Facebook pages service started.")
 
     async def stop(self):
         if self._session is not None:
+            for access_token in list(self._batches):
+                self._flush_batch(access_token)
+            if self._batch_tasks:
+                await asyncio.wait(self._batch_tasks)
             await self._session.close()
             self._session = None
             logger.info("Facebook pages service stopped.")
@@ -61,70 +235,680 @@ class FacebookPagesService(ServiceMixin):
             self,
             url: yarl.URL,
             params: Optional[Dict[str, Any]] = None,
+            batch: bool = False,
     ) -> Any:
+        """
+        Make GET request to Graph API
+
+        If batch is True and batching is enabled, request will be sent as part of Graph API
+        batch request together with other pending requests with the same access token. If
+        archive is defined, response payload is written to it.
+
+        Responses of endpoints which are cached are returned from cache while they are fresh
+        and then revalidated with If-None-Match header.
+        """
+        response = await self._get(url=url, params=params, batch=batch)
+        return response.payload
+
+    async def _get(
+            self,
+            url: yarl.URL,
+            params: Optional[Dict[str, Any]] = None,
+            batch: bool = False,
+    ) -> GraphResponse:
+        ttl = None if self._cache is None else self._cache.get_ttl(url)
+        entry = None
+        if ttl is not None:
+            key = self._cache.get_key(url=url, params=params)
+            entry = await self._cache.get(key)
+        etag = None if entry is None else entry.etag
+
+        duration = None
+        if entry is not None and entry.fresh:
+            payload = entry.payload
+        else:
+            if batch and self._batch_size > 1:
+                if params:
+                    url = url.update_query(params)
+                response = await self._request_in_batch(url=url, etag=etag)
+            else:
+                response = await self._request(
+                    method="GET",
+                    url=url,
+                    params=params,
+                    headers=None if etag is None else {"If-None-Match": etag},
+                )
+            duration = response.duration
+            if response.not_modified and entry is not None:
+                payload = entry.payload
+                await self._cache.refresh(key=key, ttl=ttl)
+            else:
+                payload = response.payload
+                if ttl is not None:
+                    await self._cache.set(key=key, ttl=ttl, etag=response.etag, payload=payload)
+        if self._archive is not None:
+            await self._archive.write(url=url, params=params, payload=payload)
+        return GraphResponse(payload=payload, duration=duration)
+
+    async def _request(
+            self,
+            method: str,
+            url: yarl.URL,
+            params: Optional[Dict[str, Any]] = None,
+            data: Optional[Dict[str, Any]] = None,
+            page_id: Optional[str] = None,
+            headers: Optional[Dict[str, str]] = None,
+    ) -> GraphResponse:
         params = {} if params is None else deepcopy(params)
-        exception = None
+        access_token = params.get("access_token") or url.query.get("access_token")
+        if access_token is None and data is not None:
+            access_token = data.get("access_token")
+        access_token = access_token or ""
+        if page_id is None:
+            page_id = self.get_page_id(url)
         attempt_number = 0
 
-        async with self._semaphore:
-            while attempt_number <= self._retry_attempts:
-                try:
-                    async with self._session.get(url=url, params=params) as response:
-                        payload = await response.json()
-                except aiohttp.ClientError as e:
-
-                    logger.warning("Got exception: {}", e)
-                    exception = e
-                    attempt_number += 1
-                    attempt_delay = self._retry_delay_function(
-                        self._delay_per_request,
-                        attempt_number,
+        while True:
+            try:
+                async with self._scheduler.slot(access_token=access_token, page_id=page_id):
+                    # Only HTTP exchange is timed, waits for slot and retry delays are not
+                    started_at = time.monotonic()
+                    response = await self._send(
+                        method=method,
+                        url=url,
+                        params=params,
+                        data=data,
+                        access_token=access_token,
+                        page_id=page_id,
+                        headers=headers,
                     )
-                    await asyncio.sleep(attempt_delay)
-                else:
-                    break
+                    response = response._replace(duration=time.monotonic() - started_at)
+                    await asyncio.sleep(self._delay_per_request)
+            except (
+                    aiohttp.ClientError,
+                    asyncio.TimeoutError,
+                    ValueError,
+                    FacebookPagesAPIError,
+            ) as exception:
+                attempt_number += 1
+                if not is_retryable(exception) or attempt_number > self._retry_attempts:
+                    raise
+                # Slot is released while waiting, so other requests can be made
+                attempt_delay = self.get_retry_delay(exception, attempt_number)
+                logger.warning(
+                    "Got exception: {}; retry attempt {} in {:.1f} seconds",
+                    exception,
+                    attempt_number,
+                    attempt_delay,
+                )
+                await asyncio.sleep(attempt_delay)
             else:
-                raise exception
+                return response
+
+    async def _send(
+            self,
+            method: str,
+            url: yarl.URL,
+            params: Dict[str, Any],
+            data: Optional[Dict[str, Any]],
+            access_token: str,
+            page_id: Optional[str],
+            headers: Optional[Dict[str, str]] = None,
+    ) -> GraphResponse:
+        async with self._session.request(
+                method=method,
+                url=url,
+                params=params,
+                data=data,
+                headers=headers,
+        ) as response:
+            await self._scheduler.update(
+                access_token=access_token,
+                page_id=page_id,
+                headers=response.headers,
+            )
+            etag = response.headers.get("ETag")
+            if response.status == 304:
+                return GraphResponse(payload=None, etag=etag, not_modified=True)
+            payload = self.decode(body=await response.read(), status=response.status)
+            await self.check_response(
+                status=response.status,
+                headers=response.headers,
+                payload=payload,
+                access_token=access_token,
+                page_id=page_id,
+            )
+        return GraphResponse(payload=payload, etag=etag)
+
+    def decode(self, body: bytes, status: int) -> Any:
+        """
+        Decode JSON body of response, body of error response can be not JSON
+        """
+        try:
+            return self._loads(body) if body.strip() else None
+        except ValueError:
+            if status < 400:
+                raise
+            return None
+
+    async def check_response(
+            self,
+            status: int,
+            headers: Mapping[str, str],
+            payload: Any,
+            access_token: str,
+            page_id: Optional[str],
+    ):
+        """
+        Raise FacebookPagesAPIError if response is error and throttle requests if it is needed
+        """
+        if status < 400 and not (isinstance(payload, dict) and "error" in payload):
+            return
+        exception = FacebookPagesAPIError(
+            status=status,
+            error=payload.get("error") if isinstance(payload, dict) else None,
+            retry_after=parse_retry_after(headers.get("Retry-After")),
+        )
+        await self._scheduler.throttle(
+            access_token=access_token,
+            page_id=page_id,
+            code=exception.code,
+        )
+        raise exception
+
+    def get_retry_delay(self, exception: Exception, attempt_number: int) -> float:
+        """
+        Get jittered delay before next attempt, but not less than server asked in Retry-After
+        """
+        delay = min(
+            self._retry_delay_function(self._retry_base_delay, attempt_number),
+            self._retry_max_delay,
+        )
+        delay = random.uniform(delay / 2, delay)
+        retry_after = getattr(exception, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def choose_access_token(self, access_tokens: Sequence[str]) -> str:
+        """
+        Choose access token for next request from tokens which can be used for it
+        """
+        return self._scheduler.choose_access_token(access_tokens)
+
+    def get_page_id(self, url: yarl.URL) -> Optional[str]:
+        """
+        Get ID of page which request is made for from Graph API URL
+        """
+        parts = url.parts
+        if len(parts) < 3 or parts[1] != self._version or parts[2] == "me":
+            return None
+        return parts[2].split("_")[0]
+
+    async def _request_in_batch(self, url: yarl.URL, etag: Optional[str] = None) -> GraphResponse:
+        """
+        Add request to batch of its access token and wait for its response
+
+        Batch is sent when it's full or batch_delay seconds after its first request. If no
+        other request of access token is in flight, batch is sent in next iteration of event
+        loop, so only requests which are made at the same time are batched with it.
+        """
+        access_token = url.query.get("access_token", "")
+        future = asyncio.get_event_loop().create_future()
+        requests = self._batches.setdefault(access_token, [])
+        requests.append((url, future, etag))
+        waiting = self._batch_waiting.get(access_token, 0)
+        if len(requests) >= self._batch_size:
+            self._flush_batch(access_token)
+        elif len(requests) == 1:
+            self._batch_timers[access_token] = asyncio.get_event_loop().call_later(
+                self._batch_delay if waiting else 0,
+                self._flush_batch,
+                access_token,
+            )
+        self._batch_waiting[access_token] = waiting + 1
+        try:
+            return await future
+        finally:
+            self._batch_waiting[access_token] -= 1
+            if not self._batch_waiting[access_token]:
+                del self._batch_waiting[access_token]
+
+    def _flush_batch(self, access_token: str):
+        timer = self._batch_timers.pop(access_token, None)
+        if timer is not None:
+            timer.cancel()
+        # Requests which waiters were cancelled are not needed anymore
+        requests = [
+            (url, future, etag)
+            for url, future, etag in self._batches.pop(access_token, ())
+            if not future.done()
+        ]
+        if not requests:
+            return
+
+        task = asyncio.create_task(self._send_batch(
+            access_token=access_token,
+            requests=requests,
+        ))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _send_batch(
+            self,
+            access_token: str,
+            requests: List[Tuple[yarl.URL, asyncio.Future, Optional[str]]],
+    ):
+        batch = []
+        for url, _, etag in requests:
+            request = {"method": "GET", "relative_url": str(url.relative())[1:]}
+            if etag is not None:
+                request["headers"] = [{"name": "If-None-Match", "value": etag}]
+            batch.append(request)
+        page_id = self.get_page_id(requests[0][0])
+        try:
+            batch_response = await self._request(
+                method="POST",
+                url=self._base_url,
+                data={
+                    "access_token": access_token,
+                    "batch": json.dumps(batch),
+                    # Headers are needed only for ETags of cached responses
+                    "include_headers": "false" if self._cache is None else "true",
+                },
+                page_id=page_id,
+            )
+        except Exception as exception:
+            for _, future, _ in requests:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+        logger.debug("Sent batch request: size={}", len(requests))
+
+        # Futures of sub-requests which are made again alone are resolved by their tasks
+        retried = set()
+        try:
+            responses = batch_response.payload
+            if not isinstance(responses, list) or len(responses) != len(requests):
+                raise ValueError(f"Unexpected batch response: requests={len(requests)}")
+            for (url, future, etag), response in zip(requests, responses):
+                if future.done():
+                    continue
+                try:
+                    retry = await self._resolve_sub_response(
+                        access_token=access_token,
+                        url=url,
+                        future=future,
+                        response=response,
+                        duration=batch_response.duration,
+                    )
+                except Exception as exception:
+                    future.set_exception(exception)
+                    continue
+                if retry:
+                    headers = None if etag is None else {"If-None-Match": etag}
+                    retried.add(future)
+                    self._resolve_future(
+                        future=future,
+                        coroutine=self._request(method="GET", url=url, headers=headers),
+                    )
+        except Exception as exception:
+            for _, future, _ in requests:
+                if not future.done() and future not in retried:
+                    future.set_exception(exception)
+        finally:
+            # Callers must not wait forever when batch task is cancelled
+            for _, future, _ in requests:
+                if not future.done() and future not in retried:
+                    future.cancel()
+
+    async def _resolve_sub_response(
+            self,
+            access_token: str,
+            url: yarl.URL,
+            future: asyncio.Future,
+            response: Any,
+            duration: Optional[float],
+    ) -> bool:
+        """
+        Set result or exception of batch sub-request, return True if it must be made again
+        """
+        if response is None:
+            # Graph API did not complete this sub-request in time, so make it alone
+            logger.warning("Batch sub-request was not completed, retrying it alone")
+            return True
+
+        response_etag = get_header(response.get("headers"), "ETag")
+        if response["code"] == 304:
+            future.set_result(GraphResponse(
+                payload=None,
+                etag=response_etag,
+                not_modified=True,
+                duration=duration,
+            ))
+            return False
+        payload = self._loads(response["body"])
+        # Body of error response can be not an object
+        error = payload.get("error") if isinstance(payload, dict) else None
+        if response["code"] != 200 or error is not None:
+            exception = FacebookPagesAPIError(status=response["code"], error=error)
+            await self._scheduler.throttle(
+                access_token=access_token,
+                page_id=self.get_page_id(url),
+                code=exception.code,
+            )
+            if is_retryable(exception) and self._retry_attempts > 0:
+                logger.warning("Got exception in batch: {}; retrying request alone", exception)
+                return True
+            future.set_exception(exception)
+        else:
+            future.set_result(GraphResponse(
+                payload=payload,
+                etag=response_etag,
+                duration=duration,
+            ))
+        return False
 
-            await asyncio.sleep(self._delay_per_request)
+    def _resolve_future(self, future: asyncio.Future, coroutine):
+        async def resolve():
+            try:
+                result = await coroutine
+            except Exception as exception:
+                if not future.done():
+                    future.set_exception(exception)
+            else:
+                if not future.done():
+                    future.set_result(result)
 
-        return payload
+        task = asyncio.create_task(resolve())
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
 
     async def request_with_paging(
             self,
             url: yarl.URL,
             params: Optional[Dict[str, Any]] = None,
+            batch: bool = False,
     ) -> AsyncGenerator[Any, None]:
+        """
+        Make requests for all pages of Graph API paged result and yield their items
+        """
+        async for items in self.request_item_pages(url=url, params=params, batch=batch):
+            for item in items:
+                yield item
+
+    async def request_item_pages(
+            self,
+            url: yarl.URL,
+            params: Optional[Dict[str, Any]] = None,
+            batch: bool = False,
+    ) -> AsyncGenerator[List[Any], None]:
+        """
+        Make requests for all pages of Graph API paged result and yield lists of their items
+
+        If paging prefetch is enabled, next pages are requested in background while items of
+        current page are consumed, up to paging_prefetch pages ahead. If paging limit is
+        enabled, pages are requested with limit which is adapted to every endpoint. Items of
+        big pages which aren't batched or cached are yielded while their body is downloaded,
+        then prefetch counts parts of pages instead of pages.
+        """
+        if self._paging_prefetch <= 0:
+            pages = self._request_pages(url=url, params=params, batch=batch)
+            async for payload in pages:
+                yield payload["data"]
+            return
+
+        queue = asyncio.Queue(maxsize=self._paging_prefetch)
+
+        async def prefetch():
+            try:
+                async for payload in self._request_pages(url=url, params=params, batch=batch):
+                    await queue.put((payload, None))
+            except Exception as exception:
+                await queue.put((None, exception))
+            else:
+                await queue.put((None, None))
+
+        task = asyncio.create_task(prefetch())
+        try:
+            while True:
+                payload, exception = await queue.get()
+                if exception is not None:
+                    raise exception
+                if payload is None:
+                    break
+                yield payload["data"]
+        finally:
+            # Consumer can stop before the last page, so request of next page must be cancelled
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _request_pages(
+            self,
+            url: yarl.URL,
+            params: Optional[Dict[str, Any]] = None,
+            batch: bool = False,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        _, endpoint = ResponseArchive.get_endpoint(url)
+        limit = None
         while url:
-            payload = await self.request(
+            if self._page_sizes is not None:
+                # Cursors of next pages stay valid when limit changes
+                limit = self._page_sizes.get(endpoint)
+                url = url.update_query(limit=limit)
+            streaming = self.is_streaming(url=url, batch=batch)
+            try:
+                if streaming:
+                    # Body is downloaded in its own task, so slot of request isn't held while
+                    # consumer processes items, it can wait for other requests
+                    queue = asyncio.Queue()
+                    task = asyncio.create_task(self._request_streaming(
+                        url=url,
+                        params=params,
+                        queue=queue,
+                    ))
+                    try:
+                        while True:
+                            items = await queue.get()
+                            if items is None:
+                                break
+                            yield {"data": items}
+                        payload, duration = await task
+                    finally:
+                        task.cancel()
+                        await asyncio.gather(task, return_exceptions=True)
+                else:
+                    response = await self._get(url=url, params=params, batch=batch)
+                    payload, duration = response.payload, response.duration
+            except FacebookPagesAPIError as exception:
+                if (
+                        self._page_sizes is None
+                        or not is_too_much_data(exception)
+                        or not self._page_sizes.shrink(endpoint, limit, refused=True)
+                ):
+                    raise
+                continue
+            # Pages from cache say nothing about how fast Graph API is
+            if self._page_sizes is not None and duration is not None:
+                self._page_sizes.update(endpoint, limit, duration)
+            if not streaming:
+                yield payload
+            url = yarl.URL(payload.get("paging", {}).get("next", ""))
+            params = None
+
+    def is_streaming(self, url: yarl.URL, batch: bool) -> bool:
+        """
+        Check that items of paged result can be read while its body is downloaded
+
+        Batched requests and requests of cached endpoints are made with request method.
+        """
+        return (
+            self._stream_size > 0
+            and not (batch and self._batch_size > 1)
+            and (self._cache is None or self._cache.get_ttl(url) is None)
+        )
+
+    async def _request_streaming(
+            self,
+            url: yarl.URL,
+            params: Optional[Dict[str, Any]],
+            queue: asyncio.Queue,
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Make GET request of paged result and put items of its data to queue while body is read
+
+        Queue isn't bounded, so body is read without waiting for consumer, it holds at most one
+        page of items like response read at once. None is put to queue when request is done.
+        Bodies of known size smaller than stream_size are read at once. Request is retried like
+        in _request until first items are put, and written to archive when the whole body is
+        read. Keys of response except data and duration of request are returned.
+        """
+        try:
+            return await self._read_streaming(url=url, params=params, queue=queue)
+        finally:
+            queue.put_nowait(None)
+
+    async def _read_streaming(
+            self,
+            url: yarl.URL,
+            params: Optional[Dict[str, Any]],
+            queue: asyncio.Queue,
+    ) -> Tuple[Dict[str, Any], float]:
+        params = {} if params is None else deepcopy(params)
+        access_token = params.get("access_token") or url.query.get("access_token") or ""
+        page_id = self.get_page_id(url)
+        archived_items = None if self._archive is None else []
+        yielded = False
+        attempt_number = 0
+
+        while True:
+            try:
+                async with self._scheduler.slot(access_token=access_token, page_id=page_id):
+                    started_at = time.monotonic()
+                    async with self._session.get(url=url, params=params) as response:
+                        await self._scheduler.update(
+                            access_token=access_token,
+                            page_id=page_id,
+                            headers=response.headers,
+                        )
+                        size = response.content_length
+                        small = size is not None and size < self._stream_size
+                        if response.status != 200 or small:
+                            rest = self.decode(body=await response.read(), status=response.status)
+                        else:
+                            parser = DataParser(loads=self._loads)
+                            async for chunk in response.content.iter_any():
+                                items = parser.feed(chunk)
+                                if items:
+                                    yielded = True
+                                    if archived_items is not None:
+                                        # Consumer can change items before archive is written
+                                        archived_items.extend(deepcopy(items))
+                                    queue.put_nowait(items)
+                            rest = parser.close()
+                        await self.check_response(
+                            status=response.status,
+                            headers=response.headers,
+                            payload=rest,
+                            access_token=access_token,
+                            page_id=page_id,
+                        )
+                        # Body of successful response can be empty or null
+                        rest = {} if rest is None else rest
+                        items = rest.pop("data", [])
+                        if items:
+                            yielded = True
+                            if archived_items is not None:
+                                archived_items.extend(deepcopy(items))
+                            queue.put_nowait(items)
+                    duration = time.monotonic() - started_at
+                    await asyncio.sleep(self._delay_per_request)
+            except (
+                    aiohttp.ClientError,
+                    asyncio.TimeoutError,
+                    ValueError,
+                    FacebookPagesAPIError,
+            ) as exception:
+                attempt_number += 1
+                if (
+                        yielded
+                        or not is_retryable(exception)
+                        or attempt_number > self._retry_attempts
+                ):
+                    raise
+                attempt_delay = self.get_retry_delay(exception, attempt_number)
+                logger.warning(
+                    "Got exception: {}; retry attempt {} in {:.1f} seconds",
+                    exception,
+                    attempt_number,
+                    attempt_delay,
+                )
+                await asyncio.sleep(attempt_delay)
+            else:
+                break
+
+        if self._archive is not None:
+            await self._archive.write(
                 url=url,
                 params=params,
+                payload={**rest, "data": archived_items},
             )
-            for result in payload["data"]:
-                yield result
-            url = yarl.URL(payload.get("paging", {}).get("next", ""))
-            params = None
+        return rest, duration
 
     async def get_accounts(self, access_token: str) -> AsyncGenerator[Dict[str, Any], None]:
-        url = self.BASE_URL / self._version / "me" / "accounts"
+        url = self._base_url / self._version / "me" / "accounts"
         params = {"access_token": access_token}
         async for account in self.request_with_paging(url=url, params=params):
             yield account
 
-    async def get_page(self, page_id: str, access_token: str) -> Dict[str, Any]:
-        url = self.BASE_URL / self._version / page_id
+    async def get_page(
+            self,
+            page_id: str,
+            access_token: str,
+            fields: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Any]:
+        url = self._base_url / self._version / page_id
         params = {"access_token": access_token}
-        return await self.request(url=url, params=params)
+        if fields is not None:
+            params["fields"] = ",".join(fields)
+        return await self.request(url=url, params=params, batch=True)
 
     async def get_page_published_posts(
             self,
             page_id: str,
             access_token: str,
+            fields: Optional[Iterable[str]] = None,
+            since: Optional[datetime.datetime] = None,
+            until: Optional[datetime.datetime] = None,
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        url = self.BASE_URL / self._version / page_id / "published_posts"
+        async for posts in self.get_page_published_post_pages(
+                page_id=page_id,
+                access_token=access_token,
+                fields=fields,
+                since=since,
+                until=until,
+        ):
+            for post in posts:
+                yield post
+
+    async def get_page_published_post_pages(
+            self,
+            page_id: str,
+            access_token: str,
+            fields: Optional[Iterable[str]] = None,
+            since: Optional[datetime.datetime] = None,
+            until: Optional[datetime.datetime] = None,
+    ) -> AsyncGenerator[List[Dict[str, Any]], None]:
+        url = self._base_url / self._version / page_id / "published_posts"
         params = {"access_token": access_token}
-        async for post in self.request_with_paging(url=url, params=params):
-            yield post
+        if fields is not None:
+            params["fields"] = ",".join(fields)
+        if since is not None:
+            params["since"] = int(since.timestamp())
+        if until is not None:
+            params["until"] = int(until.timestamp())
+        async for posts in self.request_item_pages(url=url, params=params):
+            yield posts
 
     async def get_insights(
             self,
@@ -133,21 +917,32 @@ class FacebookPagesService(ServiceMixin):
             since: Optional[datetime.date] = None,
             metrics: Optional[Iterable[str]] = None,
             period: Optional[str] = None,
+            until: Optional[datetime.date] = None,
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        url = self.BASE_URL / self._version / object_id / "insights"
+        url = self._base_url / self._version / object_id / "insights"
         params = {"access_token": access_token}
         if metrics is not None:
             params["metric"] = ",".join(metrics)
         if period is not None:
             params["period"] = period
-        # if since is not None:
-        #     params["since"] = since.strftime("%Y-%m-%d")
-        async for insight in self.request_with_paging(url=url, params=params):
+        if since is not None:
+            params["since"] = since.strftime("%Y-%m-%d")
+        if until is not None:
+            params["until"] = until.strftime("%Y-%m-%d")
+        async for insight in self.request_with_paging(url=url, params=params, batch=True):
             yield insight
 
-    async def get_page_post(self, page_id: str, post_id: str, access_token: str) -> Dict[str, Any]:
-        url = self.BASE_URL / self._version / f"{page_id}_{post_id}"
+    async def get_page_post(
+            self,
+            page_id: str,
+            post_id: str,
+            access_token: str,
+            fields: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Any]:
+        url = self._base_url / self._version / f"{page_id}_{post_id}"
         params = {"access_token": access_token}
+        if fields is not None:
+            params["fields"] = ",".join(fields)
         return await self.request(url=url, params=params)
 
     async def get_page_post_attachments(
@@ -155,8 +950,27 @@ class FacebookPagesService(ServiceMixin):
             page_id: str,
             post_id: str,
             access_token: str,
+            fields: Optional[Iterable[str]] = None,
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        url = self.BASE_URL / self._version / f"{page_id}_{post_id}" / "attachments"
+        async for attachments in self.get_page_post_attachment_pages(
+                page_id=page_id,
+                post_id=post_id,
+                access_token=access_token,
+                fields=fields,
+        ):
+            for attachment in attachments:
+                yield attachment
+
+    async def get_page_post_attachment_pages(
+            self,
+            page_id: str,
+            post_id: str,
+            access_token: str,
+            fields: Optional[Iterable[str]] = None,
+    ) -> AsyncGenerator[List[Dict[str, Any]], None]:
+        url = self._base_url / self._version / f"{page_id}_{post_id}" / "attachments"
         params = {"access_token": access_token}
-        async for attachment in self.request_with_paging(url=url, params=params):
-            yield attachment
+        if fields is not None:
+            params["fields"] = ",".join(fields)
+        async for attachments in self.request_item_pages(url=url, params=params, batch=True):
+            yield attachments
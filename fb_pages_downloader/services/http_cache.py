@@ -0,0 +1,174 @@
+import asyncio
+import json
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, NamedTuple, Optional
+
+import yarl
+from facet import ServiceMixin
+from loguru import logger
+
+from .archive import ResponseArchive
+
+
+class CacheEntry(NamedTuple):
+    payload: Any
+    etag: Optional[str]
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+
+class ResponseCache(ServiceMixin):
+    """
+    Persistent cache of Graph API responses in SQLite file
+
+    Only responses of endpoints with TTL are cached, for example {"page": 86400}, endpoint
+    names are the same as in ResponseArchive. Key is path of URL with sorted query without
+    access token and limit, so cached response is used with any token of page and any size
+    of pages. Fresh entries are returned without requests, expired ones are revalidated with
+    their ETag. Entries are evicted in least recently used order when total size of payloads
+    is bigger than max_size. Worker processes can share cache file, so total size is read
+    from it before eviction and after every tenth of max_size which process wrote.
+
+    Queries run in one thread of executor, because SQLite connection can't be shared between
+    threads.
+    """
+
+    def __init__(self, path: str, ttls: Dict[str, float], max_size: int = 1 << 30):
+        self._path = path
+        self._ttls = ttls
+        self._max_size = max_size
+        self._size = 0
+        # Size of payloads which process wrote since total size was read
+        self._written_size = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._connection: Optional[sqlite3.Connection] = None
+
+    async def run(self, function, *args) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(self._executor, function, *args)
+
+    def get_ttl(self, url: yarl.URL) -> Optional[float]:
+        _, endpoint = ResponseArchive.get_endpoint(url)
+        return self._ttls.get(endpoint)
+
+    @staticmethod
+    def get_key(url: yarl.URL, params: Optional[Dict[str, Any]] = None) -> str:
+        query = {**url.query, **{key: str(value) for key, value in (params or {}).items()}}
+        query.pop("access_token", None)
+        # Page of the same cursor with other limit is still valid page of results
+        query.pop("limit", None)
+        return str(url.relative().with_query(sorted(query.items())))
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        await self.run(self._open)
+        logger.info("Response cache started: path={}; size={}", self._path, self._size)
+
+    async def stop(self):
+        await self.run(self._close)
+        self._executor.shutdown()
+        self._executor = None
+        logger.info("Response cache stopped.")
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        return await self.run(self._get, key)
+
+    async def set(self, key: str, ttl: float, etag: Optional[str], payload: Any):
+        await self.run(self._set, key, ttl, etag, payload)
+
+    async def refresh(self, key: str, ttl: float):
+        """
+        Prolong entry which is not modified according to Graph API
+        """
+        await self.run(self._refresh, key, ttl)
+
+    def _open(self):
+        # Several worker processes can use the same cache, so writers wait for each other
+        self._connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, etag TEXT, payload BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)",
+        )
+        self._size = self._read_size()
+
+    def _read_size(self) -> int:
+        return self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses",
+        ).fetchone()[0]
+
+    def _close(self):
+        self._connection.close()
+        self._connection = None
+
+    def _get(self, key: str) -> Optional[CacheEntry]:
+        row = self._connection.execute(
+            "SELECT etag, payload, expires_at FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        self._connection.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?",
+            (time.time(), key),
+        )
+        etag, payload, expires_at = row
+        return CacheEntry(
+            payload=json.loads(zlib.decompress(payload)),
+            etag=etag,
+            expires_at=expires_at,
+        )
+
+    def _set(self, key: str, ttl: float, etag: Optional[str], payload: Any):
+        data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode())
+        now = time.time()
+        row = self._connection.execute(
+            "SELECT size FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO responses "
+            "(key, etag, payload, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, etag, data, len(data), now + ttl, now),
+        )
+        self._size += len(data) - (row[0] if row is not None else 0)
+        self._written_size += len(data)
+        if self._size > self._max_size or self._written_size > self._max_size / 10:
+            # Other processes change size of shared file too
+            self._size = self._read_size()
+            self._written_size = 0
+            if self._size > self._max_size:
+                self._evict()
+
+    def _refresh(self, key: str, ttl: float):
+        now = time.time()
+        self._connection.execute(
+            "UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?",
+            (now + ttl, now, key),
+        )
+
+    def _evict(self):
+        """
+        Delete least recently used entries until cache takes 90% of max size
+        """
+        target = self._max_size * 0.9
+        evicted = []
+        cursor = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at")
+        for key, size in cursor:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        cursor.close()
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logger.info("Evicted cached responses: count={}; size={}", len(evicted), self._size)
@@ -0,0 +1,50 @@
+import datetime
+from typing import Iterable, List, Set, Tuple
+
+
+MAX_INSIGHTS_DAYS = 90
+
+DateRange = Tuple[datetime.date, datetime.date]
+
+
+def get_missing_ranges(
+        covered: Set[datetime.date],
+        since: datetime.date,
+        until: datetime.date,
+) -> List[DateRange]:
+    """
+    Get ranges of consecutive dates from since till until inclusive which aren't covered
+    """
+    ranges = []
+    start = None
+    day = datetime.timedelta(days=1)
+    date = since
+    while date <= until:
+        if date not in covered and start is None:
+            start = date
+        elif date in covered and start is not None:
+            ranges.append((start, date - day))
+            start = None
+        date += day
+    if start is not None:
+        ranges.append((start, until))
+    return ranges
+
+
+def get_windows(ranges: Iterable[DateRange], max_days: int = MAX_INSIGHTS_DAYS) -> List[DateRange]:
+    """
+    Get since and until of insights requests which return values with end dates of ranges
+
+    Window starts day before range and ends day after it, so it includes bounds of range
+    whether Graph API treats since and until as inclusive or not. Windows are not longer
+    than max_days, long ranges are split to several windows.
+    """
+    windows = []
+    day = datetime.timedelta(days=1)
+    chunk = datetime.timedelta(days=max(max_days - 2, 1))
+    for start, end in ranges:
+        while start <= end:
+            chunk_end = min(start + chunk - day, end)
+            windows.append((start - day, chunk_end + day))
+            start = chunk_end + day
+    return windows
@@ -0,0 +1,242 @@
+import datetime
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple, Type
+
+from asyncpg.exceptions import DuplicateTableError, UniqueViolationError
+from facet import ServiceMixin
+from loguru import logger
+from tortoise import Tortoise
+
+from .database import DatabaseService, quote
+from ..models.base import (
+    InsightMixinModel,
+    PageInsightAbstractModel,
+    PagePostInsightAbstractModel,
+)
+from ..models.mapping import parse_utc_datetime
+
+
+InsightRow = Tuple[str, str, str, datetime.datetime, str, float]
+
+
+def literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def get_month(value: datetime.datetime) -> datetime.datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_next_month(value: datetime.datetime) -> datetime.datetime:
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+class InsightsStore(ServiceMixin):
+    """
+    Storage of all insight metrics in one long-format table of PostgreSQL
+
+    Every value is a row of insights(object_id, metric, period, end_time, key, value), so new
+    metrics and new keys of values don't need migrations. Table is partitioned by months of
+    end_time, partitions are created when rows of new month are written. Values without end
+    time (lifetime post insights) are stored with LIFETIME_END_TIME.
+
+    Rows are copied to temporary table with COPY and merged into insights table with
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE. Views "v_<table of model>" keep shapes of
+    tables of insight models.
+    """
+
+    TABLE = "insights"
+    COLUMNS = ("object_id", "metric", "period", "end_time", "key", "value")
+    KEY_COLUMNS = COLUMNS[:-1]
+    LIFETIME_END_TIME = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    DATE_FORMAT = 'YYYY-MM-DD"T"HH24:MI:SS"+0000"'
+
+    def __init__(
+            self,
+            database_service: DatabaseService,
+            view_models: Iterable[Type[InsightMixinModel]],
+    ):
+        self._database_service = database_service
+        self._view_models = tuple(view_models)
+        self._partitions: Set[datetime.datetime] = set()
+
+    @property
+    def dependencies(self) -> List[ServiceMixin]:
+        return [
+            self._database_service,
+        ]
+
+    @staticmethod
+    def get_connection():
+        return Tortoise.get_connection("default")
+
+    @classmethod
+    def make_page_insight_rows(
+            cls,
+            view_model: Type[PageInsightAbstractModel],
+            page_id: str,
+            data: Dict[str, Any],
+    ) -> List[InsightRow]:
+        period = data["period"]
+        return [
+            (
+                page_id,
+                view_model.METRIC,
+                period,
+                parse_utc_datetime(value["end_time"]),
+                "",
+                value["value"],
+            )
+            for value in data["values"]
+        ]
+
+    @classmethod
+    def make_page_post_insight_rows(
+            cls,
+            view_model: Type[PagePostInsightAbstractModel],
+            page_id: str,
+            post_id: str,
+            data: Dict[str, Any],
+    ) -> List[InsightRow]:
+        """
+        Make rows of all keys of post insight values, not only keys of model fields
+        """
+        object_id = f"{page_id}_{post_id}"
+        period = data["period"]
+        rows = []
+        for value in data["values"]:
+            end_time = value.get("end_time")
+            end_time = cls.LIFETIME_END_TIME if end_time is None else parse_utc_datetime(end_time)
+            counters = value["value"]
+            if not isinstance(counters, dict):
+                counters = {"": counters}
+            rows.extend(
+                (object_id, view_model.METRIC, period, end_time, key, count)
+                for key, count in counters.items()
+            )
+        return rows
+
+    async def start(self):
+        async with self.get_connection().acquire_connection() as connection:
+            await connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {quote(self.TABLE)} ("
+                f"\"object_id\" VARCHAR(128) NOT NULL, "
+                f"\"metric\" VARCHAR(255) NOT NULL, "
+                f"\"period\" VARCHAR(64) NOT NULL, "
+                f"\"end_time\" TIMESTAMPTZ NOT NULL, "
+                f"\"key\" VARCHAR(255) NOT NULL DEFAULT '', "
+                f"\"value\" DOUBLE PRECISION, "
+                f"\"created_at\" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+                f"\"updated_at\" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+                f"PRIMARY KEY ({', '.join(map(quote, self.KEY_COLUMNS))})"
+                f") PARTITION BY RANGE (\"end_time\")"
+            )
+            for view_model in self._view_models:
+                await connection.execute(self.build_view_query(view_model))
+        logger.info("Insights store started: table={}", self.TABLE)
+
+    def build_view_query(self, view_model: Type[InsightMixinModel]) -> str:
+        view = quote(f"v_{view_model._meta.db_table}")
+        condition = (
+            f"\"metric\" = {literal(view_model.METRIC)} "
+            f"AND \"period\" = {literal(view_model.PERIOD.value)}"
+        )
+        if issubclass(view_model, PagePostInsightAbstractModel):
+            counters = ", ".join(
+                f"MAX(\"value\") FILTER (WHERE \"key\" = {literal(key)})::INTEGER "
+                f"AS {quote(field)}"
+                for field, key in view_model.VALUE_KEYS.items()
+            )
+            return (
+                f"CREATE OR REPLACE VIEW {view} AS "
+                f"SELECT split_part(\"object_id\", '_', 1) AS \"page_id\", "
+                f"substr(\"object_id\", strpos(\"object_id\", '_') + 1) AS \"post_id\", "
+                f"\"period\" AS \"m_period\", {counters}, "
+                f"MIN(\"created_at\") AS \"created_at\", MAX(\"updated_at\") AS \"updated_at\" "
+                f"FROM {quote(self.TABLE)} WHERE {condition} "
+                f"GROUP BY \"object_id\", \"period\""
+            )
+        return (
+            f"CREATE OR REPLACE VIEW {view} AS "
+            f"SELECT \"object_id\" AS \"page_id\", \"period\" AS \"m_period\", "
+            f"to_char(\"end_time\" AT TIME ZONE 'UTC', {literal(self.DATE_FORMAT)}) "
+            f"AS \"m_date\", \"value\", \"created_at\", \"updated_at\" "
+            f"FROM {quote(self.TABLE)} WHERE {condition}"
+        )
+
+    async def get_dates(
+            self,
+            view_model: Type[InsightMixinModel],
+            object_id: str,
+            since: datetime.date,
+    ) -> Set[datetime.date]:
+        """
+        Get end dates in UTC of stored values of insight metric of object since date
+        """
+        async with self.get_connection().acquire_connection() as connection:
+            rows = await connection.fetch(
+                f"SELECT DISTINCT (\"end_time\" AT TIME ZONE 'UTC')::DATE AS \"date\" "
+                f"FROM {quote(self.TABLE)} "
+                f"WHERE \"object_id\" = $1 AND \"metric\" = $2 AND \"period\" = $3 "
+                f"AND \"end_time\" >= $4",
+                object_id,
+                view_model.METRIC,
+                view_model.PERIOD.value,
+                datetime.datetime.combine(since, datetime.time(), tzinfo=datetime.timezone.utc),
+            )
+        return {row["date"] for row in rows}
+
+    async def create_partitions(self, connection, end_times: Iterable[datetime.datetime]):
+        """
+        Create partitions for months of end times which weren't created by this store
+        """
+        for month in {get_month(end_time) for end_time in end_times} - self._partitions:
+            partition = quote(f"{self.TABLE}_p{month:%Y%m}")
+            try:
+                await connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {quote(self.TABLE)} "
+                    f"FOR VALUES FROM ({literal(month.isoformat())}) "
+                    f"TO ({literal(get_next_month(month).isoformat())})"
+                )
+            except (DuplicateTableError, UniqueViolationError):
+                # Partition was created by other process at the same time
+                pass
+            self._partitions.add(month)
+            logger.info("Created insights partition: partition={}", partition)
+
+    async def write(self, rows: Sequence[InsightRow]) -> int:
+        """
+        Insert rows or update values of existing rows with the same key if they change
+
+        Return count of inserted or changed rows.
+        """
+        if not rows:
+            return 0
+
+        # Duplicate keys are dropped like in DatabaseService.bulk_upsert
+        unique_rows = list({row[:-1]: row for row in rows}.values())
+        columns = ", ".join(map(quote, self.COLUMNS))
+        staging = quote(f"{self.TABLE}_staging")
+        async with self.get_connection().acquire_connection() as connection:
+            await self.create_partitions(connection, (row[3] for row in unique_rows))
+            async with connection.transaction():
+                await connection.execute(
+                    f"CREATE TEMPORARY TABLE {staging} "
+                    f"(LIKE {quote(self.TABLE)} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                await connection.copy_records_to_table(
+                    f"{self.TABLE}_staging",
+                    records=unique_rows,
+                    columns=self.COLUMNS,
+                )
+                status = await connection.execute(
+                    f"INSERT INTO {quote(self.TABLE)} ({columns}) "
+                    f"SELECT {columns} FROM {staging} "
+                    f"ON CONFLICT ({', '.join(map(quote, self.KEY_COLUMNS))}) "
+                    f"DO UPDATE SET \"value\" = EXCLUDED.\"value\", "
+                    f"\"updated_at\" = EXCLUDED.\"updated_at\" "
+                    f"WHERE {quote(self.TABLE)}.\"value\" IS DISTINCT FROM EXCLUDED.\"value\""
+                )
+        # Status of INSERT command is "INSERT 0 <count>"
+        return int(status.split()[-1])
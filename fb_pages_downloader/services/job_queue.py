@@ -0,0 +1,215 @@
+import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from .database import DatabaseService, get_placeholders, quote
+from ..models import Job
+from ..models.job import JobKindEnum, JobStatusEnum
+
+
+class JobQueue:
+    """
+    Queue of jobs in database table shared by any number of nodes
+
+    Node claims jobs with SELECT ... FOR UPDATE SKIP LOCKED (on PostgreSQL), so every job is
+    given to one node only. Claimed job is leased for lease seconds, node must prolong lease
+    with heartbeats while job is running, otherwise job will be claimed by other node.
+    Failed jobs are returned to queue until they are claimed max_attempts times.
+    """
+
+    FINISHED_STATUSES = (JobStatusEnum.done, JobStatusEnum.failed)
+
+    def __init__(
+            self,
+            database_service: DatabaseService,
+            node: str,
+            lease: float = 60,
+            max_attempts: int = 3,
+    ):
+        self._database_service = database_service
+        self._node = node
+        self._lease = datetime.timedelta(seconds=lease)
+        self._max_attempts = max_attempts
+
+    @staticmethod
+    def make_job(kind: JobKindEnum, page_id: str, target: str = "") -> Dict[str, Any]:
+        return {
+            "kind": kind,
+            "page_id": page_id,
+            "target": target,
+            "status": JobStatusEnum.pending,
+            "attempts": 0,
+            "leased_until": None,
+            "leased_by": None,
+            "error": None,
+        }
+
+    @staticmethod
+    def now() -> datetime.datetime:
+        return datetime.datetime.now(tz=datetime.timezone.utc)
+
+    async def enqueue(self, jobs: List[Dict[str, Any]]) -> int:
+        """
+        Add jobs to queue, return count of added jobs
+
+        Existing job with the same kind, page and target is reset only if it's done or failed,
+        pending and running jobs are not changed, so job isn't run twice at once.
+        """
+        finished = ", ".join(f"'{status.value}'" for status in self.FINISHED_STATUSES)
+        return await self._database_service.bulk_upsert(
+            model=Job,
+            rows=jobs,
+            where=f"{quote(Job._meta.db_table)}.\"status\" IN ({finished})",
+        )
+
+    async def execute(self, query: str, values: List[Any]) -> List[Dict[str, Any]]:
+        return await Job._meta.db.execute_query_dict(query, values)
+
+    async def claim(self, page_ids: Sequence[str], count: int = 1) -> List[Dict[str, Any]]:
+        """
+        Take up to count jobs of pages which are pending or which lease is expired
+        """
+        if not page_ids or count <= 0:
+            return []
+
+        db = Job._meta.db
+        dialect = db.capabilities.dialect
+        now = self.now()
+        await self.expire(page_ids=page_ids, now=now)
+
+        placeholders = iter(get_placeholders(dialect=dialect, count=len(page_ids) + 10))
+        query = (
+            f"UPDATE {quote(Job._meta.db_table)} "
+            f"SET \"status\" = {next(placeholders)}, \"attempts\" = \"attempts\" + 1, "
+            f"\"leased_until\" = {next(placeholders)}, \"leased_by\" = {next(placeholders)}, "
+            f"\"updated_at\" = {next(placeholders)} "
+            f"WHERE \"id\" IN ("
+            f"SELECT \"id\" FROM {quote(Job._meta.db_table)} "
+            f"WHERE \"page_id\" IN ({', '.join(next(placeholders) for _ in page_ids)}) "
+            f"AND \"attempts\" < {next(placeholders)} "
+            f"AND (\"status\" = {next(placeholders)} "
+            f"OR (\"status\" = {next(placeholders)} AND \"leased_until\" < {next(placeholders)})) "
+            f"ORDER BY \"id\" LIMIT {next(placeholders)}"
+            f"{' FOR UPDATE SKIP LOCKED' if dialect == 'postgres' else ''}"
+            f") RETURNING \"id\", \"kind\", \"page_id\", \"target\", \"attempts\""
+        )
+        values = [
+            JobStatusEnum.running.value,
+            now + self._lease,
+            self._node,
+            now,
+            *page_ids,
+            self._max_attempts,
+            JobStatusEnum.pending.value,
+            JobStatusEnum.running.value,
+            now,
+            count,
+        ]
+        jobs = await self.execute(query, values)
+        for job in jobs:
+            logger.info(
+                "Claimed job: job_id={}; kind={}; page_id={}; target={}; attempt={}",
+                job["id"],
+                job["kind"],
+                job["page_id"],
+                job["target"],
+                job["attempts"],
+            )
+        return jobs
+
+    async def expire(self, page_ids: Sequence[str], now: datetime.datetime):
+        """
+        Mark as failed jobs which lease is expired and which can't be claimed anymore
+        """
+        placeholders = iter(get_placeholders(
+            dialect=Job._meta.db.capabilities.dialect,
+            count=len(page_ids) + 6,
+        ))
+        query = (
+            f"UPDATE {quote(Job._meta.db_table)} "
+            f"SET \"status\" = {next(placeholders)}, \"error\" = {next(placeholders)}, "
+            f"\"updated_at\" = {next(placeholders)} "
+            f"WHERE \"page_id\" IN ({', '.join(next(placeholders) for _ in page_ids)}) "
+            f"AND \"status\" = {next(placeholders)} AND \"leased_until\" < {next(placeholders)} "
+            f"AND \"attempts\" >= {next(placeholders)} "
+            f"RETURNING \"id\""
+        )
+        values = [
+            JobStatusEnum.failed.value,
+            "Lease expired",
+            now,
+            *page_ids,
+            JobStatusEnum.running.value,
+            now,
+            self._max_attempts,
+        ]
+        for job in await self.execute(query, values):
+            logger.error("Job lease expired too many times: job_id={}", job["id"])
+
+    async def heartbeat(self, job_ids: Sequence[int]):
+        """
+        Prolong lease of running jobs of node
+        """
+        if not job_ids:
+            return
+
+        now = self.now()
+        placeholders = iter(get_placeholders(
+            dialect=Job._meta.db.capabilities.dialect,
+            count=len(job_ids) + 3,
+        ))
+        query = (
+            f"UPDATE {quote(Job._meta.db_table)} "
+            f"SET \"leased_until\" = {next(placeholders)}, \"updated_at\" = {next(placeholders)} "
+            f"WHERE \"id\" IN ({', '.join(next(placeholders) for _ in job_ids)}) "
+            f"AND \"leased_by\" = {next(placeholders)} "
+            f"RETURNING \"id\""
+        )
+        await self.execute(query, [now + self._lease, now, *job_ids, self._node])
+
+    async def finish(self, job: Dict[str, Any], error: Optional[BaseException] = None):
+        """
+        Mark job as done, or return it to queue if it failed and has attempts left
+        """
+        if error is None:
+            status = JobStatusEnum.done
+        elif job["attempts"] < self._max_attempts:
+            status = JobStatusEnum.pending
+        else:
+            status = JobStatusEnum.failed
+
+        placeholders = iter(get_placeholders(dialect=Job._meta.db.capabilities.dialect, count=5))
+        query = (
+            f"UPDATE {quote(Job._meta.db_table)} "
+            f"SET \"status\" = {next(placeholders)}, \"error\" = {next(placeholders)}, "
+            f"\"leased_until\" = NULL, \"updated_at\" = {next(placeholders)} "
+            f"WHERE \"id\" = {next(placeholders)} AND \"leased_by\" = {next(placeholders)} "
+            f"RETURNING \"id\""
+        )
+        values = [
+            status.value,
+            None if error is None else repr(error),
+            self.now(),
+            job["id"],
+            self._node,
+        ]
+        await self.execute(query, values)
+        logger.info("Finished job: job_id={}; status={}", job["id"], status.value)
+
+    async def count_unfinished(self, page_ids: Sequence[str]) -> int:
+        if not page_ids:
+            return 0
+
+        placeholders = iter(get_placeholders(
+            dialect=Job._meta.db.capabilities.dialect,
+            count=len(page_ids) + 2,
+        ))
+        query = (
+            f"SELECT COUNT(*) AS \"count\" FROM {quote(Job._meta.db_table)} "
+            f"WHERE \"page_id\" IN ({', '.join(next(placeholders) for _ in page_ids)}) "
+            f"AND \"status\" IN ({next(placeholders)}, {next(placeholders)})"
+        )
+        values = [*page_ids, JobStatusEnum.pending.value, JobStatusEnum.running.value]
+        rows = await self.execute(query, values)
+        return rows[0]["count"]
@@ -1,14 +1,43 @@
 import asyncio
 import datetime
-from typing import Any, Dict, List, Type
+import os
+import socket
+from collections import deque
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+)
 
 from facet import ServiceMixin
 from loguru import logger
 
+from .archive import ResponseArchive
 from .database import DatabaseService
 from .email import EmailService
 from .fb_pages import FacebookPagesService
+from .http_cache import ResponseCache
+from .insights_planner import get_missing_ranges, get_windows
+from .insights_store import InsightsStore
+from .job_queue import JobQueue
+from .pipeline import BufferedWriter, TaskPool, WriteError
+from .rate_limit import SharedUsage
 from ..models import (
+    Checkpoint,
+    Job,
+    Page,
+    PagePost,
+    PagePostAttachment,
     PagePostEngagementsDay,
     PagePostImpressionNonviralUniqueDay,
     PagePostImpressionOrganicUniqueDay,
@@ -25,9 +54,35 @@ from ..models import (
     PostActivityByActionTypeUniqueLifetime,
     PostClicksByTypeUniqueLifetime,
     PostReactionsByTypeTotalUniqueLifetime,
+    SyncState,
+)
+from ..models.base import (
+    BaseAbstractModel,
+    InsightMixinModel,
+    PageInsightAbstractModel,
+    PagePostInsightAbstractModel,
 )
-from ..models.base import PageInsightAbstractModel, PagePostInsightAbstractModel
-from ..settings import InsightsForPeriodEnum, Settings
+from ..models.insight_batch import PageInsightBatch
+from ..models.job import JobKindEnum
+from ..models.mapping import Mapping, parse_utc_datetime
+from ..settings import InsightsForPeriodEnum, InsightsStorageEnum, Settings
+
+
+job_errors: ContextVar[Optional[List[BaseException]]] = ContextVar("job_errors", default=None)
+
+
+def collect_job_error(exception: BaseException):
+    """
+    Remember error caught in any task of running job, so job can be marked as failed
+    """
+    errors = job_errors.get()
+    if errors is not None:
+        errors.append(exception)
+
+
+async def iterate(items: Iterable[Any]) -> AsyncGenerator[Any, None]:
+    for item in items:
+        yield item
 
 
 class MainService(ServiceMixin):
@@ -40,22 +95,22 @@ class MainService(ServiceMixin):
                        ______
                       |start|
                       |_____|
-                   ______|_____
-           _______|______     |
-           |load_account|    ...
-           |____________|
+           _______________|______________________
+     ______|_______   |   _______|______        |
+     |load_account|  ...  |load_page_data|     ...
+     |____________|       |______________|
          ________|____________________________________________________________________
     _____|_____   |   ________|________   |                                 _________|_________
     |load_page|  ...  |load_page_posts|  ...                                |load_page_insights|
     |_________|       |_______________|                                     |__________________|
                   ____________|__________________________________________________________      |
-    ______________|_____________   |              |   |  ______________|_____________   |      |
-    |load_page_post_attachments|  ...             |   |  |update_or_create_page_post|  ...     |
-    |__________________________|                  |   |  |__________________________|          |
+    ______________|_____________   |              |   |  ______________|______________  |      |
+    |load_page_post_attachments|  ...             |   |  |update_or_create_page_posts| ...     |
+    |__________________________|                  |   |  |___________________________|         |
                   |____________________________   |   |                     ___________________|
-    ______________|________________________   |   |   |     ________________|______________    |
-    |update_or_create_page_post_attachment|  ...  |   |     |update_or_create_page_insight|   ...
-    |_____________________________________|       |   |     |_____________________________|
+    ______________|_________________________  |   |   |     ________________|______________    |
+    |update_or_create_page_post_attachments| ...  |   |     |update_or_create_page_insight|   ...
+    |______________________________________|      |   |     |_____________________________|
                           ________________________|   |
                           |load_page_post_insights|  ...
                           |_______________________|
@@ -63,9 +118,14 @@ class MainService(ServiceMixin):
                      _________________|_________________   |
                     |update_or_create_page_post_insight|  ...
                     |__________________________________|
+
+    update_or_create_* methods put records to buffered writers which save them by batches.
+    Checkpoints, incremental sync, workers and job queue are described in README.
     """
 
-    DATE_FORMAT = "%Y-%m-%dT%H:%M:%S+0000"
+    PAGE_ENDPOINT = "page"
+    POSTS_ENDPOINT = "published_posts"
+    INSIGHTS_ENDPOINT = "insights:{metric}"
     PAGE_INSIGHT_MODELS = (
         PagePostEngagementsDay,
         PagePostImpressionNonviralUniqueDay,
@@ -86,6 +146,11 @@ class MainService(ServiceMixin):
         PostClicksByTypeUniqueLifetime,
         PostReactionsByTypeTotalUniqueLifetime,
     )
+    MAPPED_MODELS = {
+        "page": Page,
+        "post": PagePost,
+        "post_attachments": PagePostAttachment,
+    }
     TIMEDELTA_MAPPING = {
         InsightsForPeriodEnum.day.value: datetime.timedelta(days=1),
         InsightsForPeriodEnum.week.value: datetime.timedelta(weeks=1),
@@ -94,17 +159,60 @@ class MainService(ServiceMixin):
         InsightsForPeriodEnum.year.value: datetime.timedelta(days=365),
     }
 
-    def __init__(self, settings: Settings):
+    def __init__(
+            self,
+            settings: Settings,
+            pages: Optional[Dict[str, List[str]]] = None,
+            shared_usage: Optional[SharedUsage] = None,
+            resume: bool = False,
+            replay: Optional[str] = None,
+    ):
         self.settings = settings
+        self.pages = pages
+        self.resume = resume
+        self.replay = replay
+        self.summary: Dict[str, int] = {}
         self.facebook_pages_service = FacebookPagesService(
             connections_limit=settings.fb_pages_connections_limit,
             delay_per_request=settings.fb_pages_delay_per_request,
             retry_attempts=settings.fb_pages_retry_attempts,
             retry_delay_function=settings.fb_pages_retry_delay_function.value,
+            retry_base_delay=settings.fb_pages_retry_base_delay,
+            retry_max_delay=settings.fb_pages_retry_max_delay,
             version=settings.fb_pages_version,
+            base_url=settings.fb_pages_base_url,
+            paging_prefetch=settings.fb_pages_paging_prefetch,
+            paging_limit=settings.fb_pages_paging_limit,
+            paging_min_limit=settings.fb_pages_paging_min_limit,
+            paging_slow_time=settings.fb_pages_paging_slow_time,
+            json_decoder=settings.fb_pages_json_decoder.value,
+            stream_size=settings.fb_pages_stream_size,
+            batch_size=settings.fb_pages_batch_size,
+            batch_delay=settings.fb_pages_batch_delay,
+            min_connections_limit=settings.fb_pages_min_connections_limit,
+            low_usage=settings.fb_pages_low_usage,
+            high_usage=settings.fb_pages_high_usage,
+            max_throttling_delay=settings.fb_pages_max_throttling_delay,
+            throttling_pause=settings.fb_pages_throttling_pause,
+            shared_usage=shared_usage,
+            archive=(
+                None
+                if settings.fb_pages_archive_path is None or replay is not None
+                else ResponseArchive(path=settings.fb_pages_archive_path)
+            ),
+            cache=(
+                None
+                if settings.fb_pages_cache_path is None
+                else ResponseCache(
+                    path=settings.fb_pages_cache_path,
+                    ttls=settings.fb_pages_cache_ttls,
+                    max_size=settings.fb_pages_cache_max_size,
+                )
+            ),
         )
         self.database_service = DatabaseService(
             db_url=settings.db_url,
+            batch_size=settings.db_batch_size,
         )
         self.email_service = EmailService(
             to=settings.email_to,
@@ -117,263 +225,934 @@ class MainService(ServiceMixin):
         )
         self._logger_email_sink_id = None
         self._logger_file_sink_ids = []
+        self._writers: Dict[Type, BufferedWriter] = {}
+        # Watermarks with job errors of tasks which set them
+        self._watermarks: Dict[
+            Tuple[str, str],
+            Tuple[datetime.datetime, Optional[List[BaseException]]],
+        ] = {}
+        self._mappings = self.get_mappings(settings.fb_pages_excluded_fields)
+        self._page_insight_groups = self.group_insight_models(
+            view_models=self.PAGE_INSIGHT_MODELS,
+            grouped=settings.fb_pages_group_insight_metrics,
+        )
+        self._page_post_insight_groups = self.group_insight_models(
+            view_models=self.PAGE_POST_INSIGHT_MODELS,
+            grouped=settings.fb_pages_group_insight_metrics,
+        )
+        self._page_insight_groups_by_target = {
+            self.get_insights_target(view_models): view_models
+            for view_models in self._page_insight_groups
+        }
+        self._page_post_insight_groups_by_target = {
+            self.get_insights_target(view_models): view_models
+            for view_models in self._page_post_insight_groups
+        }
+        self.job_queue: Optional[JobQueue] = None
+        self.insights_store: Optional[InsightsStore] = None
+        if settings.insights_storage == InsightsStorageEnum.unified:
+            self.insights_store = InsightsStore(
+                database_service=self.database_service,
+                view_models=(*self.PAGE_INSIGHT_MODELS, *self.PAGE_POST_INSIGHT_MODELS),
+            )
 
     @property
     def dependencies(self) -> List[ServiceMixin]:
-        return [
+        dependencies = [
             self.facebook_pages_service,
             self.database_service,
             self.email_service,
         ]
+        if self.insights_store is not None:
+            dependencies.append(self.insights_store)
+        return dependencies
+
+    @staticmethod
+    def to_utc_datetime(date_string: str) -> datetime.datetime:
+        return parse_utc_datetime(date_string)
+
+    def set_watermark(self, page_id: str, endpoint: str, watermark: datetime.datetime):
+        """
+        Remember that endpoint of page is synchronized up to watermark
+
+        Watermarks are saved to database only after all downloaded records are saved.
+        """
+        key = (page_id, endpoint)
+        if key not in self._watermarks or self._watermarks[key][0] < watermark:
+            self._watermarks[key] = (watermark, job_errors.get())
+
+    async def save_watermarks(self):
+        """
+        Save watermarks of tasks which succeeded, writers must be stopped before
+        """
+        rows = [
+            {"page_id": page_id, "endpoint": endpoint, "watermark": watermark}
+            for (page_id, endpoint), (watermark, errors) in self._watermarks.items()
+            if not errors
+        ]
+        await self.database_service.bulk_upsert(model=SyncState, rows=rows)
+        self._watermarks.clear()
+
+    @classmethod
+    def get_insights_watermark(
+            cls,
+            watermarks: Dict[str, datetime.datetime],
+            view_models: Iterable[Type[InsightMixinModel]],
+    ) -> Optional[datetime.datetime]:
+        """
+        Get watermark of insights group: the earliest watermark of its metrics
+        """
+        group_watermarks = [
+            watermarks.get(cls.INSIGHTS_ENDPOINT.format(metric=view_model.METRIC))
+            for view_model in view_models
+        ]
+        if None in group_watermarks:
+            return None
+        return min(group_watermarks)
+
+    def get_writer(self, model: Type[BaseAbstractModel]) -> BufferedWriter:
+        """
+        Get buffered writer for model, writer will be created and started if it doesn't exist
+
+        Writers of page insights take PageInsightBatch records instead of rows. With unified
+        insights storage all insight models share one writer of InsightsStore rows.
+        """
+        if self.insights_store is not None and issubclass(model, InsightMixinModel):
+            model = InsightMixinModel
+        writer = self._writers.get(model)
+        if writer is None:
+            unified = model is InsightMixinModel
+            columnar = issubclass(model, PageInsightAbstractModel)
+            table = self.insights_store.TABLE if unified else model._meta.db_table
+
+            async def write(rows: List[Any]):
+                if model is Checkpoint:
+                    # Checkpoints can be saved only after records which they cover
+                    await asyncio.gather(*(
+                        writer.wait()
+                        for other_model, writer in list(self._writers.items())
+                        if other_model is not Checkpoint
+                    ))
+                    # Checkpoints of tasks whose records failed to be written are dropped
+                    rows = [
+                        {key: value for key, value in row.items() if key != "errors"}
+                        for row in rows
+                        if not row["errors"]
+                    ]
+                    if not rows:
+                        return
+                if unified:
+                    changed = await self.insights_store.write(rows)
+                    count = len(rows)
+                elif columnar:
+                    batch = PageInsightBatch.concat(rows)
+                    changed = await self.database_service.bulk_upsert_columns(
+                        model=model,
+                        columns=batch.to_columns(),
+                    )
+                    count = len(batch)
+                elif model is Job:
+                    changed = await self.job_queue.enqueue(rows)
+                    count = len(rows)
+                else:
+                    changed = await self.database_service.bulk_upsert(model=model, rows=rows)
+                    count = len(rows)
+                self.summary[table] = self.summary.get(table, 0) + count
+                logger.debug("Changed records: name={}; count={}", table, changed)
+
+            writer = BufferedWriter(
+                name=table,
+                write=write,
+                queue_size=self.settings.pipeline_queue_size,
+                batch_size=self.settings.db_batch_size,
+                flush_interval=self.settings.pipeline_flush_interval,
+                get_size=len if columnar else None,
+                get_errors=job_errors.get,
+            )
+            writer.start()
+            self._writers[model] = writer
+        return writer
+
+    async def stop_writers(self):
+        """
+        Stop all writers, then raise WriteError if records of any of them weren't written
+        """
+        error = None
+        # Checkpoints writer is stopped last, because it waits for other writers
+        for model in sorted(self._writers, key=lambda model: model is Checkpoint):
+            try:
+                await self._writers.pop(model).stop()
+            except WriteError as exception:
+                error = error or exception
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def is_complete_edge(edge: Optional[Dict[str, Any]]) -> bool:
+        """
+        Check that edge expanded in parent object payload contains all its items
+        """
+        return edge is not None and "next" not in edge.get("paging", {})
 
     @classmethod
-    def to_datetime(cls, date_string: str) -> datetime.datetime:
-        return datetime.datetime.strptime(date_string, cls.DATE_FORMAT)
+    def get_mappings(
+            cls,
+            excluded_fields: Dict[str, List[str]],
+    ) -> Dict[Type[BaseAbstractModel], Mapping]:
+        """
+        Get mappings of models without excluded fields, keys of excluded fields are endpoints
+
+        Only nullable fields can be excluded, they aren't requested and aren't written.
+        """
+        mappings = {}
+        for endpoint, model in cls.MAPPED_MODELS.items():
+            excluded = excluded_fields.get(endpoint, [])
+            for field in excluded:
+                if field not in model.MAPPING.fields or not model._meta.fields_map[field].null:
+                    raise ValueError(f"Field '{field}' of {endpoint} can not be excluded")
+            mappings[model] = model.MAPPING.without(excluded)
+        return mappings
+
+    def get_page_post_fields(self) -> List[str]:
+        fields = self._mappings[PagePost].get_fields()
+        if not self.settings.fb_pages_expand_posts:
+            return fields
+
+        if self.settings.load_page_post_attachments:
+            attachment_fields = ",".join(self._mappings[PagePostAttachment].get_fields())
+            fields.append(f"attachments{{{attachment_fields}}}")
+        if self.settings.load_page_post_insights:
+            for view_models in self._page_post_insight_groups:
+                metrics = ",".join(view_model.METRIC for view_model in view_models)
+                period = view_models[0].PERIOD.value
+                fields.append(f"insights.metric({metrics}).period({period})")
+        return fields
+
+    @staticmethod
+    def group_insight_models(
+            view_models: Iterable[Type[InsightMixinModel]],
+            grouped: bool = True,
+    ) -> List[Tuple[Type[InsightMixinModel], ...]]:
+        """
+        Split insight models to groups which can be requested in one Graph API call
+
+        Metrics can be requested together only if they have the same period. If grouping
+        is disabled, every model makes its own group.
+        """
+        if not grouped:
+            return [(view_model,) for view_model in view_models]
+
+        groups = {}
+        for view_model in view_models:
+            groups.setdefault(view_model.PERIOD, []).append(view_model)
+        return [tuple(group) for group in groups.values()]
+
+    @staticmethod
+    def get_insights_target(view_models: Iterable[Type[InsightMixinModel]]) -> str:
+        return ",".join(view_model.METRIC for view_model in view_models)
+
+    async def get_watermarks(self, page_id: str) -> Dict[str, datetime.datetime]:
+        """
+        Get watermarks of page endpoints moved back by incremental_sync_lookback_days
+
+        So posts which were edited and insights which still change after last synchronization
+        are loaded again.
+        """
+        if not self.settings.incremental_sync:
+            return {}
+        lookback = datetime.timedelta(days=self.settings.incremental_sync_lookback_days)
+        watermarks = await self.database_service.get_sync_watermarks(page_id=page_id)
+        return {endpoint: watermark - lookback for endpoint, watermark in watermarks.items()}
+
+    async def get_checkpoints(self, page_id: str) -> Dict[str, Checkpoint]:
+        """
+        Get checkpoints of page if run is resumed, otherwise forget checkpoints of previous run
+        """
+        if self.resume:
+            return await self.database_service.get_checkpoints(page_id=page_id)
+        await self.database_service.delete_checkpoints(page_id=page_id)
+        return {}
+
+    async def save_checkpoint(
+            self,
+            page_id: str,
+            endpoint: str,
+            completed: bool = False,
+            position: Optional[datetime.datetime] = None,
+    ):
+        """
+        Put checkpoint of page endpoint, it's written only if all records of task are written
+        """
+        await self.get_writer(Checkpoint).put({
+            "page_id": page_id,
+            "endpoint": endpoint,
+            "completed": completed,
+            "position": position,
+            "errors": job_errors.get(),
+        })
+
+    async def run_checkpointed(self, page_id: str, endpoint: str, coroutine: Awaitable):
+        """
+        Run loading of page endpoint and mark it completed if all its tasks succeeded
+
+        Completed checkpoint is written only after all records of endpoint are written.
+        """
+        errors = []
+        job_errors.set(errors)
+        await coroutine
+        if not errors:
+            await self.save_checkpoint(page_id=page_id, endpoint=endpoint, completed=True)
 
     async def start(self):
         logger.info("Main service started.")
         self._logger_email_sink_id = logger.add(self.email_service.logger_sink, level="ERROR")
-        for filename, level in self.settings.log_files.items():
+        for filename, level in (self.settings.log_files or {}).items():
             self._logger_file_sink_ids.append(logger.add(filename, level=level.value))
 
-        await asyncio.gather(*(
-            self.load_account(access_token)
-            for access_token in self.settings.fb_pages_access_tokens
-        ))
+        try:
+            if self.replay is not None:
+                await self.replay_archive(path=self.replay)
+                return
+            pages = self.pages if self.pages is not None else await self.discover_pages()
+            if self.settings.job_queue:
+                await self.run_jobs(pages=pages)
+            else:
+                await asyncio.gather(*(
+                    self.load_page_data(page_id=page_id, access_tokens=access_tokens)
+                    for page_id, access_tokens in pages.items()
+                ))
+        except asyncio.CancelledError:
+            logger.warning("Main service is cancelled, saving downloaded records.")
+            raise
+        finally:
+            await self.stop_writers()
+        # Interrupted run and failed writes don't move watermarks, so nothing is skipped later
+        await self.save_watermarks()
 
     async def stop(self):
+        await self.stop_writers()
         logger.remove(self._logger_email_sink_id)
         for sink_id in self._logger_file_sink_ids:
             logger.remove(sink_id)
         self._logger_file_sink_ids.clear()
         logger.info("Main service stopped.")
 
-    @logger.catch()
-    async def load_account(self, access_token: str):
+    async def discover_pages(self) -> Dict[str, List[str]]:
+        """
+        Get pages available for all access tokens with all their page access tokens
+
+        Page can be managed by several accounts, but it will be loaded only once. Requests
+        for page use its page access tokens in turn, preferring tokens with the lowest rate
+        limit usage.
+        """
+        pages = {}
+        for accounts in await asyncio.gather(*(
+                self.load_account(access_token)
+                for access_token in self.settings.fb_pages_access_tokens
+        )):
+            for account in accounts or ():
+                access_tokens = pages.setdefault(account["id"], [])
+                if account["access_token"] not in access_tokens:
+                    access_tokens.append(account["access_token"])
+        logger.info(
+            "Discovered pages: count={}; access_tokens_count={}",
+            len(pages),
+            sum(len(access_tokens) for access_tokens in pages.values()),
+        )
+        return pages
+
+    @logger.catch(onerror=collect_job_error)
+    async def load_account(self, access_token: str) -> List[Dict[str, Any]]:
         accounts_generator = self.facebook_pages_service.get_accounts(
             access_token=access_token,
         )
 
-        tasks = []
+        accounts = []
         async for account in accounts_generator:
             logger.info("Downloaded account: account_id={}", account["id"])
             logger.debug("Account payload: {}", account)
+            accounts.append(account)
+        return accounts
+
+    async def replay_archive(self, path: str):
+        """
+        Save records from archive of Graph API responses without requests to Graph API
+
+        Responses are transformed and saved the same way as downloaded ones, records of
+        disabled load_* settings are skipped. Watermarks and checkpoints are not changed.
+        """
+        attachment_positions = {}
+        records_count = 0
+        for record in ResponseArchive.read(path):
+            await self.replay_record(record=record, attachment_positions=attachment_positions)
+            records_count += 1
+        logger.info("Replayed archive: path={}; responses={}", path, records_count)
 
-            page_id = account["id"]
-            access_token = account["access_token"]
+    async def replay_record(self, record: Dict[str, Any], attachment_positions: Dict[str, int]):
+        parts = record["path"].strip("/").split("/")[1:]
+        if not parts or parts[0] == "me":
+            return
+        page_id, _, post_id = parts[0].partition("_")
+        edge = parts[1] if len(parts) > 1 else None
+        payload = record["payload"]
 
+        if not post_id and edge is None:
             if self.settings.load_pages:
-                task = asyncio.create_task(self.load_page(
+                await self.update_or_create_page(data=payload)
+        elif not post_id and edge == "published_posts":
+            if self.settings.load_page_posts:
+                for data in payload["data"]:
+                    await self.replay_page_post(page_id=page_id, data=data)
+        elif not post_id and edge == "insights":
+            if self.settings.load_page_insights:
+                view_models = {model.METRIC: model for model in self.PAGE_INSIGHT_MODELS}
+                for insight in payload["data"]:
+                    if insight["name"] in view_models:
+                        await self.update_or_create_page_insight(
+                            view_model=view_models[insight["name"]],
+                            page_id=page_id,
+                            data=insight,
+                        )
+        elif post_id and edge is None:
+            if self.settings.load_page_posts:
+                await self.replay_page_post(page_id=page_id, data=payload)
+        elif post_id and edge == "attachments":
+            if self.settings.load_page_post_attachments:
+                # Positions continue on next pages of attachments of the same post
+                position = 0
+                if "after" in record["params"]:
+                    position = attachment_positions.get(parts[0], 0)
+                await self.update_or_create_page_post_attachments(
+                    page_id=page_id,
+                    post_id=post_id,
+                    position=position,
+                    attachments=payload["data"],
+                )
+                attachment_positions[parts[0]] = position + len(payload["data"])
+        elif post_id and edge == "insights":
+            if self.settings.load_page_post_insights:
+                await self.replay_page_post_insights(
                     page_id=page_id,
-                    access_token=access_token,
+                    post_id=post_id,
+                    insights=payload["data"],
+                )
+
+    async def replay_page_post(self, page_id: str, data: Dict[str, Any]):
+        """
+        Save page post from archive with attachments and insights which were expanded in it
+        """
+        _, post_id = data["id"].split("_")
+        attachments = data.pop("attachments", None)
+        insights = data.pop("insights", None)
+
+        await self.update_or_create_page_post(data=data)
+        if self.settings.load_page_post_attachments and self.is_complete_edge(attachments):
+            await self.load_page_post_attachments(
+                page_id=page_id,
+                post_id=post_id,
+                access_tokens=(),
+                attachments=attachments["data"],
+            )
+        if self.settings.load_page_post_insights and self.is_complete_edge(insights):
+            await self.replay_page_post_insights(
+                page_id=page_id,
+                post_id=post_id,
+                insights=insights["data"],
+            )
+
+    async def replay_page_post_insights(
+            self,
+            page_id: str,
+            post_id: str,
+            insights: List[Dict[str, Any]],
+    ):
+        view_models = {model.METRIC: model for model in self.PAGE_POST_INSIGHT_MODELS}
+        for insight in insights:
+            if insight["name"] in view_models:
+                await self.update_or_create_page_post_insight(
+                    view_model=view_models[insight["name"]],
+                    page_id=page_id,
+                    post_id=post_id,
+                    data=insight,
+                )
+
+    @logger.catch(onerror=collect_job_error)
+    async def load_page_data(self, page_id: str, access_tokens: Sequence[str]):
+        watermarks = await self.get_watermarks(page_id=page_id)
+        checkpoints = await self.get_checkpoints(page_id=page_id)
+
+        def is_completed(endpoint: str) -> bool:
+            checkpoint = checkpoints.get(endpoint)
+            if checkpoint is not None and checkpoint.completed:
+                logger.info(
+                    "Skipped completed endpoint: page_id={}; endpoint={}",
+                    page_id,
+                    endpoint,
+                )
+                return True
+            return False
+
+        tasks = []
+        if self.settings.load_pages and not is_completed(self.PAGE_ENDPOINT):
+            task = asyncio.create_task(self.run_checkpointed(
+                page_id=page_id,
+                endpoint=self.PAGE_ENDPOINT,
+                coroutine=self.load_page(
+                    page_id=page_id,
+                    access_tokens=access_tokens,
+                ),
+            ))
+            tasks.append(task)
+
+        if self.settings.load_page_posts and not is_completed(self.POSTS_ENDPOINT):
+            checkpoint = checkpoints.get(self.POSTS_ENDPOINT)
+            task = asyncio.create_task(self.run_checkpointed(
+                page_id=page_id,
+                endpoint=self.POSTS_ENDPOINT,
+                coroutine=self.load_page_posts(
+                    page_id=page_id,
+                    access_tokens=access_tokens,
+                    watermark=watermarks.get(self.POSTS_ENDPOINT),
+                    position=None if checkpoint is None else checkpoint.position,
+                ),
+            ))
+            tasks.append(task)
+
+        if self.settings.load_page_insights:
+            for view_models in self._page_insight_groups:
+                endpoint = self.INSIGHTS_ENDPOINT.format(
+                    metric=self.get_insights_target(view_models),
+                )
+                if is_completed(endpoint):
+                    continue
+                task = asyncio.create_task(self.run_checkpointed(
+                    page_id=page_id,
+                    endpoint=endpoint,
+                    coroutine=self.load_page_insights(
+                        view_models=view_models,
+                        page_id=page_id,
+                        access_tokens=access_tokens,
+                        watermark=self.get_insights_watermark(
+                            watermarks=watermarks,
+                            view_models=view_models,
+                        ),
+                    ),
                 ))
                 tasks.append(task)
 
-            if self.settings.load_page_posts:
-                task = asyncio.create_task(self.load_page_posts(
+        # Unlike asyncio.wait, gather cancels tasks if loading is cancelled
+        await asyncio.gather(*tasks)
+
+    def make_page_jobs(self, page_id: str) -> List[Dict[str, Any]]:
+        jobs = []
+        if self.settings.load_pages:
+            jobs.append(JobQueue.make_job(kind=JobKindEnum.page, page_id=page_id))
+        if self.settings.load_page_posts:
+            jobs.append(JobQueue.make_job(kind=JobKindEnum.posts, page_id=page_id))
+        if self.settings.load_page_insights:
+            for target in self._page_insight_groups_by_target:
+                jobs.append(JobQueue.make_job(
+                    kind=JobKindEnum.insights,
                     page_id=page_id,
-                    access_token=access_token,
+                    target=target,
                 ))
-                tasks.append(task)
+        return jobs
 
-            if self.settings.load_page_insights:
-                for view_model in self.PAGE_INSIGHT_MODELS:
-                    task = asyncio.create_task(self.load_page_insights(
-                        view_model=view_model,
-                        page_id=page_id,
-                        access_token=access_token,
+    async def run_jobs(self, pages: Dict[str, List[str]]):
+        """
+        Run jobs of pages from job queue until all of them are finished
+        """
+        self.job_queue = JobQueue(
+            database_service=self.database_service,
+            node=f"{socket.gethostname()}:{os.getpid()}",
+            lease=self.settings.job_queue_lease,
+            max_attempts=self.settings.job_queue_max_attempts,
+        )
+        if self.settings.job_queue_enqueue and not self.resume:
+            await self.job_queue.enqueue([
+                job
+                for page_id in pages
+                for job in self.make_page_jobs(page_id=page_id)
+            ])
+
+        page_ids = list(pages)
+        running: Dict[int, asyncio.Task] = {}
+        heartbeats_task = asyncio.create_task(self.send_heartbeats(running=running))
+        try:
+            while True:
+                free_slots = self.settings.job_queue_concurrency - len(running)
+                for job in await self.job_queue.claim(page_ids=page_ids, count=free_slots):
+                    task = asyncio.create_task(self.run_job(
+                        job=job,
+                        access_tokens=pages[job["page_id"]],
                     ))
-                    tasks.append(task)
+                    task.add_done_callback(lambda _, job_id=job["id"]: running.pop(job_id, None))
+                    running[job["id"]] = task
+
+                if running:
+                    await asyncio.wait(
+                        list(running.values()),
+                        timeout=self.settings.job_queue_poll_interval,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                elif await self.job_queue.count_unfinished(page_ids=page_ids):
+                    await asyncio.sleep(self.settings.job_queue_poll_interval)
+                else:
+                    break
+        finally:
+            heartbeats_task.cancel()
+            for task in running.values():
+                task.cancel()
+            await asyncio.gather(heartbeats_task, *running.values(), return_exceptions=True)
+
+    async def send_heartbeats(self, running: Dict[int, asyncio.Task]):
+        while True:
+            await asyncio.sleep(self.settings.job_queue_lease / 3)
+            try:
+                await self.job_queue.heartbeat(job_ids=list(running))
+            except Exception:
+                logger.exception("Failed to prolong leases of jobs: job_ids={}", list(running))
+
+    async def run_job(self, job: Dict[str, Any], access_tokens: Sequence[str]):
+        """
+        Run job and finish it after its records are written
 
-        if tasks:
-            await asyncio.wait(tasks)
+        Job is returned to queue or failed if any of its tasks or writes of its records failed.
+        """
+        errors = []
+        job_errors.set(errors)
+        try:
+            await self.load_job(job=job, access_tokens=access_tokens)
+            # Errors of failed writes are appended to errors of job which put records
+            await asyncio.gather(*(writer.wait() for writer in list(self._writers.values())))
+        except Exception as exception:
+            logger.exception("Job failed: job_id={}", job["id"])
+            errors.append(exception)
+        await self.job_queue.finish(job=job, error=errors[0] if errors else None)
+
+    async def load_job(self, job: Dict[str, Any], access_tokens: Sequence[str]):
+        kind, page_id, target = JobKindEnum(job["kind"]), job["page_id"], job["target"]
+        if kind == JobKindEnum.page:
+            await self.load_page(page_id=page_id, access_tokens=access_tokens)
+        elif kind == JobKindEnum.posts:
+            watermarks = await self.get_watermarks(page_id=page_id)
+            await self.load_page_posts(
+                page_id=page_id,
+                access_tokens=access_tokens,
+                watermark=watermarks.get(self.POSTS_ENDPOINT),
+            )
+        elif kind == JobKindEnum.insights:
+            view_models = self._page_insight_groups_by_target[target]
+            watermarks = await self.get_watermarks(page_id=page_id)
+            await self.load_page_insights(
+                view_models=view_models,
+                page_id=page_id,
+                access_tokens=access_tokens,
+                watermark=self.get_insights_watermark(
+                    watermarks=watermarks,
+                    view_models=view_models,
+                ),
+            )
+        elif kind == JobKindEnum.post_attachments:
+            await self.load_page_post_attachments(
+                page_id=page_id,
+                post_id=target,
+                access_tokens=access_tokens,
+            )
+        elif kind == JobKindEnum.post_insights:
+            post_id, metrics = target.split(":", 1)
+            await self.load_page_post_insights(
+                view_models=self._page_post_insight_groups_by_target[metrics],
+                page_id=page_id,
+                post_id=post_id,
+                access_tokens=access_tokens,
+            )
 
-    @logger.catch()
-    async def load_page(self, page_id: str, access_token: str):
+    @logger.catch(onerror=collect_job_error)
+    async def load_page(self, page_id: str, access_tokens: Sequence[str]):
         data = await self.facebook_pages_service.get_page(
             page_id=page_id,
-            access_token=access_token,
+            access_token=self.facebook_pages_service.choose_access_token(access_tokens),
+            fields=self._mappings[Page].get_fields(),
         )
         logger.info("Downloaded page: page_id={}", page_id)
         logger.debug("Page payload: {}", data)
-        fields = {
-            "id": data["id"],
-            "name": data["name"],
-            "about": data.get("about"),
-            "affiliation": data.get("affiliation"),
-            "app_id": data.get("app_id"),
-            "artists_we_like": data.get("artists_we_like"),
-            "bio": data.get("bio"),
-            "birthday": data.get("birthday"),
-            "booking_agent": data.get("booking_agent"),
-            "built": data.get("built"),
-            "can_check_in": data.get("can_checkin"),
-            "can_post": data.get("can_post"),
-            "category": data.get("category"),
-            "category_list": data.get("category_list"),
-            "check_ins": data.get("checkins"),
-            "contact_address": data.get("contact_address"),
-            "current_location": data.get("current_location"),
-            "description": data.get("description"),
-            "directed_by": data.get("directed_by"),
-            "emails": data.get("emails"),
-            "hours": data.get("hours"),
-            "link": data.get("link"),
-            "location": data.get("location"),
-            "mission": data.get("mission"),
-            "username": data.get("username"),
-            "were_here_count": data.get("were_here_count"),
-            "whatsapp_number": data.get("whatsapp_number"),
-        }
+        await self.update_or_create_page(data=data)
 
-        page = await self.database_service.get_page(id=page_id)
-        if page:
-            await self.database_service.update_page(record=page, fields=fields)
-            logger.info("Updated page: page_id={}", page_id)
-        else:
-            await self.database_service.create_page(fields=fields)
-            logger.info("Created page: page_id={}", page_id)
+    @logger.catch(onerror=collect_job_error)
+    async def update_or_create_page(self, data: Dict[str, Any]):
+        fields = self._mappings[Page].extract(data)
+
+        await self.get_writer(Page).put(fields)
         logger.debug("Page fields: {}", fields)
 
-    @logger.catch()
-    async def load_page_posts(self, page_id: str, access_token: str):
-        generator = self.facebook_pages_service.get_page_published_posts(
+    @logger.catch(onerror=collect_job_error)
+    async def load_page_posts(
+            self,
+            page_id: str,
+            access_tokens: Sequence[str],
+            watermark: Optional[datetime.datetime] = None,
+            position: Optional[datetime.datetime] = None,
+    ):
+        """
+        Load published posts of page and save them
+
+        If watermark is defined, only posts created after it will be loaded. If position is
+        defined, only posts created before it will be loaded.
+        """
+        generator = self.facebook_pages_service.get_page_published_post_pages(
             page_id=page_id,
-            access_token=access_token,
+            access_token=self.facebook_pages_service.choose_access_token(access_tokens),
+            fields=self.get_page_post_fields(),
+            since=watermark,
+            until=position,
         )
 
-        tasks = []
-        async for page_post in generator:
-            logger.info("Downloaded page post: page_post_id={}", page_post["id"])
-            logger.debug("Page post payload: {}", page_post)
+        pool = TaskPool(size=self.settings.pipeline_max_tasks)
+        posts_tasks: Deque[Tuple[datetime.datetime, List[asyncio.Task]]] = deque()
+        last_created_time = None
+        try:
+            async for page_posts in generator:
+                posts = []
+                synchronized = False
+                for page_post in page_posts:
+                    created_time = self.to_utc_datetime(page_post["created_time"])
+                    if watermark is not None and created_time <= watermark:
+                        # Posts are sorted from newest, so all next posts are synchronized
+                        synchronized = True
+                        break
+                    if last_created_time is None or last_created_time < created_time:
+                        last_created_time = created_time
+                    posts.append((created_time, page_post))
 
-            _, post_id = page_post["id"].split("_")
+                    logger.info("Downloaded page post: page_post_id={}", page_post["id"])
+                    logger.debug("Page post payload: {}", page_post)
 
-            task = asyncio.create_task(self.update_or_create_page_post(data=page_post))
-            tasks.append(task)
+                await self.update_or_create_page_posts(posts=[post for _, post in posts])
+                for created_time, page_post in posts:
+                    tasks = await self.load_page_post(
+                        pool=pool,
+                        page_id=page_id,
+                        access_tokens=access_tokens,
+                        data=page_post,
+                    )
+                    posts_tasks.append((created_time, tasks))
+                    await self.checkpoint_page_posts(page_id=page_id, posts_tasks=posts_tasks)
+                if synchronized:
+                    await generator.aclose()
+                    break
 
-            if self.settings.load_page_post_attachments:
-                task = asyncio.create_task(self.load_page_post_attachments(
+            await pool.join()
+        except asyncio.CancelledError:
+            await pool.cancel()
+            raise
+
+        await self.checkpoint_page_posts(page_id=page_id, posts_tasks=posts_tasks)
+        if last_created_time is not None:
+            self.set_watermark(
+                page_id=page_id,
+                endpoint=self.POSTS_ENDPOINT,
+                watermark=last_created_time,
+            )
+
+    async def load_page_post(
+            self,
+            pool: TaskPool,
+            page_id: str,
+            access_tokens: Sequence[str],
+            data: Dict[str, Any],
+    ) -> List[asyncio.Task]:
+        """
+        Spawn loading of attachments and insights of saved page post in pool
+
+        Attachments and insights which were downloaded with post are saved without requests.
+        In job queue mode other ones are enqueued as jobs.
+        """
+        _, post_id = data["id"].split("_")
+        attachments = data.pop("attachments", None)
+        insights = data.pop("insights", None)
+
+        tasks = []
+        if self.settings.load_page_post_attachments:
+            if self.job_queue is not None and not self.is_complete_edge(attachments):
+                await self.get_writer(Job).put(JobQueue.make_job(
+                    kind=JobKindEnum.post_attachments,
                     page_id=page_id,
-                    post_id=post_id,
-                    access_token=access_token,
+                    target=post_id,
                 ))
-                tasks.append(task)
+            else:
+                tasks.append(await pool.spawn(self.load_page_post_attachments(
+                    page_id=page_id,
+                    post_id=post_id,
+                    access_tokens=access_tokens,
+                    attachments=(
+                        attachments["data"] if self.is_complete_edge(attachments) else None
+                    ),
+                )))
 
-            if self.settings.load_page_post_insights:
-                for view_model in self.PAGE_POST_INSIGHT_MODELS:
-                    task = asyncio.create_task(self.load_page_post_insights(
-                        view_model=view_model,
+        if self.settings.load_page_post_insights:
+            for view_models in self._page_post_insight_groups:
+                group_insights = None
+                if self.is_complete_edge(insights):
+                    metrics = {view_model.METRIC for view_model in view_models}
+                    group_insights = [
+                        insight
+                        for insight in insights["data"]
+                        if insight["name"] in metrics
+                    ]
+                    if len(group_insights) < len(metrics):
+                        group_insights = None
+                if self.job_queue is not None and group_insights is None:
+                    await self.get_writer(Job).put(JobQueue.make_job(
+                        kind=JobKindEnum.post_insights,
                         page_id=page_id,
-                        post_id=post_id,
-                        access_token=access_token,
+                        target=f"{post_id}:{self.get_insights_target(view_models)}",
                     ))
-                    tasks.append(task)
+                else:
+                    tasks.append(await pool.spawn(self.load_page_post_insights(
+                        view_models=view_models,
+                        page_id=page_id,
+                        post_id=post_id,
+                        access_tokens=access_tokens,
+                        insights=group_insights,
+                    )))
+        return tasks
 
-        if tasks:
-            await asyncio.wait(tasks)
+    async def checkpoint_page_posts(
+            self,
+            page_id: str,
+            posts_tasks: Deque[Tuple[datetime.datetime, List[asyncio.Task]]],
+    ):
+        """
+        Save position of the oldest post which is loaded together with all newer posts
+
+        Posts are removed from posts_tasks when all their tasks are done. Position isn't
+        saved after any task failed or in job queue mode, where jobs are checkpoints.
+        """
+        position = None
+        while posts_tasks and all(task.done() for task in posts_tasks[0][1]):
+            position, _ = posts_tasks.popleft()
+        if position is not None and self.job_queue is None and not job_errors.get():
+            await self.save_checkpoint(
+                page_id=page_id,
+                endpoint=self.POSTS_ENDPOINT,
+                position=position,
+            )
 
-    @logger.catch()
+    @logger.catch(onerror=collect_job_error)
     async def update_or_create_page_post(self, data: Dict[str, Any]):
-        id_ = data["id"]
-        page_id, post_id = id_.split("_")
-        fields = {
-            "id": id_,
-            "page_id": page_id,
-            "post_id": post_id,
-            "created_time": self.to_datetime(data["created_time"]),
-            "eligible_for_promotion": data.get("is_eligible_for_promotion"),
-            "expired": data.get("is_expired"),
-            "full_picture": data.get("full_picture"),
-            "hidden": data.get("is_hidden"),
-            "message": data.get("message"),
-            "popular": data.get("is_popular"),
-            "published": data.get("is_published"),
-            "privacy": data.get("privacy"),
-            "promotable_id": data.get("promotable_id"),
-            "shares_count": data.get("shares"),
-            "status_type": data.get("status_type"),
-            "story": data.get("story"),
-            "updated_time": data.get("updated_time"),
-        }
+        fields = self._mappings[PagePost].extract(data)
 
-        page_post = await self.database_service.get_page_post(id=id_)
-        if page_post:
-            await self.database_service.update_page_post(record=page_post, fields=fields)
-            logger.info("Updated page post: page_post_id={}", id_)
-        else:
-            await self.database_service.create_page_post(fields=fields)
-            logger.info("Created page post: page_post_id={}", id_)
+        await self.get_writer(PagePost).put(fields)
         logger.debug("Page post fields: {}", fields)
 
-    @logger.catch()
-    async def load_page_post_attachments(self, page_id: str, post_id: str, access_token: str):
-        generator = self.facebook_pages_service.get_page_post_attachments(
-            page_id=page_id,
-            post_id=post_id,
-            access_token=access_token,
-        )
+    @logger.catch(onerror=collect_job_error)
+    async def update_or_create_page_posts(self, posts: List[Dict[str, Any]]):
+        rows = self._mappings[PagePost].extract_many(posts)
 
-        tasks = []
-        async for page_post_attachment in generator:
-            logger.info("Downloaded page post attachment: page_id={}; post_id={}", page_id, post_id)
-            logger.debug("Page post attachment payload: {}", page_post_attachment)
+        await self.get_writer(PagePost).put_many(rows)
+        logger.debug("Page posts fields: {}", rows)
 
-            task = asyncio.create_task(self.update_or_create_page_post_attachment(
+    @logger.catch(onerror=collect_job_error)
+    async def load_page_post_attachments(
+            self,
+            page_id: str,
+            post_id: str,
+            access_tokens: Sequence[str],
+            attachments: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """
+        Load attachments of page post and save them
+
+        If attachments were already downloaded with page post, they will be saved without
+        request to Graph API.
+        """
+        if attachments is None:
+            generator = self.facebook_pages_service.get_page_post_attachment_pages(
                 page_id=page_id,
                 post_id=post_id,
-                data=page_post_attachment,
-            ))
-            tasks.append(task)
+                access_token=self.facebook_pages_service.choose_access_token(access_tokens),
+                fields=self._mappings[PagePostAttachment].get_fields(),
+            )
+        else:
+            generator = iterate([attachments])
 
-        if tasks:
-            await asyncio.wait(tasks)
+        position = 0
+        async for page_post_attachments in generator:
+            for page_post_attachment in page_post_attachments:
+                logger.info(
+                    "Downloaded page post attachment: page_id={}; post_id={}",
+                    page_id,
+                    post_id,
+                )
+                logger.debug("Page post attachment payload: {}", page_post_attachment)
+
+            await self.update_or_create_page_post_attachments(
+                page_id=page_id,
+                post_id=post_id,
+                position=position,
+                attachments=page_post_attachments,
+            )
+            position += len(page_post_attachments)
 
-    @logger.catch()
-    async def update_or_create_page_post_attachment(
+    @logger.catch(onerror=collect_job_error)
+    async def update_or_create_page_post_attachments(
             self,
             page_id: str,
             post_id: str,
-            data: Dict[str, Any],
+            position: int,
+            attachments: List[Dict[str, Any]],
     ):
-        fields = {
-            "page_id": page_id,
-            "post_id": post_id,
-            "type": data["type"],
-            "url": data.get("url"),
-            "description": data.get("description"),
-            "title": data.get("title"),
-            "target": data.get("target"),
-        }
-        page_post_attachment = await self.database_service.get_page_post_attachment(**fields)
-        if page_post_attachment:
-            await self.database_service.update_page_post_attachment(
-                record=page_post_attachment,
-                fields=fields,
-            )
-            logger.info("Updated page post attachment: page_id={}; post_id={}", page_id, post_id)
-            logger.debug("Page post attachment fields: {}", fields)
+        """
+        Save attachments of one Graph API page, position is position of the first of them
+        """
+        rows = self._mappings[PagePostAttachment].extract_many(attachments)
+        for number, fields in enumerate(rows, start=position):
+            fields.update(page_id=page_id, post_id=post_id, position=number)
 
-    @logger.catch()
+        await self.get_writer(PagePostAttachment).put_many(rows)
+        logger.debug("Page post attachments fields: {}", rows)
+
+    @logger.catch(onerror=collect_job_error)
     async def load_page_post_insights(
             self,
-            view_model: Type[PagePostInsightAbstractModel],
+            view_models: Sequence[Type[PagePostInsightAbstractModel]],
             page_id: str,
             post_id: str,
-            access_token: str,
+            access_tokens: Sequence[str],
+            insights: Optional[List[Dict[str, Any]]] = None,
     ):
-        since = datetime.datetime.now()
-        since -= self.TIMEDELTA_MAPPING[self.settings.fb_pages_insights_for.value]
-        generator = self.facebook_pages_service.get_insights(
-            object_id=f"{page_id}_{post_id}",
-            access_token=access_token,
-            since=since,
-            metrics=[view_model.METRIC],
-            period=view_model.PERIOD.value,
-        )
+        """
+        Load insights of page post and save them
+
+        If insights were already downloaded with page post, they will be saved without
+        request to Graph API.
+        """
+        view_models_by_metric = {view_model.METRIC: view_model for view_model in view_models}
+        if insights is None:
+            since = datetime.datetime.now()
+            since -= self.TIMEDELTA_MAPPING[self.settings.fb_pages_insights_for.value]
+            generator = self.facebook_pages_service.get_insights(
+                object_id=f"{page_id}_{post_id}",
+                access_token=self.facebook_pages_service.choose_access_token(access_tokens),
+                since=since,
+                metrics=view_models_by_metric.keys(),
+                period=view_models[0].PERIOD.value,
+            )
+        else:
+            generator = iterate(insights)
 
-        tasks = []
         async for page_post_insight in generator:
+            view_model = view_models_by_metric.get(page_post_insight["name"])
+            if view_model is None:
+                logger.warning(
+                    "Got unexpected page post insight: page_id={}; post_id={}; metric={}",
+                    page_id,
+                    post_id,
+                    page_post_insight["name"],
+                )
+                continue
+
             logger.info(
                 "Downloaded page post insight: page_id={}; post_id={}; metric={}; "
                 "page_insight_id={}",
@@ -384,18 +1163,14 @@ class MainService(ServiceMixin):
             )
             logger.debug("Page post insight payload: {}", page_post_insight)
 
-            task = asyncio.create_task(self.update_or_create_page_post_insight(
+            await self.update_or_create_page_post_insight(
                 view_model=view_model,
                 page_id=page_id,
                 post_id=post_id,
                 data=page_post_insight,
-            ))
-            tasks.append(task)
-
-        if tasks:
-            await asyncio.wait(tasks)
+            )
 
-    @logger.catch()
+    @logger.catch(onerror=collect_job_error)
     async def update_or_create_page_post_insight(
             self,
             view_model: Type[PagePostInsightAbstractModel],
@@ -403,55 +1178,176 @@ class MainService(ServiceMixin):
             post_id: str,
             data: Dict[str, Any],
     ):
-        get_function = self.database_service.generate_get_function(view_model)
-        create_function = self.database_service.generate_create_function(view_model)
-        update_function = self.database_service.generate_update_function(view_model)
+        if self.insights_store is not None:
+            rows = self.insights_store.make_page_post_insight_rows(
+                view_model=view_model,
+                page_id=page_id,
+                post_id=post_id,
+                data=data,
+            )
+            await self.get_writer(view_model).put_many(rows)
+            logger.debug("Page post insight rows: {}", rows)
+            return
 
-        for value in data["values"]:
-            fields = {
+        rows = [
+            {
                 "m_period": data["period"],
                 "page_id": page_id,
                 "post_id": post_id,
                 **view_model.parse_value(value["value"]),
             }
-            record = await get_function(page_id=page_id, post_id=post_id)
-            if record is None:
-                await create_function(fields=fields)
-                logger.info(
-                    "Created page post insight: page_id={}; post_id={}; metric={}",
-                    page_id,
-                    post_id,
-                    view_model.METRIC,
+            for value in data["values"]
+        ]
+        await self.get_writer(view_model).put_many(rows)
+        logger.debug("Page post insight rows: {}", rows)
+
+    def get_insights_since(self) -> datetime.date:
+        if self.settings.fb_pages_insights_since is not None:
+            return self.settings.fb_pages_insights_since
+        since = datetime.datetime.now(tz=datetime.timezone.utc)
+        since -= self.TIMEDELTA_MAPPING[self.settings.fb_pages_insights_for.value]
+        return since.date()
+
+    async def get_page_insight_dates(
+            self,
+            view_models: Sequence[Type[PageInsightAbstractModel]],
+            page_id: str,
+            since: datetime.date,
+    ) -> Set[datetime.date]:
+        """
+        Get end dates which are stored for every metric of group
+        """
+        dates = None
+        for view_model in view_models:
+            if self.insights_store is not None:
+                model_dates = await self.insights_store.get_dates(
+                    view_model=view_model,
+                    object_id=page_id,
+                    since=since,
                 )
             else:
-                await update_function(record=record, fields=fields)
-                logger.info(
-                    "Updated page post insight: page_id={}; post_id={}; metric={}",
-                    page_id,
-                    post_id,
-                    view_model.METRIC,
+                model_dates = await self.database_service.get_page_insight_dates(
+                    model=view_model,
+                    page_id=page_id,
+                    since=since,
                 )
-            logger.debug("Page post insight fields: {}", fields)
+            dates = model_dates if dates is None else dates & model_dates
+        return dates or set()
 
-    @logger.catch()
+    async def plan_page_insights(
+            self,
+            view_models: Sequence[Type[PageInsightAbstractModel]],
+            page_id: str,
+            watermark: Optional[datetime.datetime] = None,
+    ) -> List[Tuple[datetime.date, datetime.date]]:
+        """
+        Get since and until windows of requests which load missing and stale insight values
+
+        With watermark all values since it are loaded. Otherwise values which are already
+        stored are skipped, except values of last fb_pages_insights_stale_days days which
+        still can change.
+        """
+        today = datetime.datetime.now(tz=datetime.timezone.utc).date()
+        if watermark is not None:
+            ranges = [(watermark.date(), today)]
+        else:
+            since = self.get_insights_since()
+            stale_days = datetime.timedelta(days=self.settings.fb_pages_insights_stale_days)
+            stale_since = today - stale_days
+            dates = await self.get_page_insight_dates(
+                view_models=view_models,
+                page_id=page_id,
+                since=since,
+            )
+            covered = {date for date in dates if date < stale_since}
+            ranges = get_missing_ranges(covered=covered, since=since, until=today)
+        return get_windows(ranges)
+
+    @logger.catch(onerror=collect_job_error)
     async def load_page_insights(
             self,
-            view_model: Type[PageInsightAbstractModel],
+            view_models: Sequence[Type[PageInsightAbstractModel]],
             page_id: str,
-            access_token: str,
+            access_tokens: Sequence[str],
+            watermark: Optional[datetime.datetime] = None,
     ):
-        since = datetime.datetime.now()
-        since -= self.TIMEDELTA_MAPPING[self.settings.fb_pages_insights_for.value]
+        """
+        Load insights of page and save them
+
+        If watermark is defined, only values from it till now will be loaded, otherwise
+        values for fb_pages_insights_for period (or since fb_pages_insights_since) which are
+        missing in database. Values are loaded by windows of at most 90 days in parallel.
+        """
+        windows = await self.plan_page_insights(
+            view_models=view_models,
+            page_id=page_id,
+            watermark=watermark,
+        )
+        logger.info(
+            "Planned page insights: page_id={}; metric={}; windows={}",
+            page_id,
+            self.get_insights_target(view_models),
+            len(windows),
+        )
+
+        last_end_times = {}
+        results = await asyncio.gather(*(
+            self.load_page_insights_window(
+                view_models=view_models,
+                page_id=page_id,
+                access_tokens=access_tokens,
+                since=since,
+                until=until,
+                last_end_times=last_end_times,
+            )
+            for since, until in windows
+        ))
+        # Watermarks are moved only if all windows are loaded, so failed ones are retried
+        if not all(results):
+            return
+
+        for metric, end_time in last_end_times.items():
+            self.set_watermark(
+                page_id=page_id,
+                endpoint=self.INSIGHTS_ENDPOINT.format(metric=metric),
+                watermark=end_time,
+            )
+
+    @logger.catch(onerror=collect_job_error)
+    async def load_page_insights_window(
+            self,
+            view_models: Sequence[Type[PageInsightAbstractModel]],
+            page_id: str,
+            access_tokens: Sequence[str],
+            since: datetime.date,
+            until: datetime.date,
+            last_end_times: Dict[str, datetime.datetime],
+    ) -> bool:
+        """
+        Load insights of page for window, remember last end times of metrics
+
+        Return True if window is loaded without errors.
+        """
+        view_models_by_metric = {view_model.METRIC: view_model for view_model in view_models}
         generator = self.facebook_pages_service.get_insights(
             object_id=page_id,
-            access_token=access_token,
+            access_token=self.facebook_pages_service.choose_access_token(access_tokens),
             since=since,
-            metrics=[view_model.METRIC],
-            period=view_model.PERIOD.value,
+            until=until,
+            metrics=view_models_by_metric.keys(),
+            period=view_models[0].PERIOD.value,
         )
 
-        tasks = []
         async for page_insight in generator:
+            view_model = view_models_by_metric.get(page_insight["name"])
+            if view_model is None:
+                logger.warning(
+                    "Got unexpected page insight: page_id={}; metric={}",
+                    page_id,
+                    page_insight["name"],
+                )
+                continue
+
             logger.info(
                 "Downloaded page insight: page_id={}; metric={}; page_insight_id={}",
                 page_id,
@@ -460,49 +1356,34 @@ class MainService(ServiceMixin):
             )
             logger.debug("Page insight payload: {}", page_insight)
 
-            task = asyncio.create_task(self.update_or_create_page_insight(
+            await self.update_or_create_page_insight(
                 view_model=view_model,
                 page_id=page_id,
                 data=page_insight,
-            ))
-            tasks.append(task)
-
-        if tasks:
-            await asyncio.wait(tasks)
+            )
+            for value in page_insight["values"]:
+                end_time = self.to_utc_datetime(value["end_time"])
+                if last_end_times.get(view_model.METRIC, end_time) <= end_time:
+                    last_end_times[view_model.METRIC] = end_time
+        return True
 
-    @logger.catch()
+    @logger.catch(onerror=collect_job_error)
     async def update_or_create_page_insight(
             self,
             view_model: Type[PageInsightAbstractModel],
             page_id: str,
             data: Dict[str, Any],
     ):
-        get_function = self.database_service.generate_get_function(view_model)
-        create_function = self.database_service.generate_create_function(view_model)
-        update_function = self.database_service.generate_update_function(view_model)
+        if self.insights_store is not None:
+            rows = self.insights_store.make_page_insight_rows(
+                view_model=view_model,
+                page_id=page_id,
+                data=data,
+            )
+            await self.get_writer(view_model).put_many(rows)
+            logger.debug("Page insight values: count={}", len(rows))
+            return
 
-        for value in data["values"]:
-            fields = {
-                "m_period": data["period"],
-                "m_date": value["end_time"],
-                "page_id": page_id,
-                **view_model.parse_value(value["value"]),
-            }
-            record = await get_function(m_date=fields["m_date"], page_id=page_id)
-            if record is None:
-                await create_function(fields=fields)
-                logger.info(
-                    "Created page insight: page_id={}; metric={}; date={}",
-                    page_id,
-                    view_model.METRIC,
-                    value["end_time"],
-                )
-            else:
-                await update_function(record=record, fields=fields)
-                logger.info(
-                    "Updated page insight: page_id={}; metric={}; date={}",
-                    page_id,
-                    view_model.METRIC,
-                    value["end_time"],
-                )
-            logger.debug("Page insight fields: {}", fields)
+        batch = PageInsightBatch.from_insight(page_id=page_id, data=data)
+        await self.get_writer(view_model).put(batch)
+        logger.debug("Page insight values: count={}", len(batch))
@@ -0,0 +1,65 @@
+from typing import Dict, Optional
+
+from loguru import logger
+
+
+class PageSizeTuner:
+    """
+    Adaptive limit of items per page of paged Graph API endpoints
+
+    Every endpoint starts with max_limit items per page. Limit is halved when Graph API asks
+    to reduce the amount of data or page is loaded longer than slow_time seconds, and grows
+    by half when page is loaded faster than quarter of slow_time, but not above limit which
+    was set after Graph API refused bigger one. So deep listings need few requests, but
+    responses stay in limits of size and time of Graph API.
+    """
+
+    def __init__(self, max_limit: int = 100, min_limit: int = 5, slow_time: float = 5):
+        self._max_limit = max_limit
+        self._min_limit = min(min_limit, max_limit)
+        self._slow_time = slow_time
+        self._limits: Dict[str, int] = {}
+        self._ceilings: Dict[str, int] = {}
+
+    def get(self, endpoint: str) -> int:
+        return self._limits.get(endpoint, self._max_limit)
+
+    def shrink(self, endpoint: str, limit: Optional[int] = None, refused: bool = False) -> bool:
+        """
+        Halve limit of endpoint after request with limit, return False if it is minimal
+
+        Limit isn't halved again if it was already reduced after other request. If limit was
+        refused by Graph API, limit doesn't grow above reduced one anymore.
+        """
+        current = self.get(endpoint)
+        limit = current if limit is None else limit
+        if current < limit:
+            return True
+        if current <= self._min_limit:
+            return False
+        self._limits[endpoint] = max(current // 2, self._min_limit)
+        if refused:
+            self._ceilings[endpoint] = self._limits[endpoint]
+        logger.info(
+            "Page size is reduced: endpoint={}; limit={}",
+            endpoint,
+            self._limits[endpoint],
+        )
+        return True
+
+    def update(self, endpoint: str, limit: int, duration: float):
+        """
+        Adapt limit of endpoint to duration of loading page with limit in seconds
+        """
+        if duration > self._slow_time:
+            self.shrink(endpoint, limit)
+            return
+        current = self.get(endpoint)
+        ceiling = min(self._ceilings.get(endpoint, self._max_limit), self._max_limit)
+        if duration < self._slow_time / 4 and current == limit and current < ceiling:
+            self._limits[endpoint] = min(current + max(current // 2, 1), ceiling)
+            logger.debug(
+                "Page size is increased: endpoint={}; limit={}",
+                endpoint,
+                self._limits[endpoint],
+            )
@@ -0,0 +1,196 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Coroutine, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+
+class WriteError(Exception):
+    """
+    Records which were put to buffered writer are not written
+    """
+
+
+class BufferedWriter:
+    """
+    Write-behind buffer between downloading and saving records of one model
+
+    Records are put to bounded queue and written by batches: when batch_size records are
+    collected or flush_interval seconds passed after first record of batch. If queue is
+    full, put waits, so producers are slowed down to speed of database.
+
+    Records are counted when they are put and when they are written, so flush waits only
+    for records which were put before it, not for records which are put while it waits.
+
+    Record can hold several rows, then get_size returns number of rows in it and batch is
+    collected by number of rows.
+
+    Records of failed batches are counted as written too, but flush and stop raise WriteError
+    after them. If get_errors is defined, it's called when record is put and error of its batch
+    is appended to returned list, so producer of record knows that it's not saved.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            write: Callable[[List[Any]], Awaitable],
+            queue_size: int = 10000,
+            batch_size: int = 1000,
+            flush_interval: float = 1,
+            get_size: Optional[Callable[[Any], int]] = None,
+            get_errors: Optional[Callable[[], Optional[List[BaseException]]]] = None,
+    ):
+        self._name = name
+        self._write = write
+        self._get_size = get_size
+        self._get_errors = get_errors
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+        self._put_count = 0
+        self._written_count = 0
+        self._written = asyncio.Condition()
+        # Positions of records of failed batches: (start, end, exception)
+        self._failures: List[Tuple[int, int, BaseException]] = []
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Write all records and stop, raise WriteError if any record wasn't written
+        """
+        if self._task is not None:
+            try:
+                await self.flush()
+            finally:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+                self._task = None
+
+    @property
+    def position(self) -> int:
+        """
+        Number of records which were put, it can be passed to flush as since
+        """
+        return self._put_count
+
+    async def put(self, record: Any):
+        errors = None if self._get_errors is None else self._get_errors()
+        await self._queue.put((record, errors))
+        self._put_count += 1
+
+    async def put_many(self, records: Iterable[Any]):
+        for record in records:
+            await self.put(record)
+
+    async def wait(self) -> int:
+        """
+        Wait until all records which were put before are written or failed, return their count
+        """
+        put_count = self._put_count
+        async with self._written:
+            await self._written.wait_for(lambda: self._written_count >= put_count)
+        return put_count
+
+    async def flush(self, since: int = 0):
+        """
+        Wait until all records which were put before are written
+
+        WriteError is raised if any of them, starting from position since, wasn't written.
+        """
+        put_count = await self.wait()
+        for start, end, exception in self._failures:
+            if start < put_count and end > since:
+                raise WriteError(
+                    f"Records of {self._name} are not written: {exception!r}",
+                ) from exception
+
+    def get_size(self, record: Any) -> int:
+        return 1 if self._get_size is None else self._get_size(record)
+
+    async def _get_batch(self) -> Tuple[List[Tuple[Any, Any]], int]:
+        loop = asyncio.get_event_loop()
+        batch = [await self._queue.get()]
+        size = self.get_size(batch[0][0])
+        deadline = loop.time() + self._flush_interval
+        while size < self._batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                size += self.get_size(batch[-1][0])
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+            size += self.get_size(batch[-1][0])
+        return batch, size
+
+    async def _run(self):
+        while True:
+            batch, size = await self._get_batch()
+            try:
+                await self._write([record for record, _ in batch])
+            except Exception as exception:
+                logger.exception("Failed to save records: name={}; count={}", self._name, size)
+                start = self._written_count
+                self._failures.append((start, start + len(batch), exception))
+                producers_errors = {id(errors): errors for _, errors in batch if errors is not None}
+                for errors in producers_errors.values():
+                    errors.append(exception)
+            else:
+                logger.info("Saved records: name={}; count={}", self._name, size)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                async with self._written:
+                    self._written_count += len(batch)
+                    self._written.notify_all()
+
+
+class TaskPool:
+    """
+    Set of running tasks with limited size
+
+    If pool is full, spawn waits until any task is done.
+    """
+
+    def __init__(self, size: int):
+        self._semaphore = asyncio.Semaphore(size)
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def spawn(self, coroutine: Coroutine) -> asyncio.Task:
+        try:
+            await self._semaphore.acquire()
+        except asyncio.CancelledError:
+            coroutine.close()
+            raise
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._semaphore.release()
+
+    async def join(self):
+        """
+        Wait until all tasks are done, if waiting is cancelled, tasks are cancelled too
+        """
+        try:
+            while self._tasks:
+                await asyncio.wait(set(self._tasks))
+        except asyncio.CancelledError:
+            await self.cancel()
+            raise
+
+    async def cancel(self):
+        tasks = set(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import multiprocessing
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from loguru import logger
+
+
+class UsageBudget:
+    """
+    Usage of one Graph API rate limit and number of requests running against it
+    """
+
+    def __init__(self, name: Tuple[str, str], limit: int):
+        self.name = name
+        self.usage = 0.0
+        self.resume_at = 0.0
+        self.limit = limit
+        self.active = 0
+
+
+class SharedUsage:
+    """
+    App rate limit usage shared between worker processes
+
+    Graph API counts app usage for all processes together, so workers publish usage and
+    pause of app budget to shared memory and take ones published by other workers.
+    Values are usage, wall time of update and wall time when requests can be resumed.
+    """
+
+    def __init__(self):
+        self._values = multiprocessing.get_context("spawn").Array("d", 3)
+
+    def get(self) -> Tuple[float, float, float]:
+        with self._values.get_lock():
+            return tuple(self._values)
+
+    def set(self, usage: float, resume_at: float):
+        with self._values.get_lock():
+            self._values[0] = usage
+            self._values[1] = time.time()
+            self._values[2] = max(self._values[2], resume_at)
+
+
+class RequestScheduler:
+    """
+    Scheduler of Graph API requests which adapts concurrency to rate limits usage
+
+    Graph API reports usage of rate limits in percents in X-App-Usage, X-Page-Usage and
+    X-Business-Use-Case-Usage headers. Scheduler keeps separate budget for app, every page
+    and every access token. While usage of budget is below low_usage, requests run with
+    max_concurrency; between low_usage and high_usage concurrency goes down to
+    min_concurrency, and above high_usage every request is delayed up to max_delay. If Graph
+    API answers with throttling error, budget is paused for estimated time to regain access
+    or for pause seconds. Request takes place in all its budgets at once, so it doesn't hold
+    place in app budget while budget of its page is full.
+
+    If shared usage is defined, app budget is synchronized with other processes through it.
+    """
+
+    APP_THROTTLING_ERROR_CODES = {4}
+    PAGE_THROTTLING_ERROR_CODES = {32, 80001}
+    TOKEN_THROTTLING_ERROR_CODES = {17, 613}
+    THROTTLING_ERROR_CODES = (
+        APP_THROTTLING_ERROR_CODES
+        | PAGE_THROTTLING_ERROR_CODES
+        | TOKEN_THROTTLING_ERROR_CODES
+    )
+
+    def __init__(
+            self,
+            max_concurrency: int = 100,
+            min_concurrency: int = 1,
+            low_usage: float = 50,
+            high_usage: float = 90,
+            max_delay: float = 10,
+            pause: float = 300,
+            shared_usage: Optional[SharedUsage] = None,
+    ):
+        self._max_concurrency = max(max_concurrency, 1)
+        self._min_concurrency = max(min(min_concurrency, self._max_concurrency), 1)
+        self._low_usage = low_usage
+        self._high_usage = max(high_usage, low_usage)
+        self._max_delay = max_delay
+        self._pause = pause
+        self._budgets: Dict[Tuple[str, str], UsageBudget] = {}
+        self._rotation = 0
+        self._shared_usage = shared_usage
+        self._shared_updated_at = 0.0
+        # One condition for all budgets, request waits until it fits into all of them
+        self._condition = asyncio.Condition()
+
+    def get_budget(self, kind: str, key: str = "") -> UsageBudget:
+        name = (kind, key)
+        budget = self._budgets.get(name)
+        if budget is None:
+            budget = UsageBudget(name=name, limit=self._max_concurrency)
+            self._budgets[name] = budget
+        return budget
+
+    def get_budgets(self, access_token: str, page_id: Optional[str]) -> List[UsageBudget]:
+        budgets = [self.get_budget("app"), self.get_budget("token", access_token)]
+        if page_id is not None:
+            budgets.append(self.get_budget("page", page_id))
+        return budgets
+
+    def choose_access_token(self, access_tokens: Sequence[str]) -> str:
+        """
+        Choose access token with the lowest usage from tokens which can be used for request
+
+        Paused tokens are chosen last, tokens with equal usage are used in turn.
+        """
+        if len(access_tokens) == 1:
+            return access_tokens[0]
+
+        now = asyncio.get_event_loop().time()
+        self._rotation = (self._rotation + 1) % len(access_tokens)
+        rotated = [*access_tokens[self._rotation:], *access_tokens[:self._rotation]]
+
+        def get_key(access_token: str) -> Tuple[bool, float, int]:
+            budget = self._budgets.get(("token", access_token))
+            if budget is None:
+                return False, 0, 0
+            return budget.resume_at > now, budget.usage, budget.active
+
+        return min(rotated, key=get_key)
+
+    def get_limit(self, usage: float) -> int:
+        if usage <= self._low_usage:
+            return self._max_concurrency
+        if usage >= self._high_usage:
+            return self._min_concurrency
+        share = (self._high_usage - usage) / (self._high_usage - self._low_usage)
+        concurrency_range = self._max_concurrency - self._min_concurrency
+        return round(self._min_concurrency + concurrency_range * share)
+
+    def get_delay(self, usage: float) -> float:
+        if usage <= self._high_usage:
+            return 0
+        if self._high_usage >= 100:
+            # Graph API can report usage above 100 percents
+            return self._max_delay
+        return self._max_delay * min((usage - self._high_usage) / (100 - self._high_usage), 1)
+
+    @asynccontextmanager
+    async def slot(
+            self,
+            access_token: str,
+            page_id: Optional[str] = None,
+    ) -> AsyncGenerator[None, None]:
+        """
+        Wait until request can be made within all budgets and hold its place while it runs
+        """
+        loop = asyncio.get_event_loop()
+        budgets = self.get_budgets(access_token=access_token, page_id=page_id)
+        await self.pull_shared_usage()
+
+        while True:
+            pause = max(budget.resume_at for budget in budgets) - loop.time()
+            if pause <= 0:
+                break
+            logger.warning(
+                "Requests are paused by rate limits: budgets={}; seconds={:.1f}",
+                [budget.name[0] for budget in budgets if budget.resume_at > loop.time()],
+                pause,
+            )
+            await asyncio.sleep(pause)
+        delay = self.get_delay(max(budget.usage for budget in budgets))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: all(budget.active < budget.limit for budget in budgets),
+            )
+            for budget in budgets:
+                budget.active += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                for budget in budgets:
+                    budget.active -= 1
+                # Waiters of different budgets wait on the same condition
+                self._condition.notify_all()
+
+    async def set_usage(self, budget: UsageBudget, usage: float, regain_minutes: float = 0):
+        loop = asyncio.get_event_loop()
+        async with self._condition:
+            budget.usage = usage
+            budget.limit = self.get_limit(usage)
+            if regain_minutes:
+                budget.resume_at = max(budget.resume_at, loop.time() + regain_minutes * 60)
+            self._condition.notify_all()
+
+        if self._shared_usage is not None and budget.name == ("app", ""):
+            self._shared_usage.set(
+                usage=usage,
+                resume_at=budget.resume_at - loop.time() + time.time(),
+            )
+
+    async def pull_shared_usage(self):
+        """
+        Update app budget with usage published by other processes after last pull
+        """
+        if self._shared_usage is None:
+            return
+
+        usage, updated_at, resume_at = self._shared_usage.get()
+        if updated_at <= self._shared_updated_at:
+            return
+        self._shared_updated_at = updated_at
+
+        budget = self.get_budget("app")
+        async with self._condition:
+            budget.usage = usage
+            budget.limit = self.get_limit(usage)
+            budget.resume_at = max(
+                budget.resume_at,
+                resume_at - time.time() + asyncio.get_event_loop().time(),
+            )
+            self._condition.notify_all()
+
+    async def update(
+            self,
+            access_token: str,
+            page_id: Optional[str],
+            headers: Mapping[str, str],
+    ):
+        """
+        Update budgets with usage from Graph API response headers
+        """
+        usages = {}
+        app_usage = parse_usage_header(headers.get("X-App-Usage"))
+        if app_usage is not None:
+            usages[("app", "")] = app_usage
+        page_usage = parse_usage_header(headers.get("X-Page-Usage"))
+        if page_usage is not None and page_id is not None:
+            usages[("page", page_id)] = page_usage
+        for object_id, usage in parse_business_use_case_header(
+                headers.get("X-Business-Use-Case-Usage"),
+        ).items():
+            usages[("page", object_id)] = max(usage, usages.get(("page", object_id), usage))
+        if not usages:
+            return
+        token_usage = max(usages.values(), key=lambda usage: usage[0])
+        usages[("token", access_token)] = token_usage
+
+        for (kind, key), (usage, regain_minutes) in usages.items():
+            await self.set_usage(
+                budget=self.get_budget(kind, key),
+                usage=usage,
+                regain_minutes=regain_minutes,
+            )
+        logger.debug("Rate limits usage: {}", usages)
+
+    async def throttle(self, access_token: str, page_id: Optional[str], code: int):
+        """
+        Pause budget which Graph API reported as exhausted with throttling error code
+        """
+        if code in self.APP_THROTTLING_ERROR_CODES:
+            budget = self.get_budget("app")
+        elif code in self.PAGE_THROTTLING_ERROR_CODES and page_id is not None:
+            budget = self.get_budget("page", page_id)
+        elif code in self.THROTTLING_ERROR_CODES:
+            budget = self.get_budget("token", access_token)
+        else:
+            return
+
+        if budget.resume_at <= asyncio.get_event_loop().time():
+            logger.warning("Rate limit reached: budget={}; code={}", budget.name[0], code)
+            await self.set_usage(
+                budget=budget,
+                usage=self._high_usage,
+                regain_minutes=self._pause / 60,
+            )
+
+
+def parse_usage(usage: Mapping[str, Any]) -> Tuple[float, float]:
+    """
+    Get max usage in percents and estimated minutes to regain access from usage object
+    """
+    percents = (
+        usage.get("call_count", 0),
+        usage.get("total_cputime", 0),
+        usage.get("total_time", 0),
+    )
+    return float(max(percents)), float(usage.get("estimated_time_to_regain_access", 0))
+
+
+def parse_usage_header(header: Optional[str]) -> Optional[Tuple[float, float]]:
+    if not header:
+        return None
+    try:
+        return parse_usage(json.loads(header))
+    except (AttributeError, TypeError, ValueError):
+        logger.warning("Can't parse rate limit usage header: {}", header)
+        return None
+
+
+def parse_business_use_case_header(header: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    if not header:
+        return {}
+    try:
+        return {
+            object_id: max(parse_usage(usage) for usage in usages)
+            for object_id, usages in json.loads(header).items()
+            if usages
+        }
+    except (AttributeError, TypeError, ValueError):
+        logger.warning("Can't parse rate limit usage header: {}", header)
+        return {}
@@ -0,0 +1,167 @@
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from facet import ServiceMixin
+from loguru import logger
+
+from .main import MainService
+from .rate_limit import SharedUsage
+from ..settings import Settings
+
+
+_shared_usage: Optional[SharedUsage] = None
+
+
+class HashRing:
+    """
+    Consistent hashing ring of nodes
+
+    Every node is placed on ring replicas times, so keys are spread evenly and only keys
+    of added or removed node change their node.
+    """
+
+    def __init__(self, nodes: Iterable[int], replicas: int = 100):
+        self._ring = sorted(
+            (self.hash(f"{node}:{replica}"), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+        self._hashes = [hash_ for hash_, _ in self._ring]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def get_node(self, key: str) -> int:
+        index = bisect.bisect(self._hashes, self.hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+def shard_pages(pages: Dict[str, List[str]], workers: int) -> List[Dict[str, List[str]]]:
+    ring = HashRing(nodes=range(workers))
+    shards = [{} for _ in range(workers)]
+    for page_id, access_tokens in pages.items():
+        shards[ring.get_node(page_id)][page_id] = access_tokens
+    return shards
+
+
+def init_worker(shared_usage: SharedUsage):
+    global _shared_usage
+    _shared_usage = shared_usage
+
+
+def run_worker(
+        settings: Settings,
+        pages: Dict[str, List[str]],
+        resume: bool = False,
+) -> Dict[str, int]:
+    """
+    Load shard of pages in worker process and return saved records count by tables
+
+    On SIGTERM worker stops gracefully like main process and returns its summary.
+    """
+    async def run() -> Dict[str, int]:
+        main_service = MainService(
+            settings=settings,
+            pages=pages,
+            shared_usage=_shared_usage,
+            resume=resume,
+        )
+        asyncio.get_event_loop().add_signal_handler(
+            signal.SIGTERM,
+            asyncio.current_task().cancel,
+        )
+        try:
+            async with main_service:
+                pass
+        except asyncio.CancelledError:
+            logger.warning("Worker stopped by SIGTERM.")
+        return main_service.summary
+
+    return asyncio.run(run())
+
+
+class WorkersService(ServiceMixin):
+    """
+    Service for loading data in several worker processes
+
+    Pages are discovered once in main process and split between workers with consistent
+    hashing by page id. Every worker runs its own MainService with own Graph API session
+    and database connections; connections limit is divided between workers and app rate
+    limit usage is shared through SharedUsage. Summaries of workers are merged.
+
+    If service is cancelled, SIGTERM is sent to workers, so they stop gracefully.
+    """
+
+    def __init__(self, settings: Settings, workers: int, resume: bool = False):
+        self.settings = settings
+        self.workers = workers
+        self.resume = resume
+        self.summary: Dict[str, int] = {}
+        self._main_service = MainService(settings=settings)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def get_worker_settings(self) -> Settings:
+        return self.settings.copy(update={
+            "fb_pages_connections_limit": max(
+                self.settings.fb_pages_connections_limit // self.workers,
+                1,
+            ),
+            "pipeline_max_tasks": max(self.settings.pipeline_max_tasks // self.workers, 1),
+        })
+
+    async def start(self):
+        logger.info("Workers service started: workers={}", self.workers)
+        async with self._main_service.facebook_pages_service:
+            pages = await self._main_service.discover_pages()
+
+        context = multiprocessing.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(SharedUsage(),),
+        )
+        loop = asyncio.get_event_loop()
+        settings = self.get_worker_settings()
+        futures = [
+            loop.run_in_executor(self._executor, run_worker, settings, shard, self.resume)
+            for shard in shard_pages(pages=pages, workers=self.workers)
+            if shard
+        ]
+        try:
+            # Shield keeps futures of workers, so their summaries can be got after SIGTERM
+            summaries = await asyncio.shield(asyncio.gather(*futures))
+        except asyncio.CancelledError:
+            for process in multiprocessing.active_children():
+                process.terminate()
+            await asyncio.wait(futures)
+            self.merge_summaries([
+                future.result()
+                for future in futures
+                if not future.cancelled() and future.exception() is None
+            ])
+            raise
+        self.merge_summaries(summaries)
+        logger.info(
+            "Workers finished: pages={}; records={}; summary={}",
+            len(pages),
+            sum(self.summary.values()),
+            self.summary,
+        )
+
+    def merge_summaries(self, summaries: List[Dict[str, int]]):
+        for summary in summaries:
+            for table, count in summary.items():
+                self.summary[table] = self.summary.get(table, 0) + count
+
+    async def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        logger.info("Workers service stopped.")
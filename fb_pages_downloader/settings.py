@@ -1,3 +1,4 @@
+import datetime
 import enum
 from typing import Any, Dict, List, Optional
 
@@ -20,6 +21,23 @@ class InsightsForPeriodEnum(str, enum.Enum):
     year = "year"
 
 
+class InsightsStorageEnum(str, enum.Enum):
+    """
+    Enum for insights_storage value in Settings
+    """
+    tables = "tables"
+    unified = "unified"
+
+
+class JsonDecoderEnum(str, enum.Enum):
+    """
+    Enum for fb_pages_json_decoder value in Settings
+    """
+    auto = "auto"
+    orjson = "orjson"
+    json = "json"
+
+
 class LogLevelEnum(str, enum.Enum):
     DEBUG = "DEBUG"
     INFO = "INFO"
@@ -28,22 +46,69 @@ class LogLevelEnum(str, enum.Enum):
     CRITICAL = "CRITITCAL"
 
 
+POSTGRES_SCHEMES = ("postgres", "postgresql", "asyncpg")
+
+
 class Settings(BaseSettings):
     load_pages: bool = True
     load_page_insights: bool = True
     load_page_posts: bool = True
     load_page_post_attachments: bool = True
     load_page_post_insights: bool = True
+    incremental_sync: bool = False
+    incremental_sync_lookback_days: int = 7
 
     fb_pages_access_tokens: List[str] = []
     fb_pages_insights_for: InsightsForPeriodEnum = InsightsForPeriodEnum.day
+    fb_pages_insights_since: Optional[datetime.date] = None
+    fb_pages_insights_stale_days: int = 3
     fb_pages_connections_limit: int = 1
+    fb_pages_min_connections_limit: int = 1
     fb_pages_delay_per_request: float = 0
     fb_pages_version: str = "v10.0"
+    fb_pages_base_url: Optional[str] = None
     fb_pages_retry_attempts: int = 3
     fb_pages_retry_delay_function: RetryDelayFunctionEnum = RetryDelayFunctionEnum.EXPO
+    fb_pages_retry_base_delay: float = 1
+    fb_pages_retry_max_delay: float = 60
+    fb_pages_group_insight_metrics: bool = True
+    fb_pages_batch_size: int = 50
+    fb_pages_batch_delay: float = 0.05
+    fb_pages_expand_posts: bool = True
+    fb_pages_paging_prefetch: int = 1
+    fb_pages_paging_limit: int = 100
+    fb_pages_paging_min_limit: int = 5
+    fb_pages_paging_slow_time: float = 5
+    fb_pages_json_decoder: JsonDecoderEnum = JsonDecoderEnum.auto
+    fb_pages_stream_size: int = 1 << 20
+    fb_pages_low_usage: float = 50
+    fb_pages_high_usage: float = 90
+    fb_pages_max_throttling_delay: float = 10
+    fb_pages_throttling_pause: float = 300
+    fb_pages_archive_path: Optional[str] = None
+    fb_pages_cache_path: Optional[str] = None
+    fb_pages_cache_max_size: int = 1 << 30
+    fb_pages_cache_ttls: Dict[str, float] = {
+        "page": 86400,
+        "post_attachments": 86400,
+        "post_insights": 0,
+    }
+    fb_pages_excluded_fields: Dict[str, List[str]] = {}
 
     db_url: str
+    db_batch_size: int = 1000
+    insights_storage: InsightsStorageEnum = InsightsStorageEnum.tables
+
+    pipeline_queue_size: int = 10000
+    pipeline_flush_interval: float = 1
+    pipeline_max_tasks: int = 100
+
+    job_queue: bool = False
+    job_queue_enqueue: bool = True
+    job_queue_concurrency: int = 10
+    job_queue_lease: float = 60
+    job_queue_max_attempts: int = 3
+    job_queue_poll_interval: float = 1
 
     email_to: str
     email_host: str
@@ -55,27 +120,96 @@ class Settings(BaseSettings):
 
     log_files: Optional[Dict[str, LogLevelEnum]] = None
 
-    @classmethod
     @validator("load_page_post_attachments", "load_page_post_insights")
     def check_load_page_post(cls, value: bool, values: Dict[str, Any]) -> bool:
         if value and not values.get("load_page_posts"):
             raise ValueError("For set 'True' value 'load_page_posts' must be 'True' too")
         return value
 
-    @classmethod
-    @validator("email_use_tls", "email_use_ssl")
+    @validator("email_use_ssl")
     def check_email_tls_ssl(cls, value: bool, values: Dict[str, Any]) -> bool:
-        email_use_tls = bool(values.get("email_use_tls"))
-        email_use_ssl = bool(values.get("email_use_ssl"))
-        if email_use_ssl and email_use_tls:
+        if value and values.get("email_use_tls"):
             raise ValueError("Only one of 'email_use_tls' and 'email_use_ssl' can be 'True'")
         return value
 
-    @classmethod
+    @validator("db_url")
+    def normalize_db_url(cls, value: str, values: Dict[str, Any]) -> str:
+        # Tortoise ORM knows PostgreSQL only by "postgres" scheme
+        scheme, separator, rest = value.partition("://")
+        if separator and scheme in POSTGRES_SCHEMES:
+            return f"postgres://{rest}"
+        return value
+
+    @validator("insights_storage")
+    def check_insights_storage(
+            cls,
+            value: InsightsStorageEnum,
+            values: Dict[str, Any],
+    ) -> InsightsStorageEnum:
+        db_url = values.get("db_url") or ""
+        if value == InsightsStorageEnum.unified and not db_url.startswith("postgres://"):
+            raise ValueError("Unified insights storage needs PostgreSQL database")
+        return value
+
+    @validator("fb_pages_excluded_fields")
+    def check_excluded_fields(
+            cls,
+            value: Dict[str, List[str]],
+            values: Dict[str, Any],
+    ) -> Dict[str, List[str]]:
+        unknown = set(value) - {"page", "post", "post_attachments"}
+        if unknown:
+            raise ValueError(
+                f"Fields can be excluded only for page, post and post_attachments, "
+                f"not for {', '.join(sorted(unknown))}",
+            )
+        return value
+
+    @validator(
+        "pipeline_queue_size",
+        "pipeline_max_tasks",
+        "job_queue_concurrency",
+        "job_queue_lease",
+        "job_queue_max_attempts",
+    )
+    def check_positive(cls, value: int, values: Dict[str, Any]) -> int:
+        if value <= 0:
+            raise ValueError(f"Must be positive, not {value}")
+        return value
+
+    @validator("fb_pages_low_usage", "fb_pages_high_usage")
+    def check_percents(cls, value: float, values: Dict[str, Any]) -> float:
+        if not 0 <= value <= 100:
+            raise ValueError(f"Must be between 0 and 100, not {value}")
+        return value
+
+    @validator("fb_pages_batch_size")
+    def check_batch_size(cls, value: int, values: Dict[str, Any]) -> int:
+        if not 1 <= value <= 50:
+            raise ValueError(f"Must be between 1 and 50, not {value}")
+        return value
+
     @validator(
         "fb_pages_connections_limit",
+        "fb_pages_min_connections_limit",
         "fb_pages_delay_per_request",
         "fb_pages_retry_attempts",
+        "fb_pages_paging_prefetch",
+        "fb_pages_paging_limit",
+        "fb_pages_paging_min_limit",
+        "fb_pages_paging_slow_time",
+        "fb_pages_stream_size",
+        "fb_pages_retry_base_delay",
+        "fb_pages_retry_max_delay",
+        "fb_pages_batch_delay",
+        "fb_pages_max_throttling_delay",
+        "fb_pages_throttling_pause",
+        "fb_pages_insights_stale_days",
+        "incremental_sync_lookback_days",
+        "fb_pages_cache_max_size",
+        "db_batch_size",
+        "pipeline_flush_interval",
+        "job_queue_poll_interval",
         "email_port",
     )
     def check_non_negative(cls, value: float, values: Dict[str, Any]) -> float:
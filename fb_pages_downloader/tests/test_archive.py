@@ -0,0 +1,35 @@
+import asyncio
+
+import yarl
+
+from fb_pages_downloader.services.archive import ResponseArchive
+
+
+def test_archive_does_not_save_access_tokens(tmp_path):
+    url = yarl.URL("https://graph.facebook.com/v10.0/me/accounts?access_token=user_token")
+    payload = {
+        "data": [{"id": "1", "access_token": "page_token"}],
+        "paging": {
+            "next": "https://graph.facebook.com/v10.0/me/accounts?access_token=user_token&after=a",
+        },
+    }
+
+    async def write():
+        archive = ResponseArchive(path=str(tmp_path))
+        await archive.start()
+        await archive.write(url=url, params={"access_token": "user_token"}, payload=payload)
+        await archive.stop()
+
+    asyncio.run(write())
+    records = list(ResponseArchive.read(str(tmp_path)))
+
+    assert "token" not in str(records)
+    assert records == [{
+        "path": "/v10.0/me/accounts",
+        "params": {},
+        "payload": {
+            "data": [{"id": "1"}],
+            "paging": {"next": "https://graph.facebook.com/v10.0/me/accounts?after=a"},
+        },
+    }]
+    assert payload["data"][0]["access_token"] == "page_token"
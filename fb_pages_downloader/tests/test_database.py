@@ -0,0 +1,45 @@
+from fb_pages_downloader.services.database import build_upsert_query
+
+
+def test_upsert_query_updates_only_changed_records():
+    query = build_upsert_query(
+        table="pages_page",
+        columns=["id", "name", "created_at", "updated_at"],
+        conflict_columns=["id"],
+        rows_count=2,
+        dialect="postgres",
+    )
+
+    assert query == (
+        'INSERT INTO "pages_page" ("id", "name", "created_at", "updated_at") '
+        "VALUES ($1, $2, $3, $4), ($5, $6, $7, $8) "
+        'ON CONFLICT ("id") DO UPDATE SET "name" = EXCLUDED."name", '
+        '"updated_at" = EXCLUDED."updated_at" '
+        'WHERE "pages_page"."name" IS DISTINCT FROM EXCLUDED."name" RETURNING 1'
+    )
+
+
+def test_upsert_query_of_sqlite():
+    query = build_upsert_query(
+        table="pages_page",
+        columns=["id", "name", "created_at", "updated_at"],
+        conflict_columns=["id"],
+        rows_count=1,
+        dialect="sqlite",
+    )
+
+    assert "VALUES (?, ?, ?, ?) " in query
+    assert 'WHERE "pages_page"."name" IS NOT EXCLUDED."name"' in query
+    assert "RETURNING" not in query
+
+
+def test_upsert_query_of_key_only_columns_does_nothing_on_conflict():
+    query = build_upsert_query(
+        table="pages_daily_page_video_views",
+        columns=["page_id", "m_date", "created_at", "updated_at"],
+        conflict_columns=["page_id", "m_date"],
+        rows_count=1,
+        dialect="sqlite",
+    )
+
+    assert query.endswith('ON CONFLICT ("page_id", "m_date") DO NOTHING')
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from fb_pages_downloader.services.decoding import DataParser, get_json_decoder
+
+
+PAYLOAD = {
+    "data": [
+        {"id": "1", "message": "café ☕", "shares": {"count": 10}},
+        12345,
+        "text, with ] brackets",
+        None,
+        {"id": "2", "values": [1.5, -2e3, True]},
+    ],
+    "paging": {"cursors": {"after": "abc"}, "next": "https://graph.facebook.com/next"},
+}
+
+
+def parse(body: bytes, chunk_size: int):
+    parser = DataParser(loads=get_json_decoder("auto"))
+    items = []
+    for start in range(0, len(body), chunk_size):
+        items.extend(parser.feed(body[start:start + chunk_size]))
+    rest = parser.close()
+    return items, rest
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1000])
+def test_items_are_parsed_from_any_chunks(chunk_size):
+    body = json.dumps(PAYLOAD, indent=1).encode()
+
+    items, rest = parse(body, chunk_size)
+
+    assert items + rest["data"] == PAYLOAD["data"]
+    assert rest["paging"] == PAYLOAD["paging"]
+
+
+def test_items_are_returned_before_body_ends():
+    parser = DataParser()
+
+    assert parser.feed(b'{"data": [{"id": "1"}, {"id": "2"}, {"id"') == [{"id": "1"}, {"id": "2"}]
+    assert parser.feed(b': "3"}]}') == [{"id": "3"}]
+    assert parser.close() == {"data": []}
+
+
+def test_number_split_between_chunks_is_not_returned_early():
+    parser = DataParser()
+
+    assert parser.feed(b'{"data": [12') == []
+    assert parser.feed(b"34, 5") == [1234]
+    assert parser.feed(b"6]}") == [56]
+    assert parser.close() == {"data": []}
+
+
+def test_body_without_data_array_is_decoded_at_once():
+    body = json.dumps({"id": "1", "name": "Page", "data": []}).encode()
+
+    items, rest = parse(body, 3)
+
+    assert items == []
+    assert rest == {"id": "1", "name": "Page", "data": []}
+
+
+@pytest.mark.parametrize("body", [b"", b" ", b"null"])
+def test_empty_body_is_none(body):
+    items, rest = parse(body, 1)
+
+    assert items == []
+    assert rest is None
+
+
+def test_incomplete_body_is_error():
+    parser = DataParser()
+    parser.feed(b'{"data": [{"id": "1"}, {"id": "2"')
+
+    with pytest.raises(ValueError):
+        parser.close()
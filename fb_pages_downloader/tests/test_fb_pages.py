@@ -0,0 +1,234 @@
+import asyncio
+import json
+import math
+
+import aiohttp
+import pytest
+import yarl
+from aiohttp import web
+
+from fb_pages_downloader.benchmark.fake_graph import FakeGraphServer
+from fb_pages_downloader.services.fb_pages import (
+    FacebookPagesAPIError,
+    FacebookPagesService,
+    GraphResponse,
+    is_retryable,
+    is_too_much_data,
+)
+
+TOO_MUCH_DATA = FacebookPagesAPIError(
+    status=500,
+    error={"code": 1, "message": "Please reduce the amount of data you're asking for"},
+)
+
+
+def test_streamed_page_does_not_hold_connection_while_items_are_processed():
+    async def run():
+        async with FakeGraphServer(pages=1, posts=30) as server:
+            service = FacebookPagesService(
+                connections_limit=1,
+                base_url=server.url,
+                stream_size=1,
+            )
+            async with service:
+                accounts = service.get_accounts(access_token=server.access_tokens[0])
+                account = [account async for account in accounts][0]
+                posts = []
+                async for post in service.get_page_published_posts(
+                        page_id=account["id"],
+                        access_token=account["access_token"],
+                ):
+                    # Processing of item makes request which needs the only connection
+                    page_id, post_id = post["id"].split("_")
+                    posts.append(await asyncio.wait_for(service.get_page_post(
+                        page_id=page_id,
+                        post_id=post_id,
+                        access_token=account["access_token"],
+                    ), timeout=10))
+        return posts
+
+    posts = asyncio.run(run())
+
+    assert len(posts) == 30
+
+
+def test_waits_for_connection_do_not_reduce_page_size():
+    async def run():
+        async with FakeGraphServer(pages=1, posts=30, latency=0.02) as server:
+            service = FacebookPagesService(
+                connections_limit=1,
+                base_url=server.url,
+                paging_limit=10,
+                paging_slow_time=0.1,
+            )
+            async with service:
+                accounts = service.get_accounts(access_token=server.access_tokens[0])
+                account = [account async for account in accounts][0]
+
+                async def get_posts():
+                    posts = service.get_page_published_posts(
+                        page_id=account["id"],
+                        access_token=account["access_token"],
+                    )
+                    return [post async for post in posts]
+
+                # Every request waits for the only connection longer than slow time
+                results = await asyncio.gather(*(get_posts() for _ in range(10)))
+                return results, dict(service._page_sizes._limits)
+
+    results, limits = asyncio.run(run())
+
+    assert [len(posts) for posts in results] == [30] * 10
+    assert limits == {}
+
+
+@pytest.mark.parametrize("body", [b"", b"null"])
+def test_empty_body_of_streamed_page_is_empty_page(body):
+    async def handle(request):
+        return web.Response(body=body, content_type="application/json")
+
+    async def run():
+        application = web.Application()
+        application.router.add_get("/{path:.*}", handle)
+        runner = web.AppRunner(application)
+        await runner.setup()
+        site = web.TCPSite(runner, host="127.0.0.1", port=0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        service = FacebookPagesService(base_url=f"http://{host}:{port}", stream_size=1)
+        try:
+            async with service:
+                return [post async for post in service.get_page_published_posts(
+                    page_id="1",
+                    access_token="token",
+                )]
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == []
+
+
+def request_in_batches(batch_size, get_responses, count):
+    """
+    Make count requests in batches, responses of batch are made by get_responses from it
+    """
+    batches = []
+
+    async def request(method, url, data, page_id):
+        batch = json.loads(data["batch"])
+        batches.append(batch)
+        return GraphResponse(payload=get_responses(batch))
+
+    async def run():
+        service = FacebookPagesService(batch_size=batch_size, batch_delay=0.01)
+        service._request = request
+        return await asyncio.wait_for(asyncio.gather(
+            *(
+                service._request_in_batch(
+                    url=yarl.URL(f"https://graph.facebook.com/v10.0/{index}?access_token=t"),
+                )
+                for index in range(count)
+            ),
+            return_exceptions=True,
+        ), timeout=1)
+
+    return asyncio.run(run()), batches
+
+
+def test_requests_are_split_into_batches_of_batch_size():
+    def get_responses(batch):
+        return [
+            {"code": 200, "body": json.dumps({"id": request["relative_url"]})}
+            for request in batch
+        ]
+
+    results, batches = request_in_batches(batch_size=2, get_responses=get_responses, count=5)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [result.payload["id"] for result in results] == [
+        f"v10.0/{index}?access_token=t" for index in range(5)
+    ]
+
+
+def test_errors_of_batch_sub_requests_are_routed_to_their_callers():
+    def get_responses(batch):
+        return [
+            {"code": 200, "body": json.dumps({"id": "0"})},
+            {"code": 400, "body": "[]"},
+            {"code": 400, "body": json.dumps({"error": {"code": 100, "message": "Invalid"}})},
+            {"code": 200, "body": "not json"},
+        ]
+
+    results, _ = request_in_batches(batch_size=4, get_responses=get_responses, count=4)
+
+    assert results[0].payload == {"id": "0"}
+    assert isinstance(results[1], FacebookPagesAPIError)
+    assert results[1].status == 400
+    assert isinstance(results[2], FacebookPagesAPIError)
+    assert results[2].code == 100
+    assert isinstance(results[3], ValueError)
+
+
+@pytest.mark.parametrize("payload", [[{"code": 200, "body": "{}"}], {"error": "Invalid"}])
+def test_all_callers_get_error_of_unexpected_batch_response(payload):
+    results, _ = request_in_batches(batch_size=2, get_responses=lambda batch: payload, count=2)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.parametrize("exception, retryable", [
+    (FacebookPagesAPIError(status=400, error={"code": 2, "is_transient": True}), True),
+    (FacebookPagesAPIError(status=400, error={"code": 100, "is_transient": True}), True),
+    (FacebookPagesAPIError(status=403, error={"code": 4}), True),
+    (FacebookPagesAPIError(status=400, error={"code": 80001}), True),
+    (FacebookPagesAPIError(status=503), True),
+    (FacebookPagesAPIError(status=500, error={"code": 100}), True),
+    (FacebookPagesAPIError(status=400, error={"code": 100}), False),
+    (FacebookPagesAPIError(status=404), False),
+    (TOO_MUCH_DATA, False),
+    (aiohttp.ClientConnectionError(), True),
+    (asyncio.TimeoutError(), True),
+    (ValueError("Invalid JSON"), True),
+    (KeyError("data"), False),
+])
+def test_errors_are_classified_as_retryable(exception, retryable):
+    assert is_retryable(exception) is retryable
+
+
+def test_too_much_data_error_is_recognized():
+    assert is_too_much_data(TOO_MUCH_DATA)
+    assert not is_too_much_data(FacebookPagesAPIError(status=500, error={"code": 1}))
+    assert not is_too_much_data(ValueError("Please reduce the amount of data"))
+
+
+def test_retry_delay_is_jittered_and_not_less_than_retry_after():
+    service = FacebookPagesService(retry_base_delay=1, retry_max_delay=4)
+
+    delays = [service.get_retry_delay(ValueError(), attempt) for attempt in range(1, 5)]
+    assert math.e / 2 <= delays[0] <= math.e
+    assert all(2 <= delay <= 4 for delay in delays[1:])
+    exception = FacebookPagesAPIError(status=429, retry_after=30)
+    assert service.get_retry_delay(exception, 1) == 30
+
+
+def test_failed_requests_are_retried_and_too_big_pages_are_reduced():
+    async def run():
+        async with FakeGraphServer(pages=1, posts=30, error_rate=0.3, max_limit=10) as server:
+            service = FacebookPagesService(
+                base_url=server.url,
+                retry_attempts=10,
+                retry_base_delay=0.001,
+            )
+            async with service:
+                accounts = service.get_accounts(access_token=server.access_tokens[0])
+                account = [account async for account in accounts][0]
+                posts = service.get_page_published_posts(
+                    page_id=account["id"],
+                    access_token=account["access_token"],
+                )
+                return [post["id"] async for post in posts], service._page_sizes._limits
+
+    posts, limits = asyncio.run(run())
+
+    assert len(set(posts)) == 30
+    assert limits and all(limit <= 10 for limit in limits.values())
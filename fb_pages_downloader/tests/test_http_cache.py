@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sqlite3
+
+from fb_pages_downloader.services.http_cache import ResponseCache
+
+
+def test_cache_shared_by_processes_is_evicted_by_total_size(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    payload = {"data": os.urandom(500).hex()}
+
+    async def fill():
+        caches = [ResponseCache(path=path, ttls={"page": 60}, max_size=20000) for _ in range(2)]
+        for cache in caches:
+            await cache.start()
+        for index in range(100):
+            await caches[index % 2].set(key=f"/{index}", ttl=60, etag=None, payload=payload)
+        for cache in caches:
+            await cache.stop()
+
+        cache = ResponseCache(path=path, ttls={"page": 60})
+        await cache.start()
+        last = await cache.get("/99")
+        await cache.stop()
+        return last
+
+    last = asyncio.run(fill())
+    with sqlite3.connect(path) as connection:
+        size = connection.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+
+    # Every process can write tenth of max size before it reads total size
+    assert size <= 20000 * 1.2
+    assert last.payload == payload
@@ -0,0 +1,42 @@
+import datetime
+
+from fb_pages_downloader.services.insights_planner import get_missing_ranges, get_windows
+
+
+def date(day: int) -> datetime.date:
+    return datetime.date(2021, 1, 1) + datetime.timedelta(days=day)
+
+
+def test_missing_ranges_skip_covered_dates():
+    covered = {date(0), date(1), date(4), date(9)}
+
+    assert get_missing_ranges(covered=covered, since=date(0), until=date(9)) == [
+        (date(2), date(3)),
+        (date(5), date(8)),
+    ]
+
+
+def test_missing_ranges_of_empty_and_full_coverage():
+    assert get_missing_ranges(covered=set(), since=date(0), until=date(5)) == [
+        (date(0), date(5)),
+    ]
+    covered = {date(day) for day in range(6)}
+    assert get_missing_ranges(covered=covered, since=date(0), until=date(5)) == []
+
+
+def test_windows_include_bounds_of_ranges():
+    assert get_windows([(date(2), date(3)), (date(5), date(5))]) == [
+        (date(1), date(4)),
+        (date(4), date(6)),
+    ]
+
+
+def test_long_ranges_are_split_to_windows_of_max_days():
+    windows = get_windows([(date(0), date(199))], max_days=90)
+
+    assert windows[0][0] == date(-1)
+    assert windows[-1][1] == date(200)
+    assert all((until - since).days <= 90 for since, until in windows)
+    # Dates between since and until of windows are consecutive
+    for (_, until), (since, _) in zip(windows, windows[1:]):
+        assert since == until - datetime.timedelta(days=1)
@@ -0,0 +1,70 @@
+import datetime
+
+from fb_pages_downloader.models import PageVideoViewsDay, PostReactionsByTypeTotalUniqueLifetime
+from fb_pages_downloader.services.insights_store import (
+    InsightsStore,
+    get_month,
+    get_next_month,
+    literal,
+)
+
+
+UTC = datetime.timezone.utc
+
+
+def test_page_insight_values_are_rows():
+    rows = InsightsStore.make_page_insight_rows(
+        view_model=PageVideoViewsDay,
+        page_id="1",
+        data={
+            "period": "day",
+            "values": [
+                {"end_time": "2021-01-02T08:00:00+0000", "value": 5},
+                {"end_time": "2021-01-03T08:00:00+0000", "value": 7},
+            ],
+        },
+    )
+
+    assert rows == [
+        ("1", "page_video_views", "day", datetime.datetime(2021, 1, 2, 8, tzinfo=UTC), "", 5),
+        ("1", "page_video_views", "day", datetime.datetime(2021, 1, 3, 8, tzinfo=UTC), "", 7),
+    ]
+
+
+def test_all_keys_of_post_insight_values_are_rows():
+    rows = InsightsStore.make_page_post_insight_rows(
+        view_model=PostReactionsByTypeTotalUniqueLifetime,
+        page_id="1",
+        post_id="2",
+        data={
+            "period": "lifetime",
+            "values": [{"value": {"like": 3, "wow": 1}}],
+        },
+    )
+
+    end_time = InsightsStore.LIFETIME_END_TIME
+    assert rows == [
+        ("1_2", "post_reactions_by_type_total", "lifetime", end_time, "like", 3),
+        ("1_2", "post_reactions_by_type_total", "lifetime", end_time, "wow", 1),
+    ]
+
+
+def test_post_insight_view_keeps_shape_of_model_table():
+    store = InsightsStore(database_service=None, view_models=())
+
+    query = store.build_view_query(PostReactionsByTypeTotalUniqueLifetime)
+
+    assert query.startswith(
+        'CREATE OR REPLACE VIEW "v_pages_life_time_post_reactions_by_type_total" AS ',
+    )
+    assert "\"metric\" = 'post_reactions_by_type_total'" in query
+    for field, key in PostReactionsByTypeTotalUniqueLifetime.VALUE_KEYS.items():
+        assert f"FILTER (WHERE \"key\" = '{key}')::INTEGER AS \"{field}\"" in query
+
+
+def test_partitions_are_months_of_end_time():
+    end_time = datetime.datetime(2021, 12, 31, 23, 59, tzinfo=UTC)
+
+    assert get_month(end_time) == datetime.datetime(2021, 12, 1, tzinfo=UTC)
+    assert get_next_month(get_month(end_time)) == datetime.datetime(2022, 1, 1, tzinfo=UTC)
+    assert literal("it's") == "'it''s'"
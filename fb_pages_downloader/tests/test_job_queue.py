@@ -0,0 +1,84 @@
+import asyncio
+
+from fb_pages_downloader.models import Job
+from fb_pages_downloader.models.job import JobKindEnum, JobStatusEnum
+from fb_pages_downloader.services import DatabaseService
+from fb_pages_downloader.services.job_queue import JobQueue
+
+
+def make_jobs():
+    return [
+        JobQueue.make_job(kind=JobKindEnum.page, page_id="1"),
+        JobQueue.make_job(kind=JobKindEnum.posts, page_id="1"),
+    ]
+
+
+def test_enqueueing_by_other_node_does_not_reset_running_jobs(tmp_path):
+    async def run():
+        database_service = DatabaseService(db_url=f"sqlite://{tmp_path / 'database.sqlite3'}")
+        async with database_service:
+            first = JobQueue(database_service=database_service, node="first")
+            second = JobQueue(database_service=database_service, node="second")
+
+            await first.enqueue(make_jobs())
+            claimed = await first.claim(page_ids=["1"], count=1)
+            await second.enqueue(make_jobs())
+            running = await Job.get(id=claimed[0]["id"])
+            assert running.status == JobStatusEnum.running
+            assert running.leased_by == "first"
+            assert running.attempts == 1
+
+            # Second node gets only job which isn't running
+            other = await second.claim(page_ids=["1"], count=2)
+            assert len(other) == 1
+            assert other[0]["id"] != claimed[0]["id"]
+
+            await first.finish(job=claimed[0])
+            assert (await Job.get(id=claimed[0]["id"])).status == JobStatusEnum.done
+            await second.finish(job=other[0], error=RuntimeError("Failed"))
+            assert await first.count_unfinished(page_ids=["1"]) == 1
+
+            # Done jobs are reset by the next run
+            await first.enqueue(make_jobs())
+            reset = await Job.get(id=claimed[0]["id"])
+            assert reset.status == JobStatusEnum.pending
+            assert reset.leased_by is None
+            assert reset.attempts == 0
+
+    asyncio.run(run())
+
+
+def test_failed_jobs_are_retried_until_max_attempts(tmp_path):
+    async def run():
+        database_service = DatabaseService(db_url=f"sqlite://{tmp_path / 'database.sqlite3'}")
+        async with database_service:
+            queue = JobQueue(database_service=database_service, node="node", max_attempts=2)
+            await queue.enqueue(make_jobs()[:1])
+
+            for status in (JobStatusEnum.pending, JobStatusEnum.failed):
+                job, = await queue.claim(page_ids=["1"])
+                await queue.finish(job=job, error=RuntimeError("Failed"))
+                assert (await Job.get(id=job["id"])).status == status
+            assert await queue.claim(page_ids=["1"]) == []
+
+    asyncio.run(run())
+
+
+def test_expired_lease_is_claimed_by_other_node(tmp_path):
+    async def run():
+        database_service = DatabaseService(db_url=f"sqlite://{tmp_path / 'database.sqlite3'}")
+        async with database_service:
+            first = JobQueue(database_service=database_service, node="first", lease=0)
+            second = JobQueue(database_service=database_service, node="second")
+            await first.enqueue(make_jobs()[:1])
+
+            job, = await first.claim(page_ids=["1"])
+            await asyncio.sleep(0.01)
+            again, = await second.claim(page_ids=["1"])
+            assert again["id"] == job["id"]
+
+            # Finishing by node which lost the lease doesn't change job
+            await first.finish(job=job)
+            assert (await Job.get(id=job["id"])).status == JobStatusEnum.running
+
+    asyncio.run(run())
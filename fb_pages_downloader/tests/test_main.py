@@ -0,0 +1,116 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+import pytest
+from tortoise import Tortoise
+
+from fb_pages_downloader.benchmark.fake_graph import FakeGraphServer
+from fb_pages_downloader.models import Checkpoint, PagePost, SyncState
+from fb_pages_downloader.services import DatabaseService, MainService
+from fb_pages_downloader.services.pipeline import WriteError
+from fb_pages_downloader.settings import Settings
+
+
+def make_settings(server: FakeGraphServer, db_url: str, **kwargs) -> Settings:
+    return Settings(
+        _env_file=None,
+        db_url=db_url,
+        email_to="admin@example.com",
+        email_host="localhost",
+        email_port=25,
+        email_username="username",
+        email_password="password",
+        fb_pages_base_url=server.url,
+        fb_pages_access_tokens=server.access_tokens,
+        fb_pages_retry_base_delay=0.01,
+        pipeline_flush_interval=0.01,
+        **kwargs,
+    )
+
+
+async def count_rows(db_url: str) -> Dict[str, int]:
+    async with DatabaseService(db_url=db_url):
+        return {
+            model._meta.db_table: await model.all().count()
+            for model in Tortoise.apps["models"].values()
+        }
+
+
+async def download(db_url: str, **settings_kwargs) -> Dict[str, int]:
+    async with FakeGraphServer(pages=2, posts=30, insight_days=5) as server:
+        async with MainService(settings=make_settings(server, db_url, **settings_kwargs)):
+            pass
+    return await count_rows(db_url)
+
+
+async def get_states(db_url: str) -> Tuple[List[Tuple[str, bool]], List[str]]:
+    """
+    Get endpoints of checkpoints with their completed flags and endpoints of watermarks
+    """
+    async with DatabaseService(db_url=db_url):
+        checkpoints = await Checkpoint.all().values_list("endpoint", "completed")
+        watermarks = await SyncState.all().values_list("endpoint", flat=True)
+    return [tuple(checkpoint) for checkpoint in checkpoints], list(watermarks)
+
+
+@pytest.fixture()
+def db_url(tmp_path) -> str:
+    return f"sqlite://{tmp_path / 'database.sqlite3'}"
+
+
+def test_pages_are_downloaded(db_url):
+    rows = asyncio.run(download(db_url=db_url, incremental_sync=True))
+    checkpoints, watermarks = asyncio.run(get_states(db_url))
+
+    assert rows["pages_page"] == 2
+    assert rows["pages_post"] == 60
+    assert rows["pages_post_attachment"] == 60
+    assert rows["pages_life_time_post_reactions_by_type_total"] == 60
+    assert rows["pages_daily_page_video_views"] > 0
+    assert checkpoints.count(("page", True)) == 2
+    assert checkpoints.count((MainService.POSTS_ENDPOINT, True)) == 2
+    assert watermarks.count(MainService.POSTS_ENDPOINT) == 2
+
+
+def test_failed_writes_do_not_complete_endpoints(db_url, monkeypatch):
+    bulk_upsert = DatabaseService.bulk_upsert
+
+    async def failing_bulk_upsert(self, model, rows):
+        if model is PagePost:
+            raise RuntimeError("Database is not available")
+        return await bulk_upsert(self, model=model, rows=rows)
+
+    monkeypatch.setattr(DatabaseService, "bulk_upsert", failing_bulk_upsert)
+    with pytest.raises(WriteError):
+        asyncio.run(download(db_url=db_url, incremental_sync=True))
+
+    checkpoints, watermarks = asyncio.run(get_states(db_url))
+    assert ("page", True) in checkpoints
+    assert all(endpoint != MainService.POSTS_ENDPOINT for endpoint, _ in checkpoints)
+    assert watermarks == []
+
+
+def test_page_managed_by_several_accounts_is_discovered_once(db_url, monkeypatch):
+    accounts = {
+        "user_token_0": [
+            {"id": "1", "access_token": "page_token_a"},
+            {"id": "2", "access_token": "page_token_b"},
+        ],
+        "user_token_1": [
+            {"id": "1", "access_token": "page_token_c"},
+            {"id": "1", "access_token": "page_token_a"},
+        ],
+    }
+
+    async def load_account(self, access_token):
+        return accounts[access_token]
+
+    async def run():
+        async with FakeGraphServer(accounts=2) as server:
+            service = MainService(settings=make_settings(server, db_url))
+            return await service.discover_pages()
+
+    monkeypatch.setattr(MainService, "load_account", load_account)
+    pages = asyncio.run(run())
+
+    assert pages == {"1": ["page_token_a", "page_token_c"], "2": ["page_token_b"]}
@@ -0,0 +1,65 @@
+import datetime
+
+from fb_pages_downloader.models.mapping import Mapping, Source, parse_datetime
+
+
+MAPPING = Mapping(
+    id="id",
+    check_ins="checkins",
+    created_time=Source("created_time", converter=parse_datetime),
+    shares_count="shares.count",
+    likes_count="likes.summary.total_count",
+)
+
+
+def test_payload_is_extracted_to_fields():
+    fields = MAPPING.extract({
+        "id": "1",
+        "checkins": 5,
+        "created_time": "2021-01-02T03:04:05+0000",
+        "shares": {"count": 10},
+        "likes": {"summary": {"total_count": 3}},
+    })
+
+    assert fields == {
+        "id": "1",
+        "check_ins": 5,
+        "created_time": datetime.datetime(2021, 1, 2, 3, 4, 5),
+        "shares_count": 10,
+        "likes_count": 3,
+    }
+
+
+def test_missing_values_are_none_without_conversion():
+    assert MAPPING.extract({"id": "1", "likes": {}}) == {
+        "id": "1",
+        "check_ins": None,
+        "created_time": None,
+        "shares_count": None,
+        "likes_count": None,
+    }
+
+
+def test_records_of_page_are_extracted_in_one_pass():
+    records = [
+        {"id": "1", "created_time": "2021-01-02T03:04:05+0000", "shares": {"count": 10}},
+        {"id": "2", "checkins": 7},
+    ]
+
+    assert MAPPING.extract_many(records) == [MAPPING.extract(record) for record in records]
+    assert MAPPING.extract_many([]) == []
+
+
+def test_fields_of_mapping_are_top_level_keys():
+    assert MAPPING.get_fields() == ["id", "checkins", "created_time", "shares", "likes"]
+
+
+def test_mapping_without_fields():
+    mapping = MAPPING.without(["check_ins", "likes_count"])
+
+    assert mapping.get_fields() == ["id", "created_time", "shares"]
+    assert mapping.extract({"id": "1", "checkins": 5}) == {
+        "id": "1",
+        "created_time": None,
+        "shares_count": None,
+    }
@@ -0,0 +1,44 @@
+from fb_pages_downloader.services.paging import PageSizeTuner
+
+
+def test_limit_is_halved_down_to_min_limit():
+    tuner = PageSizeTuner(max_limit=100, min_limit=20, slow_time=5)
+
+    assert tuner.shrink("published_posts")
+    assert tuner.get("published_posts") == 50
+    assert tuner.shrink("published_posts")
+    assert tuner.get("published_posts") == 25
+    assert tuner.shrink("published_posts")
+    assert tuner.get("published_posts") == 20
+    assert not tuner.shrink("published_posts")
+    assert tuner.get("insights") == 100
+
+
+def test_limit_is_not_halved_twice_for_the_same_request():
+    tuner = PageSizeTuner(max_limit=100)
+
+    tuner.shrink("published_posts", limit=100)
+    assert tuner.shrink("published_posts", limit=100)
+    assert tuner.get("published_posts") == 50
+
+
+def test_limit_adapts_to_duration_of_pages():
+    tuner = PageSizeTuner(max_limit=100, slow_time=4)
+
+    tuner.update("published_posts", limit=100, duration=5)
+    assert tuner.get("published_posts") == 50
+    tuner.update("published_posts", limit=50, duration=2)
+    assert tuner.get("published_posts") == 50
+    tuner.update("published_posts", limit=50, duration=0.5)
+    assert tuner.get("published_posts") == 75
+    tuner.update("published_posts", limit=75, duration=0.5)
+    assert tuner.get("published_posts") == 100
+
+
+def test_limit_does_not_grow_above_refused_one():
+    tuner = PageSizeTuner(max_limit=100, slow_time=4)
+
+    tuner.shrink("published_posts", limit=100, refused=True)
+    tuner.update("published_posts", limit=50, duration=0.1)
+
+    assert tuner.get("published_posts") == 50
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from fb_pages_downloader.services.pipeline import BufferedWriter, WriteError
+
+
+def test_buffered_writer_writes_batches():
+    batches = []
+
+    async def write(rows: List[Any]):
+        batches.append(rows)
+
+    async def run():
+        writer = BufferedWriter(name="test", write=write, batch_size=2, flush_interval=0.01)
+        writer.start()
+        await writer.put_many(range(5))
+        await writer.flush()
+        await writer.stop()
+
+    asyncio.run(run())
+
+    assert [row for batch in batches for row in batch] == list(range(5))
+    assert all(len(batch) <= 2 for batch in batches)
+
+
+def test_buffered_writer_reports_failed_writes():
+    async def write(rows: List[Any]):
+        if "bad" in rows:
+            raise RuntimeError("Database is not available")
+
+    async def run():
+        errors = []
+        writer = BufferedWriter(
+            name="test",
+            write=write,
+            batch_size=1,
+            flush_interval=0.01,
+            get_errors=lambda: errors,
+        )
+        writer.start()
+        await writer.put("bad")
+        with pytest.raises(WriteError):
+            await writer.flush()
+        assert len(errors) == 1
+
+        position = writer.position
+        await writer.put("good")
+        await writer.flush(since=position)
+        assert len(errors) == 1
+
+        with pytest.raises(WriteError):
+            await writer.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+
+from fb_pages_downloader.services.rate_limit import RequestScheduler, parse_usage_header
+
+
+def test_request_of_other_page_is_not_blocked_by_throttled_page():
+    async def run():
+        scheduler = RequestScheduler(max_concurrency=2, high_usage=90)
+        await scheduler.set_usage(budget=scheduler.get_budget("page", "a"), usage=90)
+        assert scheduler.get_budget("page", "a").limit == 1
+
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def request(page_id: str):
+            async with scheduler.slot(access_token="token", page_id=page_id):
+                entered.set()
+                await release.wait()
+
+        first = asyncio.create_task(request("a"))
+        await entered.wait()
+        # Waits for the only place of page budget
+        second = asyncio.create_task(request("a"))
+        await asyncio.sleep(0.01)
+        try:
+            async with scheduler.slot(access_token="token", page_id="b"):
+                pass
+        finally:
+            release.set()
+            await asyncio.gather(first, second)
+        return scheduler.get_budget("app").active
+
+    assert asyncio.run(asyncio.wait_for(run(), timeout=1)) == 0
+
+
+def test_concurrency_and_delay_depend_on_usage():
+    scheduler = RequestScheduler(
+        max_concurrency=11,
+        min_concurrency=1,
+        low_usage=50,
+        high_usage=90,
+        max_delay=10,
+    )
+
+    assert scheduler.get_limit(40) == 11
+    assert scheduler.get_limit(70) == 6
+    assert scheduler.get_limit(95) == 1
+    assert scheduler.get_delay(90) == 0
+    assert scheduler.get_delay(95) == pytest.approx(5)
+    assert scheduler.get_delay(150) == 10
+
+
+def test_usage_above_high_usage_of_100_percents_gets_max_delay():
+    scheduler = RequestScheduler(low_usage=100, high_usage=100, max_delay=10)
+
+    assert scheduler.get_delay(100) == 0
+    assert scheduler.get_delay(120) == 10
+
+
+def test_throttling_error_pauses_its_budget():
+    async def run():
+        scheduler = RequestScheduler(pause=60)
+        await scheduler.throttle(access_token="token", page_id="1", code=32)
+        now = asyncio.get_event_loop().time()
+        return {
+            kind: scheduler.get_budget(kind, key).resume_at > now
+            for kind, key in (("app", ""), ("token", "token"), ("page", "1"))
+        }
+
+    assert asyncio.run(run()) == {"app": False, "token": False, "page": True}
+
+
+def test_access_token_with_the_lowest_usage_is_chosen():
+    async def run():
+        scheduler = RequestScheduler(pause=60)
+        tokens = ["a", "b", "c"]
+        await scheduler.set_usage(budget=scheduler.get_budget("token", "a"), usage=50)
+        await scheduler.set_usage(budget=scheduler.get_budget("token", "b"), usage=10)
+        await scheduler.set_usage(budget=scheduler.get_budget("token", "c"), usage=30)
+        lowest = scheduler.choose_access_token(tokens)
+        await scheduler.throttle(access_token="b", page_id=None, code=17)
+        await scheduler.set_usage(budget=scheduler.get_budget("token", "c"), usage=90)
+        not_paused = scheduler.choose_access_token(tokens)
+        await scheduler.set_usage(budget=scheduler.get_budget("token", "c"), usage=50)
+        in_turn = {scheduler.choose_access_token(tokens) for _ in range(4)}
+        return lowest, not_paused, in_turn
+
+    assert asyncio.run(run()) == ("b", "a", {"a", "c"})
+
+
+def test_usage_header_is_parsed():
+    header = json.dumps({"call_count": 12, "total_cputime": 30, "total_time": 5})
+
+    assert parse_usage_header(header) == (30, 0)
+    assert parse_usage_header("not json") is None
@@ -0,0 +1,33 @@
+from collections import Counter
+
+from fb_pages_downloader.services.workers import HashRing, shard_pages
+
+
+PAGE_IDS = [str(100000 + number) for number in range(1000)]
+
+
+def test_keys_are_spread_between_nodes():
+    ring = HashRing(nodes=range(4))
+
+    counts = Counter(ring.get_node(page_id) for page_id in PAGE_IDS)
+
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 150
+
+
+def test_only_keys_of_added_node_are_moved():
+    ring = HashRing(nodes=range(4))
+    bigger_ring = HashRing(nodes=range(5))
+
+    for page_id in PAGE_IDS:
+        node = bigger_ring.get_node(page_id)
+        assert node == 4 or node == ring.get_node(page_id)
+
+
+def test_pages_are_sharded_with_their_access_tokens():
+    pages = {page_id: [f"token_{page_id}"] for page_id in PAGE_IDS[:50]}
+
+    shards = shard_pages(pages=pages, workers=3)
+
+    assert len(shards) == 3
+    assert {page_id: tokens for shard in shards for page_id, tokens in shard.items()} == pages